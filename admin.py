@@ -3,33 +3,32 @@
 """
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from database import get_session
-from services.user_service import UserService
-from services.post_service import PostService
-from services.analytics_service import AnalyticsService
+from utils.middleware import BotContext
+from services.user_service import AsyncUserService
+from services.post_service import AsyncPostService, POST_LIST_COLUMNS
+from services.write_behind import activity_sink
+from services.outbound import send_notification
+from services.broadcast_service import AsyncBroadcastService, broadcast_engine
 from utils.decorators import admin_required
 import logging
 
 logger = logging.getLogger(__name__)
 
 @admin_required
-async def admin_panel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def admin_panel_command(update: Update, context: BotContext) -> None:
     """Обработчик команды панели администратора"""
     try:
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
+        post_service = AsyncPostService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            
-            # Получение статистики
-            total_users = user_service.get_users_count()
-            active_users = user_service.get_active_users_count()
-            total_posts = post_service.get_posts_count()
-            published_posts = post_service.get_published_posts_count()
-            
-            text = f"""
+        # Получение статистики
+        total_users = await user_service.get_users_count()
+        active_users = await user_service.get_active_users_count()
+        total_posts = await post_service.get_posts_count()
+        published_posts = await post_service.get_published_posts_count()
+        
+        text = f"""
 👑 **Панель администратора**
 
 📊 **Общая статистика:**
@@ -44,137 +43,128 @@ async def admin_panel_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 • Просмотр аналитики
 • Экспорт данных
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("👥 Пользователи", callback_data="admin_users"),
-                    InlineKeyboardButton("📝 Посты", callback_data="admin_posts")
-                ],
-                [
-                    InlineKeyboardButton("📊 Аналитика", callback_data="admin_analytics"),
-                    InlineKeyboardButton("📤 Экспорт", callback_data="admin_export")
-                ],
-                [
-                    InlineKeyboardButton("⚙️ Настройки", callback_data="admin_settings"),
-                    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                ]
-            ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("👥 Пользователи", callback_data="admin_users"),
+                InlineKeyboardButton("📝 Посты", callback_data="admin_posts")
+            ],
+            [
+                InlineKeyboardButton("📊 Аналитика", callback_data="admin_analytics"),
+                InlineKeyboardButton("📤 Экспорт", callback_data="admin_export")
+            ],
+            [
+                InlineKeyboardButton("⚙️ Настройки", callback_data="admin_settings"),
+                InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+            ]
+        ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в admin_panel_command: {e}")
         await update.message.reply_text("❌ Ошибка при загрузке панели администратора.")
 
 @admin_required
-async def manage_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def manage_users_command(update: Update, context: BotContext) -> None:
     """Обработчик команды управления пользователями"""
     try:
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
+        users = await user_service.get_all_users(limit=20)
         
-        try:
-            user_service = UserService(db)
-            users = user_service.get_all_users(limit=20)
+        if not users:
+            text = "👥 **Управление пользователями**\n\nПользователи не найдены."
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ])
+        else:
+            text = "👥 **Управление пользователями**\n\n"
             
-            if not users:
-                text = "👥 **Управление пользователями**\n\nПользователи не найдены."
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-                ])
-            else:
-                text = "👥 **Управление пользователями**\n\n"
+            for user in users:
+                status = "👑 Админ" if user.is_admin else "👤 Пользователь"
+                activity_status = "🟢 Активен" if user.is_active else "🔴 Заблокирован"
+                name = user.first_name or user.username or f"ID:{user.telegram_id}"
                 
-                for user in users:
-                    status = "👑 Админ" if user.is_admin else "👤 Пользователь"
-                    activity_status = "🟢 Активен" if user.is_active else "🔴 Заблокирован"
-                    name = user.first_name or user.username or f"ID:{user.telegram_id}"
-                    
-                    text += f"• {name} ({status}, {activity_status})\n"
-                    text += f"  ID: `{user.telegram_id}` | Постов: {len(user.posts)}\n\n"
-                
-                keyboard = InlineKeyboardMarkup([
-                    [
-                        InlineKeyboardButton("👑 Назначить админа", callback_data="admin_promote"),
-                        InlineKeyboardButton("🔒 Блокировать", callback_data="admin_block")
-                    ],
-                    [
-                        InlineKeyboardButton("📊 Статистика", callback_data="admin_user_stats"),
-                        InlineKeyboardButton("🔄 Обновить", callback_data="admin_users")
-                    ],
-                    [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
-                ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
+                text += f"• {name} ({status}, {activity_status})\n"
+                text += f"  ID: `{user.telegram_id}` | Постов: {user.posts_count}\n\n"
             
+            keyboard = InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("👑 Назначить админа", callback_data="admin_promote"),
+                    InlineKeyboardButton("🔒 Блокировать", callback_data="admin_block")
+                ],
+                [
+                    InlineKeyboardButton("📊 Статистика", callback_data="admin_user_stats"),
+                    InlineKeyboardButton("🔄 Обновить", callback_data="admin_users")
+                ],
+                [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
+            ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в manage_users_command: {e}")
         await update.message.reply_text("❌ Ошибка при загрузке пользователей.")
 
 @admin_required
-async def manage_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def manage_posts_command(update: Update, context: BotContext) -> None:
     """Обработчик команды управления постами"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
         
-        try:
-            post_service = PostService(db)
-            
-            # Получение последних постов
-            recent_posts = post_service.get_recent_posts(limit=10)
-            pending_posts = post_service.get_unpublished_posts(limit=10)
-            
-            text = f"""
+        # Получение последних постов
+        recent_posts = await post_service.get_recent_posts(limit=10, columns=POST_LIST_COLUMNS)
+        pending_posts = await post_service.get_unpublished_posts(limit=10, columns=POST_LIST_COLUMNS)
+        posts_count = await post_service.get_posts_count()
+        published_posts_count = await post_service.get_published_posts_count()
+        
+        text = f"""
 📝 **Управление постами**
 
 📊 **Статистика:**
-• Всего постов: {post_service.get_posts_count()}
-• Опубликованных: {post_service.get_published_posts_count()}
+• Всего постов: {posts_count}
+• Опубликованных: {published_posts_count}
 • Ожидают модерации: {len(pending_posts)}
 
 📋 **Последние посты:**
             """
-            
-            for post in recent_posts[:5]:
-                status = "🟢" if post.is_published else "🟡"
-                author_name = post.author.first_name or post.author.username or "Аноним"
-                text += f"\n• {status} #{post.post_number} - {post.title[:30]}..."
-                text += f"\n  👤 {author_name} | 📅 {post.created_at.strftime('%d.%m.%Y')}"
-            
-            if pending_posts:
-                text += f"\n\n⏳ **Ожидают модерации:**"
-                for post in pending_posts[:3]:
-                    author_name = post.author.first_name or post.author.username or "Аноним"
-                    text += f"\n• #{post.post_number} - {post.title[:30]}... ({author_name})"
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📋 Все посты", callback_data="admin_all_posts"),
-                    InlineKeyboardButton("⏳ На модерации", callback_data="admin_pending_posts")
-                ],
-                [
-                    InlineKeyboardButton("🗑 Удаленные", callback_data="admin_deleted_posts"),
-                    InlineKeyboardButton("📊 Статистика", callback_data="admin_post_stats")
-                ],
-                [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
-            ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        for post in recent_posts[:5]:
+            status = "🟢" if post.is_published else "🟡"
+            author = await post.awaitable_attrs.author
+            author_name = author.first_name or author.username or "Аноним"
+            text += f"\n• {status} #{post.post_number} - {post.title[:30]}..."
+            text += f"\n  👤 {author_name} | 📅 {post.created_at.strftime('%d.%m.%Y')}"
+        
+        if pending_posts:
+            text += f"\n\n⏳ **Ожидают модерации:**"
+            for post in pending_posts[:3]:
+                author = await post.awaitable_attrs.author
+                author_name = author.first_name or author.username or "Аноним"
+                text += f"\n• #{post.post_number} - {post.title[:30]}... ({author_name})"
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📋 Все посты", callback_data="admin_all_posts"),
+                InlineKeyboardButton("⏳ На модерации", callback_data="admin_pending_posts")
+            ],
+            [
+                InlineKeyboardButton("🗑 Удаленные", callback_data="admin_deleted_posts"),
+                InlineKeyboardButton("📊 Статистика", callback_data="admin_post_stats")
+            ],
+            [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
+        ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в manage_posts_command: {e}")
         await update.message.reply_text("❌ Ошибка при загрузке постов.")
 
 @admin_required
-async def promote_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def promote_user_command(update: Update, context: BotContext) -> None:
     """Обработчик команды назначения администратора"""
     try:
         args = context.args
@@ -191,88 +181,130 @@ async def promote_user_command(update: Update, context: ContextTypes.DEFAULT_TYP
             await update.message.reply_text("❌ ID пользователя должен быть числом.")
             return
         
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
         
-        try:
-            user_service = UserService(db)
-            analytics_service = AnalyticsService(db)
-            
-            # Получение администратора
-            admin_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            # Получение целевого пользователя
-            target_user = user_service.get_user_by_telegram_id(target_telegram_id)
+        # Получение администратора
+        admin_user = context.db_user
+        
+        # Получение целевого пользователя
+        target_user = await user_service.get_user_by_telegram_id(target_telegram_id)
+        
+        if not target_user:
+            await update.message.reply_text(
+                f"❌ Пользователь с ID {target_telegram_id} не найден.\n\n"
+                "Пользователь должен сначала запустить бота командой /start"
+            )
+            return
+        
+        if target_user.is_admin:
+            await update.message.reply_text(
+                f"ℹ️ Пользователь {target_user.first_name or target_user.username} уже является администратором."
+            )
+            return
+        
+        # Назначение администратором
+        success = await user_service.promote_to_admin(target_telegram_id)
+        
+        if success:
+            await db.commit()
+            
+            # Логирование активности (запись в фоне)
+            activity_sink.record(
+                user_id=admin_user.id,
+                activity_type="user_promote",
+                activity_data={"target_user_id": target_user.id}
+            )
             
-            if not target_user:
-                await update.message.reply_text(
-                    f"❌ Пользователь с ID {target_telegram_id} не найден.\n\n"
-                    "Пользователь должен сначала запустить бота командой /start"
-                )
-                return
+            target_name = target_user.first_name or target_user.username or f"ID:{target_telegram_id}"
             
-            if target_user.is_admin:
-                await update.message.reply_text(
-                    f"ℹ️ Пользователь {target_user.first_name or target_user.username} уже является администратором."
-                )
-                return
+            await update.message.reply_text(
+                f"✅ Пользователь {target_name} успешно назначен администратором!"
+            )
             
-            # Назначение администратором
-            success = user_service.promote_to_admin(target_telegram_id)
+            # Уведомление пользователю (отдельной задачей, ответ администратору не ждет очереди)
+            context.application.create_task(send_notification(
+                context.bot,
+                target_telegram_id,
+                "🎉 Поздравляем! Вы были назначены администратором бота.\n\n"
+                "Теперь вам доступны расширенные возможности управления."
+            ))
             
-            if success:
-                # Логирование активности
-                analytics_service.log_user_activity(
-                    user_id=admin_user.id,
-                    activity_type="user_promote",
-                    activity_data={"target_user_id": target_user.id}
-                )
-                
-                db.commit()
-                
-                target_name = target_user.first_name or target_user.username or f"ID:{target_telegram_id}"
-                
-                await update.message.reply_text(
-                    f"✅ Пользователь {target_name} успешно назначен администратором!"
-                )
-                
-                # Уведомление пользователю (если возможно)
-                try:
-                    await context.bot.send_message(
-                        chat_id=target_telegram_id,
-                        text="🎉 Поздравляем! Вы были назначены администратором бота.\n\n"
-                             "Теперь вам доступны расширенные возможности управления."
-                    )
-                except Exception:
-                    # Не удалось отправить уведомление (пользователь заблокировал бота и т.д.)
-                    pass
-                
-            else:
-                await update.message.reply_text("❌ Ошибка при назначении администратора.")
-                
-        finally:
-            db.close()
+        else:
+            await update.message.reply_text("❌ Ошибка при назначении администратора.")
             
     except Exception as e:
         logger.error(f"Ошибка в promote_user_command: {e}")
         await update.message.reply_text("❌ Ошибка при назначении администратора.")
 
-async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+@admin_required
+async def broadcast_command(update: Update, context: BotContext) -> None:
+    """Обработчик команды рассылки сообщения всем пользователям"""
+    try:
+        # Текст после команды целиком, с переносами строк
+        text = update.message.text.partition(" ")[2].strip()
+        
+        if not text:
+            await update.message.reply_text(
+                "❌ Укажите текст рассылки.\n\n"
+                "Пример: /broadcast Вышла новая версия бота!"
+            )
+            return
+        
+        db = context.db
+        broadcast = await AsyncBroadcastService(db).create_broadcast(
+            text=text,
+            created_by=context.db_user.id
+        )
+        await db.commit()
+        
+        # Логирование активности (запись в фоне)
+        activity_sink.record(
+            user_id=context.db_user.id,
+            activity_type="broadcast_create",
+            activity_data={"broadcast_id": broadcast.id}
+        )
+        
+        broadcast_engine.launch(context.bot, broadcast.id, notify_chat_id=update.effective_chat.id)
+        
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("✖️ Отменить рассылку", callback_data=f"admin_broadcast_cancel_{broadcast.id}")]
+        ])
+        
+        await update.message.reply_text(
+            f"📣 Рассылка #{broadcast.id} запущена. Итоги придут отдельным сообщением.",
+            reply_markup=keyboard
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка в broadcast_command: {e}")
+        await update.message.reply_text("❌ Ошибка при запуске рассылки.")
+
+async def cancel_broadcast(update: Update, context: BotContext, broadcast_id: int) -> None:
+    """Отмена рассылки (останавливается после текущего пакета)"""
+    try:
+        db = context.db
+        cancelled = await AsyncBroadcastService(db).cancel_broadcast(broadcast_id)
+        await db.commit()
+        
+        text = f"🚫 Рассылка #{broadcast_id} отменена." if cancelled else f"ℹ️ Рассылка #{broadcast_id} уже завершена."
+        await update.callback_query.edit_message_text(text)
+        
+    except Exception as e:
+        logger.error(f"Ошибка в cancel_broadcast: {e}")
+
+async def handle_admin_callback(update: Update, context: BotContext) -> None:
     """Обработчик callback query для административных действий"""
     try:
         query = update.callback_query
         await query.answer()
         
         # Проверка прав администратора
-        db = get_session()
-        try:
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user or not db_user.is_admin:
-                await query.edit_message_text("❌ Недостаточно прав для выполнения этого действия.")
-                return
-        finally:
-            db.close()
+        db_user = context.db_user
+        
+        if not db_user or not db_user.is_admin:
+            await query.edit_message_text("❌ Недостаточно прав для выполнения этого действия.")
+            return
         
         data = query.data.replace("admin_", "")
         
@@ -296,6 +328,9 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         elif data == "settings":
             await show_admin_settings(update, context)
             
+        elif data.startswith("broadcast_cancel_"):
+            await cancel_broadcast(update, context, int(data.replace("broadcast_cancel_", "")))
+            
         elif data.startswith("user_"):
             await handle_user_action(update, context, data)
             
@@ -306,22 +341,20 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         logger.error(f"Ошибка в handle_admin_callback: {e}")
         await query.message.reply_text("❌ Ошибка при обработке административного действия.")
 
-async def show_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_admin_panel(update: Update, context: BotContext) -> None:
     """Показ панели администратора"""
     try:
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
+        post_service = AsyncPostService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            
-            # Получение статистики
-            total_users = user_service.get_users_count()
-            active_users = user_service.get_active_users_count()
-            total_posts = post_service.get_posts_count()
-            published_posts = post_service.get_published_posts_count()
-            
-            text = f"""
+        # Получение статистики
+        total_users = await user_service.get_users_count()
+        active_users = await user_service.get_active_users_count()
+        total_posts = await post_service.get_posts_count()
+        published_posts = await post_service.get_published_posts_count()
+        
+        text = f"""
 👑 **Панель администратора**
 
 📊 **Общая статистика:**
@@ -336,128 +369,119 @@ async def show_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 • Просмотр аналитики
 • Экспорт данных
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("👥 Пользователи", callback_data="admin_users"),
-                    InlineKeyboardButton("📝 Посты", callback_data="admin_posts")
-                ],
-                [
-                    InlineKeyboardButton("📊 Аналитика", callback_data="admin_analytics"),
-                    InlineKeyboardButton("📤 Экспорт", callback_data="admin_export")
-                ],
-                [
-                    InlineKeyboardButton("⚙️ Настройки", callback_data="admin_settings"),
-                    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                ]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("👥 Пользователи", callback_data="admin_users"),
+                InlineKeyboardButton("📝 Посты", callback_data="admin_posts")
+            ],
+            [
+                InlineKeyboardButton("📊 Аналитика", callback_data="admin_analytics"),
+                InlineKeyboardButton("📤 Экспорт", callback_data="admin_export")
+            ],
+            [
+                InlineKeyboardButton("⚙️ Настройки", callback_data="admin_settings"),
+                InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+            ]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в show_admin_panel: {e}")
 
-async def show_users_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_users_management(update: Update, context: BotContext) -> None:
     """Показ управления пользователями"""
     try:
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
+        users = await user_service.get_all_users(limit=20)
+        
+        text = "👥 **Управление пользователями**\n\n"
+        
+        if not users:
+            text += "Пользователи не найдены."
+        else:
+            for user in users:
+                status = "👑 Админ" if user.is_admin else "👤 Пользователь"
+                activity_status = "🟢 Активен" if user.is_active else "🔴 Заблокирован"
+                name = user.first_name or user.username or f"ID:{user.telegram_id}"
+                
+                text += f"• {name} ({status}, {activity_status})\n"
+                text += f"  ID: `{user.telegram_id}` | Постов: {user.posts_count}\n\n"
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("👑 Назначить админа", callback_data="admin_promote"),
+                InlineKeyboardButton("🔒 Блокировать", callback_data="admin_block")
+            ],
+            [
+                InlineKeyboardButton("📊 Статистика", callback_data="admin_user_stats"),
+                InlineKeyboardButton("🔄 Обновить", callback_data="admin_users")
+            ],
+            [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
         
-        try:
-            user_service = UserService(db)
-            users = user_service.get_all_users(limit=20)
-            
-            text = "👥 **Управление пользователями**\n\n"
-            
-            if not users:
-                text += "Пользователи не найдены."
-            else:
-                for user in users:
-                    status = "👑 Админ" if user.is_admin else "👤 Пользователь"
-                    activity_status = "🟢 Активен" if user.is_active else "🔴 Заблокирован"
-                    name = user.first_name or user.username or f"ID:{user.telegram_id}"
-                    
-                    text += f"• {name} ({status}, {activity_status})\n"
-                    text += f"  ID: `{user.telegram_id}` | Постов: {len(user.posts)}\n\n"
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("👑 Назначить админа", callback_data="admin_promote"),
-                    InlineKeyboardButton("🔒 Блокировать", callback_data="admin_block")
-                ],
-                [
-                    InlineKeyboardButton("📊 Статистика", callback_data="admin_user_stats"),
-                    InlineKeyboardButton("🔄 Обновить", callback_data="admin_users")
-                ],
-                [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
     except Exception as e:
         logger.error(f"Ошибка в show_users_management: {e}")
 
-async def show_posts_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_posts_management(update: Update, context: BotContext) -> None:
     """Показ управления постами"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
         
-        try:
-            post_service = PostService(db)
-            
-            # Получение статистики и постов
-            recent_posts = post_service.get_recent_posts(limit=10)
-            pending_posts = post_service.get_unpublished_posts(limit=10)
-            
-            text = f"""
+        # Получение статистики и постов
+        recent_posts = await post_service.get_recent_posts(limit=10, columns=POST_LIST_COLUMNS)
+        pending_posts = await post_service.get_unpublished_posts(limit=10, columns=POST_LIST_COLUMNS)
+        posts_count = await post_service.get_posts_count()
+        published_posts_count = await post_service.get_published_posts_count()
+        
+        text = f"""
 📝 **Управление постами**
 
 📊 **Статистика:**
-• Всего постов: {post_service.get_posts_count()}
-• Опубликованных: {post_service.get_published_posts_count()}
+• Всего постов: {posts_count}
+• Опубликованных: {published_posts_count}
 • Ожидают модерации: {len(pending_posts)}
 
 📋 **Последние посты:**
             """
-            
-            for post in recent_posts[:5]:
-                status = "🟢" if post.is_published else "🟡"
-                author_name = post.author.first_name or post.author.username or "Аноним"
-                text += f"\n• {status} #{post.post_number} - {post.title[:30]}..."
-                text += f"\n  👤 {author_name} | 📅 {post.created_at.strftime('%d.%m.%Y')}"
-            
-            if pending_posts:
-                text += f"\n\n⏳ **Ожидают модерации:**"
-                for post in pending_posts[:3]:
-                    author_name = post.author.first_name or post.author.username or "Аноним"
-                    text += f"\n• #{post.post_number} - {post.title[:30]}... ({author_name})"
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📋 Все посты", callback_data="admin_all_posts"),
-                    InlineKeyboardButton("⏳ На модерации", callback_data="admin_pending_posts")
-                ],
-                [
-                    InlineKeyboardButton("🗑 Удаленные", callback_data="admin_deleted_posts"),
-                    InlineKeyboardButton("📊 Статистика", callback_data="admin_post_stats")
-                ],
-                [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        for post in recent_posts[:5]:
+            status = "🟢" if post.is_published else "🟡"
+            author = await post.awaitable_attrs.author
+            author_name = author.first_name or author.username or "Аноним"
+            text += f"\n• {status} #{post.post_number} - {post.title[:30]}..."
+            text += f"\n  👤 {author_name} | 📅 {post.created_at.strftime('%d.%m.%Y')}"
+        
+        if pending_posts:
+            text += f"\n\n⏳ **Ожидают модерации:**"
+            for post in pending_posts[:3]:
+                author = await post.awaitable_attrs.author
+                author_name = author.first_name or author.username or "Аноним"
+                text += f"\n• #{post.post_number} - {post.title[:30]}... ({author_name})"
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📋 Все посты", callback_data="admin_all_posts"),
+                InlineKeyboardButton("⏳ На модерации", callback_data="admin_pending_posts")
+            ],
+            [
+                InlineKeyboardButton("🗑 Удаленные", callback_data="admin_deleted_posts"),
+                InlineKeyboardButton("📊 Статистика", callback_data="admin_post_stats")
+            ],
+            [InlineKeyboardButton("🔙 Назад", callback_data="admin_panel")]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в show_posts_management: {e}")
 
-async def show_export_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_export_options(update: Update, context: BotContext) -> None:
     """Показ опций экспорта данных"""
     try:
         text = """
@@ -494,7 +518,7 @@ async def show_export_options(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         logger.error(f"Ошибка в show_export_options: {e}")
 
-async def show_admin_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_admin_settings(update: Update, context: BotContext) -> None:
     """Показ настроек администратора"""
     try:
         text = """
@@ -516,6 +540,7 @@ async def show_admin_settings(update: Update, context: ContextTypes.DEFAULT_TYPE
 • Автопубликация постов
 • Уведомления о новых постах
 • Еженедельные отчеты
+• Рассылка всем пользователям: /broadcast текст
         """
         
         keyboard = InlineKeyboardMarkup([
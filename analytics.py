@@ -3,41 +3,44 @@
 """
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from database import get_session
-from services.analytics_service import AnalyticsService
-from services.user_service import UserService
-from services.post_service import PostService
-from utils.decorators import admin_required
+from utils.middleware import BotContext
+from services.analytics_service import AsyncAnalyticsService
+from services.export_service import AsyncExportService, EXPORT_DATASETS, EXPORT_FORMATS
+from services.job_runner import job_runner, Job, JobResult, JobLimitError
+from services.daily_stats_service import stats_day
+from utils.charts import chart_renderer, render_analytics_charts
+from database import get_async_session
+from utils.decorators import admin_required, rate_limit, check_rate_limit
+from config import Config
 import logging
 import io
-import matplotlib
-matplotlib.use('Agg')  # Для работы без GUI
-import matplotlib.pyplot as plt
-import pandas as pd
-from datetime import datetime, timedelta
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
-async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+EXPORT_CAPTIONS = {
+    'analytics': "📊 Экспорт аналитики",
+    'users': "👥 Экспорт данных пользователей",
+    'posts': "📝 Экспорт данных постов"
+}
+
+@rate_limit()
+async def analytics_command(update: Update, context: BotContext) -> None:
     """Обработчик команды общей аналитики"""
     try:
-        db = get_session()
+        db = context.db
+        analytics_service = AsyncAnalyticsService(db)
         
-        try:
-            user_service = UserService(db)
-            analytics_service = AnalyticsService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение базовой аналитики
-            analytics_data = analytics_service.get_basic_analytics()
-            
-            text = f"""
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение базовой аналитики
+        analytics_data = await analytics_service.get_basic_analytics()
+        
+        text = f"""
 📊 **Аналитика системы**
 
 📈 **Общие показатели:**
@@ -53,63 +56,58 @@ async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 📋 **Популярные шаблоны:**
             """
-            
-            # Добавление информации о популярных шаблонах
-            popular_templates = analytics_service.get_popular_templates()
-            for template in popular_templates[:3]:
-                text += f"\n• {template['name']}: {template['usage_count']} использований"
-            
-            keyboard_buttons = [
+        
+        # Добавление информации о популярных шаблонах
+        popular_templates = await analytics_service.get_popular_templates()
+        for template in popular_templates[:3]:
+            text += f"\n• {template['name']}: {template['usage_count']} использований"
+        
+        keyboard_buttons = [
+            [
+                InlineKeyboardButton("👤 Моя статистика", callback_data="analytics_personal"),
+                InlineKeyboardButton("📈 Графики", callback_data="analytics_charts")
+            ]
+        ]
+        
+        if db_user.is_admin:
+            keyboard_buttons.extend([
                 [
-                    InlineKeyboardButton("👤 Моя статистика", callback_data="analytics_personal"),
-                    InlineKeyboardButton("📈 Графики", callback_data="analytics_charts")
+                    InlineKeyboardButton("👥 Статистика пользователей", callback_data="analytics_users"),
+                    InlineKeyboardButton("📝 Статистика постов", callback_data="analytics_posts")
+                ],
+                [
+                    InlineKeyboardButton("📊 Расширенная аналитика", callback_data="analytics_advanced"),
+                    InlineKeyboardButton("📤 Экспорт данных", callback_data="analytics_export")
                 ]
-            ]
-            
-            if db_user.is_admin:
-                keyboard_buttons.extend([
-                    [
-                        InlineKeyboardButton("👥 Статистика пользователей", callback_data="analytics_users"),
-                        InlineKeyboardButton("📝 Статистика постов", callback_data="analytics_posts")
-                    ],
-                    [
-                        InlineKeyboardButton("📊 Расширенная аналитика", callback_data="analytics_advanced"),
-                        InlineKeyboardButton("📤 Экспорт данных", callback_data="analytics_export")
-                    ]
-                ])
-            
-            keyboard_buttons.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-            
-            keyboard = InlineKeyboardMarkup(keyboard_buttons)
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+            ])
+        
+        keyboard_buttons.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
+        
+        keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в analytics_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении аналитики.")
 
-async def user_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+@rate_limit()
+async def user_stats_command(update: Update, context: BotContext) -> None:
     """Обработчик команды статистики пользователей"""
     try:
-        db = get_session()
+        db = context.db
+        analytics_service = AsyncAnalyticsService(db)
         
-        try:
-            user_service = UserService(db)
-            analytics_service = AnalyticsService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение статистики пользователя
-            user_stats = analytics_service.get_user_statistics(db_user.id)
-            
-            text = f"""
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение статистики пользователя
+        user_stats = await analytics_service.get_user_statistics(db_user.id)
+        
+        text = f"""
 👤 **Ваша статистика**
 
 📊 **Активность:**
@@ -130,41 +128,35 @@ async def user_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 • Среднее время создания поста: {user_stats.get('avg_post_creation_time', 'N/A')}
 • Наиболее активный день: {user_stats.get('most_active_day', 'N/A')}
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📈 Графики активности", callback_data="analytics_personal_charts"),
-                    InlineKeyboardButton("📋 Детальная статистика", callback_data="analytics_personal_detailed")
-                ],
-                [
-                    InlineKeyboardButton("📊 Общая аналитика", callback_data="analytics_general"),
-                    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                ]
-            ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Графики активности", callback_data="analytics_personal_charts"),
+                InlineKeyboardButton("📋 Детальная статистика", callback_data="analytics_personal_detailed")
+            ],
+            [
+                InlineKeyboardButton("📊 Общая аналитика", callback_data="analytics_general"),
+                InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+            ]
+        ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в user_stats_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении статистики.")
 
 @admin_required
-async def post_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def post_stats_command(update: Update, context: BotContext) -> None:
     """Обработчик команды статистики постов (только для админов)"""
     try:
-        db = get_session()
+        db = context.db
+        analytics_service = AsyncAnalyticsService(db)
         
-        try:
-            analytics_service = AnalyticsService(db)
-            post_service = PostService(db)
-            
-            # Получение статистики постов
-            post_stats = analytics_service.get_post_statistics()
-            
-            text = f"""
+        # Получение статистики постов
+        post_stats = await analytics_service.get_post_statistics()
+        
+        text = f"""
 📝 **Статистика постов**
 
 📊 **Общие показатели:**
@@ -180,43 +172,40 @@ async def post_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 📋 **По шаблонам:**
             """
-            
-            # Добавление статистики по шаблонам
-            template_stats = analytics_service.get_template_usage_stats()
-            for template_stat in template_stats[:5]:
-                text += f"\n• {template_stat['template_name']}: {template_stat['usage_count']} постов"
-            
-            text += f"""
+        
+        # Добавление статистики по шаблонам
+        template_stats = await analytics_service.get_template_usage_stats()
+        for template_stat in template_stats[:5]:
+            text += f"\n• {template_stat['template_name']}: {template_stat['usage_count']} постов"
+        
+        text += f"""
 
 👤 **По авторам:**
 • Самый активный автор: {post_stats.get('most_active_author', 'N/A')}
 • Средняя длина поста: {post_stats.get('avg_post_length', 0)} символов
 • Самый популярный пост: #{post_stats.get('most_popular_post', 'N/A')}
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📈 Графики постов", callback_data="analytics_post_charts"),
-                    InlineKeyboardButton("👥 По авторам", callback_data="analytics_authors")
-                ],
-                [
-                    InlineKeyboardButton("📋 Детальный отчет", callback_data="analytics_post_detailed"),
-                    InlineKeyboardButton("📤 Экспорт", callback_data="analytics_export_posts")
-                ],
-                [InlineKeyboardButton("🔙 Назад", callback_data="analytics_general")]
-            ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Графики постов", callback_data="analytics_post_charts"),
+                InlineKeyboardButton("👥 По авторам", callback_data="analytics_authors")
+            ],
+            [
+                InlineKeyboardButton("📋 Детальный отчет", callback_data="analytics_post_detailed"),
+                InlineKeyboardButton("📤 Экспорт", callback_data="analytics_export_posts")
+            ],
+            [InlineKeyboardButton("🔙 Назад", callback_data="analytics_general")]
+        ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в post_stats_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении статистики постов.")
 
 @admin_required
-async def export_data_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def export_data_command(update: Update, context: BotContext) -> None:
     """Обработчик команды экспорта данных (только для админов)"""
     try:
         text = """
@@ -226,7 +215,7 @@ async def export_data_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 📊 **Доступные форматы:**
 • CSV - для анализа в Excel/Google Sheets
-• JSON - для программной обработки
+• JSON (NDJSON, объект на строку) - для программной обработки
 • PDF - для отчетов
 
 🗂 **Типы данных:**
@@ -259,14 +248,16 @@ async def export_data_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Ошибка в export_data_command: {e}")
         await update.message.reply_text("❌ Ошибка при подготовке экспорта.")
 
-async def handle_analytics_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def handle_analytics_callback(update: Update, context: BotContext) -> None:
     """Обработчик callback query для аналитики"""
     try:
         query = update.callback_query
-        await query.answer()
-        
         data = query.data.replace("analytics_", "")
         
+        # Фоновые задачи отвечают на нажатие сами (статус постановки задачи)
+        if not data.startswith(("export_", "job_", "charts")):
+            await query.answer()
+        
         if data == "general":
             await show_general_analytics(update, context)
             
@@ -288,6 +279,9 @@ async def handle_analytics_callback(update: Update, context: ContextTypes.DEFAUL
         elif data.startswith("export_"):
             await handle_export_request(update, context, data.replace("export_", ""))
             
+        elif data.startswith("job_cancel_"):
+            await cancel_job(update, context, int(data.replace("job_cancel_", "")))
+            
         elif data == "personal_charts":
             await generate_personal_charts(update, context)
             
@@ -304,16 +298,14 @@ async def handle_analytics_callback(update: Update, context: ContextTypes.DEFAUL
         logger.error(f"Ошибка в handle_analytics_callback: {e}")
         await query.message.reply_text("❌ Ошибка при обработке аналитики.")
 
-async def show_general_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_general_analytics(update: Update, context: BotContext) -> None:
     """Показ общей аналитики"""
     try:
-        db = get_session()
+        db = context.db
+        analytics_service = AsyncAnalyticsService(db)
+        analytics_data = await analytics_service.get_basic_analytics()
         
-        try:
-            analytics_service = AnalyticsService(db)
-            analytics_data = analytics_service.get_basic_analytics()
-            
-            text = f"""
+        text = f"""
 📊 **Общая аналитика системы**
 
 📈 **Основные метрики:**
@@ -332,46 +324,40 @@ async def show_general_analytics(update: Update, context: ContextTypes.DEFAULT_T
 • Среднее постов на пользователя: {analytics_data.get('avg_posts_per_user', 0):.1f}
 • Активность пользователей: {analytics_data.get('user_activity_rate', 0):.1f}%
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📈 Графики", callback_data="analytics_charts"),
-                    InlineKeyboardButton("👥 Пользователи", callback_data="analytics_users")
-                ],
-                [
-                    InlineKeyboardButton("📝 Посты", callback_data="analytics_posts"),
-                    InlineKeyboardButton("🔧 Расширенная", callback_data="analytics_advanced")
-                ],
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Графики", callback_data="analytics_charts"),
+                InlineKeyboardButton("👥 Пользователи", callback_data="analytics_users")
+            ],
+            [
+                InlineKeyboardButton("📝 Посты", callback_data="analytics_posts"),
+                InlineKeyboardButton("🔧 Расширенная", callback_data="analytics_advanced")
+            ],
+            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в show_general_analytics: {e}")
 
-async def user_personal_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def user_personal_stats_callback(update: Update, context: BotContext) -> None:
     """Callback для персональной статистики пользователя"""
     try:
-        db = get_session()
+        db = context.db
+        analytics_service = AsyncAnalyticsService(db)
         
-        try:
-            user_service = UserService(db)
-            analytics_service = AnalyticsService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.callback_query.edit_message_text("❌ Пользователь не найден.")
-                return
-            
-            # Получение детальной статистики пользователя
-            user_stats = analytics_service.get_detailed_user_statistics(db_user.id)
-            
-            text = f"""
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.callback_query.edit_message_text("❌ Пользователь не найден.")
+            return
+        
+        # Получение детальной статистики пользователя
+        user_stats = await analytics_service.get_detailed_user_statistics(db_user.id)
+        
+        text = f"""
 👤 **Ваша персональная статистика**
 
 📊 **Основные показатели:**
@@ -394,128 +380,90 @@ async def user_personal_stats_callback(update: Update, context: ContextTypes.DEF
 • Ранг активности: {user_stats.get('activity_rank', 'N/A')}
 • Процентиль публикаций: {user_stats.get('publication_percentile', 0):.1f}%
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📈 Мои графики", callback_data="analytics_personal_charts"),
-                    InlineKeyboardButton("📋 Детали", callback_data="analytics_personal_detailed")
-                ],
-                [
-                    InlineKeyboardButton("📊 Общая аналитика", callback_data="analytics_general"),
-                    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                ]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Мои графики", callback_data="analytics_personal_charts"),
+                InlineKeyboardButton("📋 Детали", callback_data="analytics_personal_detailed")
+            ],
+            [
+                InlineKeyboardButton("📊 Общая аналитика", callback_data="analytics_general"),
+                InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+            ]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в user_personal_stats_callback: {e}")
 
-async def generate_analytics_charts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Генерация графиков общей аналитики"""
-    try:
-        await update.callback_query.answer("📈 Генерация графиков...")
+ANALYTICS_CHARTS_CAPTION = "📈 **Графики общей аналитики системы**\n\nАнализ активности за последние 30 дней"
+
+async def generate_analytics_charts(update: Update, context: BotContext) -> None:
+    """Генерация графиков общей аналитики (фоновая задача)"""
+    # Графики за сегодня уже построены - отправка без фоновой задачи
+    png = chart_renderer.cached("analytics", stats_day())
+    if png is not None:
+        await update.callback_query.answer()
+        await context.bot.send_photo(
+            chat_id=update.effective_chat.id,
+            photo=png,
+            caption=ANALYTICS_CHARTS_CAPTION,
+            parse_mode='Markdown'
+        )
+        return
+    
+    await submit_job(
+        update,
+        context,
+        key=("charts", update.effective_chat.id),
+        title="📈 Графики аналитики",
+        work=run_charts_job,
+        cost=Config.RATE_LIMIT_CHARTS_COST
+    )
+
+async def run_charts_job(job: Job) -> JobResult:
+    """Сбор данных и построение графиков общей аналитики"""
+    day = stats_day()
+    png = chart_renderer.cached("analytics", day)
+    
+    if png is None:
+        job.report("сбор данных...")
         
-        db = get_session()
+        async with get_async_session() as db:
+            analytics_service = AsyncAnalyticsService(db)
+            daily_stats = await analytics_service.get_daily_statistics(days=30)
+            template_stats = await analytics_service.get_template_usage_stats()
         
-        try:
-            analytics_service = AnalyticsService(db)
-            
-            # Получение данных для графиков
-            daily_stats = analytics_service.get_daily_statistics(days=30)
-            
-            # Создание графика активности пользователей
-            plt.figure(figsize=(12, 8))
-            
-            # График 1: Активность пользователей
-            plt.subplot(2, 2, 1)
-            dates = [stat['date'] for stat in daily_stats]
-            user_activities = [stat['user_activities'] for stat in daily_stats]
-            
-            plt.plot(dates, user_activities, marker='o', color='#2E86AB')
-            plt.title('Активность пользователей (30 дней)')
-            plt.xlabel('Дата')
-            plt.ylabel('Количество действий')
-            plt.xticks(rotation=45)
-            plt.grid(True, alpha=0.3)
-            
-            # График 2: Создание постов
-            plt.subplot(2, 2, 2)
-            post_creations = [stat['posts_created'] for stat in daily_stats]
-            
-            plt.bar(dates, post_creations, color='#A23B72', alpha=0.7)
-            plt.title('Создание постов (30 дней)')
-            plt.xlabel('Дата')
-            plt.ylabel('Количество постов')
-            plt.xticks(rotation=45)
-            plt.grid(True, alpha=0.3)
-            
-            # График 3: Новые пользователи
-            plt.subplot(2, 2, 3)
-            new_users = [stat['new_users'] for stat in daily_stats]
-            
-            plt.plot(dates, new_users, marker='s', color='#F18F01', linewidth=2)
-            plt.title('Новые пользователи (30 дней)')
-            plt.xlabel('Дата')
-            plt.ylabel('Количество пользователей')
-            plt.xticks(rotation=45)
-            plt.grid(True, alpha=0.3)
-            
-            # График 4: Использование шаблонов
-            plt.subplot(2, 2, 4)
-            template_stats = analytics_service.get_template_usage_stats()
-            
-            template_names = [stat['template_name'] for stat in template_stats[:5]]
-            usage_counts = [stat['usage_count'] for stat in template_stats[:5]]
-            
-            plt.pie(usage_counts, labels=template_names, autopct='%1.1f%%', startangle=90)
-            plt.title('Использование шаблонов')
-            
-            plt.tight_layout()
-            
-            # Сохранение графика в буфер
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-            buf.seek(0)
-            
-            # Отправка графика
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=buf,
-                caption="📈 **Графики общей аналитики системы**\n\nАнализ активности за последние 30 дней",
-                parse_mode='Markdown'
-            )
-            
-            plt.close()
-            buf.close()
-            
-        finally:
-            db.close()
-            
-    except Exception as e:
-        logger.error(f"Ошибка в generate_analytics_charts: {e}")
-        await update.callback_query.message.reply_text("❌ Ошибка при генерации графиков.")
-
-async def show_admin_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # Отрисовка идет в отдельном процессе и не блокирует цикл событий
+        job.report("построение графиков...")
+        png = await chart_renderer.render(
+            "analytics", day, render_analytics_charts, daily_stats, template_stats[:5]
+        )
+    
+    return JobResult(
+        file=io.BytesIO(png),
+        filename="analytics_charts.png",
+        caption=ANALYTICS_CHARTS_CAPTION,
+        photo=True,
+        parse_mode='Markdown'
+    )
+
+async def show_admin_analytics(update: Update, context: BotContext) -> None:
     """Показ расширенной аналитики для администраторов"""
     try:
         # Проверка прав администратора
-        db = get_session()
-        try:
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user or not db_user.is_admin:
-                await update.callback_query.edit_message_text("❌ Недостаточно прав.")
-                return
-            
-            analytics_service = AnalyticsService(db)
-            admin_analytics = analytics_service.get_admin_analytics()
-            
-            text = f"""
+        db = context.db
+        db_user = context.db_user
+        
+        if not db_user or not db_user.is_admin:
+            await update.callback_query.edit_message_text("❌ Недостаточно прав.")
+            return
+        
+        analytics_service = AsyncAnalyticsService(db)
+        admin_analytics = await analytics_service.get_admin_analytics()
+        
+        text = f"""
 👑 **Расширенная аналитика (Админ)**
 
 🎯 **Ключевые метрики:**
@@ -539,103 +487,120 @@ async def show_admin_analytics(update: Update, context: ContextTypes.DEFAULT_TYP
 • Рост постов: {admin_analytics['post_growth_rate']:+.1f}%
 • Изменение активности: {admin_analytics['activity_change']:+.1f}%
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📈 Детальные графики", callback_data="analytics_admin_charts"),
-                    InlineKeyboardButton("👥 Анализ пользователей", callback_data="analytics_user_analysis")
-                ],
-                [
-                    InlineKeyboardButton("📝 Анализ контента", callback_data="analytics_content_analysis"),
-                    InlineKeyboardButton("🔍 Поведенческий анализ", callback_data="analytics_behavior")
-                ],
-                [
-                    InlineKeyboardButton("📤 Экспорт отчета", callback_data="analytics_export_admin_report"),
-                    InlineKeyboardButton("🔙 Назад", callback_data="analytics_general")
-                ]
-            ])
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📈 Детальные графики", callback_data="analytics_admin_charts"),
+                InlineKeyboardButton("👥 Анализ пользователей", callback_data="analytics_user_analysis")
+            ],
+            [
+                InlineKeyboardButton("📝 Анализ контента", callback_data="analytics_content_analysis"),
+                InlineKeyboardButton("🔍 Поведенческий анализ", callback_data="analytics_behavior")
+            ],
+            [
+                InlineKeyboardButton("📤 Экспорт отчета", callback_data="analytics_export_admin_report"),
+                InlineKeyboardButton("🔙 Назад", callback_data="analytics_general")
+            ]
+        ])
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в show_admin_analytics: {e}")
 
-async def handle_export_request(update: Update, context: ContextTypes.DEFAULT_TYPE, export_type: str) -> None:
-    """Обработка запроса на экспорт данных"""
+async def handle_export_request(update: Update, context: BotContext, export_type: str) -> None:
+    """Обработка запроса на экспорт данных (фоновая задача)"""
     try:
-        await update.callback_query.answer("📤 Подготовка экспорта...")
+        db_user = context.db_user
         
-        db = get_session()
+        if not db_user or not db_user.is_admin:
+            await update.callback_query.answer("❌ Экспорт доступен только администраторам", show_alert=True)
+            return
         
-        try:
-            analytics_service = AnalyticsService(db)
-            
-            if export_type == "analytics_csv":
-                # Экспорт аналитики в CSV
-                analytics_data = analytics_service.get_daily_statistics(days=365)
-                df = pd.DataFrame(analytics_data)
-                
-                # Создание CSV в буфер
-                csv_buffer = io.StringIO()
-                df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                csv_buffer.seek(0)
-                
-                # Конвертация в байты для отправки
-                csv_bytes = io.BytesIO(csv_buffer.getvalue().encode('utf-8'))
-                csv_bytes.name = f"analytics_{datetime.now().strftime('%Y%m%d')}.csv"
-                
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=csv_bytes,
-                    caption="📊 Экспорт аналитики в формате CSV",
-                    filename=f"analytics_{datetime.now().strftime('%Y%m%d')}.csv"
-                )
-                
-            elif export_type == "users_csv":
-                # Экспорт пользователей в CSV
-                user_service = UserService(db)
-                users_data = analytics_service.export_users_data()
-                df = pd.DataFrame(users_data)
-                
-                csv_buffer = io.StringIO()
-                df.to_csv(csv_buffer, index=False, encoding='utf-8')
-                csv_buffer.seek(0)
-                
-                csv_bytes = io.BytesIO(csv_buffer.getvalue().encode('utf-8'))
-                csv_bytes.name = f"users_{datetime.now().strftime('%Y%m%d')}.csv"
-                
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=csv_bytes,
-                    caption="👥 Экспорт данных пользователей в формате CSV",
-                    filename=f"users_{datetime.now().strftime('%Y%m%d')}.csv"
-                )
-                
-            elif export_type == "posts_json":
-                # Экспорт постов в JSON
-                posts_data = analytics_service.export_posts_data()
-                
-                import json
-                json_str = json.dumps(posts_data, ensure_ascii=False, indent=2, default=str)
-                json_bytes = io.BytesIO(json_str.encode('utf-8'))
-                json_bytes.name = f"posts_{datetime.now().strftime('%Y%m%d')}.json"
-                
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=json_bytes,
-                    caption="📝 Экспорт данных постов в формате JSON",
-                    filename=f"posts_{datetime.now().strftime('%Y%m%d')}.json"
-                )
-                
-            else:
-                await update.callback_query.message.reply_text("❌ Неизвестный тип экспорта.")
-                
-        finally:
-            db.close()
+        dataset, _, export_format = export_type.rpartition("_")
+        
+        if dataset not in EXPORT_DATASETS or export_format not in EXPORT_FORMATS:
+            await update.callback_query.answer()
+            await update.callback_query.message.reply_text("❌ Неизвестный тип экспорта.")
+            return
+        
+        await submit_job(
+            update,
+            context,
+            key=("export", db_user.id, dataset, EXPORT_FORMATS[export_format]),
+            title=f"{EXPORT_CAPTIONS[dataset]} ({EXPORT_FORMATS[export_format].upper()})",
+            work=partial(run_export_job, dataset, export_format),
+            cost=Config.RATE_LIMIT_EXPORT_COST
+        )
             
     except Exception as e:
         logger.error(f"Ошибка в handle_export_request: {e}")
         await update.callback_query.message.reply_text("❌ Ошибка при экспорте данных.")
+
+async def run_export_job(dataset: str, export_format: str, job: Job) -> JobResult:
+    """Потоковая выгрузка набора данных в файл"""
+    job.report("выгрузка данных...")
+    
+    # Сессия обновления закрывается после ответа на нажатие, у задачи своя
+    async with get_async_session() as db:
+        # Строки пишутся в файл по мере чтения из базы, не более EXPORT_LIMIT
+        result = await AsyncExportService(db).export(
+            dataset,
+            export_format,
+            progress=lambda rows: job.report(f"выгружено строк: {rows}")
+        )
+    
+    caption = f"{EXPORT_CAPTIONS[dataset]} в формате {EXPORT_FORMATS[export_format].upper()}"
+    if result.truncated:
+        caption += f"\n⚠️ Выгружены первые {result.rows} строк (лимит экспорта)"
+    
+    return JobResult(file=result.file, filename=result.filename, caption=caption)
+
+async def submit_job(update: Update, context: BotContext, key, title: str, work,
+                     cost: float = 1) -> None:
+    """Постановка фоновой задачи с ответом на нажатие кнопки (cost - стоимость в лимите запросов)"""
+    query = update.callback_query
+    db_user = context.db_user
+    
+    if not db_user:
+        await query.answer("❌ Пользователь не найден. Используйте /start", show_alert=True)
+        return
+    
+    try:
+        if job_runner.check(db_user.id, key) is not None:
+            await query.answer("⏳ Эта задача уже выполняется", show_alert=True)
+            return
+        
+        # Стоимость списывается только за новую задачу, а не за повтор или отказ по лимиту
+        if not await check_rate_limit(update, cost):
+            return
+        
+        job, created = job_runner.submit(
+            context.bot,
+            owner_id=db_user.id,
+            chat_id=update.effective_chat.id,
+            key=key,
+            title=title,
+            work=work
+        )
+    except JobLimitError:
+        await query.answer(
+            f"⏳ Одновременно выполняется не больше {job_runner.max_per_owner} задач. "
+            f"Дождитесь завершения или отмените одну из них.",
+            show_alert=True
+        )
+        return
+    
+    if created:
+        await query.answer("⏳ Задача запущена, результат придет отдельным сообщением")
+    else:
+        await query.answer("⏳ Эта задача уже выполняется", show_alert=True)
+
+async def cancel_job(update: Update, context: BotContext, job_id: int) -> None:
+    """Отмена фоновой задачи ее владельцем"""
+    db_user = context.db_user
+    
+    if db_user and job_runner.cancel(job_id, db_user.id):
+        await update.callback_query.answer("🚫 Задача отменяется...")
+    else:
+        await update.callback_query.answer("Задача уже завершена", show_alert=True)
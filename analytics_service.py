@@ -3,8 +3,11 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc, case, cast, Date
+from sqlalchemy import func, and_, desc, case, select, true
 from models import User, Post, UserActivity, Analytics, PostTemplate
+from database import AsyncServiceAdapter
+from services.daily_stats_service import DailyStatsService, stats_day
+from services.user_service import UserService
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import json
@@ -27,6 +30,9 @@ class AnalyticsService:
             self.db.add(activity)
             self.db.flush()
             
+            DailyStatsService(self.db).increment(stats_day(activity.timestamp), user_activities=1)
+            UserService(self.db).increment_counters(user_id, activities_count=1)
+            
             return activity
             
         except Exception as e:
@@ -54,47 +60,51 @@ class AnalyticsService:
             raise e
     
     def get_basic_analytics(self) -> Dict[str, Any]:
-        """Получение базовой аналитики"""
+        """Получение базовой аналитики (один запрос с условными агрегатами)"""
         now = datetime.utcnow()
         week_ago = now - timedelta(days=7)
         
-        # Основные показатели
-        total_users = self.db.query(User).count()
-        total_posts = self.db.query(Post).filter(Post.is_deleted == False).count()
-        published_posts = self.db.query(Post).filter(
-            and_(Post.is_published == True, Post.is_deleted == False)
-        ).count()
-        
-        # Активные пользователи за неделю
-        weekly_active_users = self.db.query(User).filter(
-            and_(
-                User.last_activity >= week_ago,
-                User.is_active == True
-            )
-        ).count()
-        
-        # Новые пользователи за неделю
-        new_users_week = self.db.query(User).filter(
-            User.created_at >= week_ago
-        ).count()
+        # Показатели пользователей
+        users_stats = select(
+            func.count().label('total_users'),
+            # Активные пользователи за неделю
+            func.count().filter(
+                and_(User.last_activity >= week_ago, User.is_active == True)
+            ).label('weekly_active_users'),
+            # Новые пользователи за неделю
+            func.count().filter(User.created_at >= week_ago).label('new_users_week')
+        ).select_from(User).subquery()
+        
+        # Показатели постов (без удаленных)
+        posts_stats = select(
+            func.count().label('total_posts'),
+            func.count().filter(Post.is_published == True).label('published_posts'),
+            # Новые посты за неделю
+            func.count().filter(Post.created_at >= week_ago).label('new_posts_week')
+        ).select_from(Post).where(Post.is_deleted == False).subquery()
         
-        # Новые посты за неделю
-        new_posts_week = self.db.query(Post).filter(
-            and_(
-                Post.created_at >= week_ago,
-                Post.is_deleted == False
+        # Активности за неделю
+        activities_stats = select(
+            func.count().label('user_activities_week')
+        ).select_from(UserActivity).where(UserActivity.timestamp >= week_ago).subquery()
+        
+        stats = self.db.execute(
+            select(users_stats, posts_stats, activities_stats).select_from(
+                users_stats
+                .join(posts_stats, true())
+                .join(activities_stats, true())
             )
-        ).count()
+        ).one()
         
-        # Активности за неделю
-        user_activities_week = self.db.query(UserActivity).filter(
-            UserActivity.timestamp >= week_ago
-        ).count()
+        total_users = stats.total_users
+        total_posts = stats.total_posts
+        published_posts = stats.published_posts
+        weekly_active_users = stats.weekly_active_users
+        new_users_week = stats.new_users_week
+        new_posts_week = stats.new_posts_week
+        user_activities_week = stats.user_activities_week
         
         # Конверсия в публикацию
-        draft_posts = self.db.query(Post).filter(
-            and_(Post.is_published == False, Post.is_deleted == False)
-        ).count()
         publication_rate = (published_posts / total_posts * 100) if total_posts > 0 else 0
         
         # Среднее постов на пользователя
@@ -319,13 +329,12 @@ class AnalyticsService:
         ).group_by(Post.template_type).order_by(desc('usage_count')).all()
         
         # Получение названий шаблонов из utils/templates.py
-        from utils.templates import get_post_templates
-        templates_info = {t['id']: t['name'] for t in get_post_templates()}
+        from utils.templates import get_template_name
         
         return [
             {
                 'id': result.template_type,
-                'name': templates_info.get(result.template_type, result.template_type),
+                'name': get_template_name(result.template_type),
                 'usage_count': result.usage_count
             }
             for result in results
@@ -344,223 +353,175 @@ class AnalyticsService:
         ).group_by(Post.template_type).order_by(desc('usage_count')).all()
         
         # Получение названий шаблонов
-        from utils.templates import get_post_templates
-        templates_info = {t['id']: t['name'] for t in get_post_templates()}
+        from utils.templates import get_template_name
         
         return [
             {
                 'template_type': result.template_type,
-                'template_name': templates_info.get(result.template_type, result.template_type),
+                'template_name': get_template_name(result.template_type),
                 'usage_count': result.usage_count
             }
             for result in results
         ]
     
     def get_daily_statistics(self, days: int = 30) -> List[Dict[str, Any]]:
-        """Получение ежедневной статистики"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Статистика активности пользователей
-        user_activities = self.db.query(
-            cast(UserActivity.timestamp, Date).label('date'),
-            func.count(UserActivity.id).label('user_activities')
-        ).filter(
-            UserActivity.timestamp >= cutoff_date
-        ).group_by(cast(UserActivity.timestamp, Date)).subquery()
-        
-        # Статистика создания постов
-        post_creations = self.db.query(
-            cast(Post.created_at, Date).label('date'),
-            func.count(Post.id).label('posts_created')
-        ).filter(
-            and_(
-                Post.created_at >= cutoff_date,
-                Post.is_deleted == False
-            )
-        ).group_by(cast(Post.created_at, Date)).subquery()
-        
-        # Статистика новых пользователей
-        new_users = self.db.query(
-            cast(User.created_at, Date).label('date'),
-            func.count(User.id).label('new_users')
-        ).filter(
-            User.created_at >= cutoff_date
-        ).group_by(cast(User.created_at, Date)).subquery()
-        
-        # Объединение всех статистик
-        # Создаем список дат
-        date_list = []
-        current_date = cutoff_date.date()
-        end_date = datetime.utcnow().date()
+        """Получение ежедневной статистики (из таблицы daily_stats)"""
+        end_date = stats_day()
+        current_date = end_date - timedelta(days=days)
         
-        while current_date <= end_date:
-            date_list.append(current_date)
-            current_date += timedelta(days=1)
-        
-        # Получаем данные из подзапросов
-        user_activity_data = {
-            row.date: row.user_activities for row in self.db.query(user_activities).all()
-        }
-        post_creation_data = {
-            row.date: row.posts_created for row in self.db.query(post_creations).all()
-        }
-        new_user_data = {
-            row.date: row.new_users for row in self.db.query(new_users).all()
+        daily_stats = {
+            stats.date: stats for stats in DailyStatsService(self.db).get_daily_stats(days)
         }
         
-        # Формируем итоговый список
+        # Формируем итоговый список (дни без данных заполняются нулями)
         result = []
-        for date in date_list:
+        while current_date <= end_date:
+            stats = daily_stats.get(current_date)
             result.append({
-                'date': date,
-                'user_activities': user_activity_data.get(date, 0),
-                'posts_created': post_creation_data.get(date, 0),
-                'new_users': new_user_data.get(date, 0)
+                'date': current_date,
+                'user_activities': stats.user_activities if stats else 0,
+                'posts_created': stats.posts_created if stats else 0,
+                'new_users': stats.new_users if stats else 0
             })
+            current_date += timedelta(days=1)
         
         return result
     
     def get_admin_analytics(self) -> Dict[str, Any]:
-        """Получение расширенной аналитики для администраторов"""
+        """Получение расширенной аналитики для администраторов (один запрос)"""
         now = datetime.utcnow()
         yesterday = now - timedelta(days=1)
         week_ago = now - timedelta(days=7)
         month_ago = now - timedelta(days=30)
+        # Окно трендов: последний месяц и предыдущий
+        prev_month_start = month_ago - timedelta(days=30)
         
-        # DAU, WAU, MAU
-        daily_active_users = self.db.query(User).filter(
-            and_(
-                User.last_activity >= yesterday,
-                User.is_active == True
-            )
-        ).count()
-        
-        weekly_active_users = self.db.query(User).filter(
-            and_(
-                User.last_activity >= week_ago,
-                User.is_active == True
-            )
-        ).count()
+        # Пользователи: DAU/WAU/MAU, retention, рост за месяц
+        users_stats = select(
+            func.count().label('total_users'),
+            func.count().filter(
+                and_(User.last_activity >= yesterday, User.is_active == True)
+            ).label('daily_active_users'),
+            func.count().filter(
+                and_(User.last_activity >= week_ago, User.is_active == True)
+            ).label('weekly_active_users'),
+            func.count().filter(
+                and_(User.last_activity >= month_ago, User.is_active == True)
+            ).label('monthly_active_users'),
+            # Retention Rate (пользователи, которые вернулись через неделю)
+            func.count().filter(
+                and_(User.created_at <= week_ago, User.created_at >= month_ago)
+            ).label('week_old_users'),
+            func.count().filter(
+                and_(
+                    User.created_at <= week_ago,
+                    User.created_at >= month_ago,
+                    User.last_activity >= yesterday
+                )
+            ).label('retained_users'),
+            func.count().filter(User.created_at >= month_ago).label('current_month_users'),
+            func.count().filter(
+                and_(User.created_at >= prev_month_start, User.created_at < month_ago)
+            ).label('prev_month_users'),
+            # Итоги по счетчикам пользователей (без сканирования posts и user_activities)
+            func.count().filter(User.posts_count > 0).label('users_with_posts'),
+            func.coalesce(func.sum(User.posts_count), 0).label('total_posts'),
+            func.coalesce(func.sum(User.published_posts_count), 0).label('published_posts'),
+            func.coalesce(func.sum(User.activities_count), 0).label('total_activities')
+        ).select_from(User).subquery()
+        
+        # Посты (без удаленных): рост за месяц по окну трендов
+        posts_stats = select(
+            func.count().filter(Post.created_at >= month_ago).label('current_month_posts'),
+            func.count().filter(Post.created_at < month_ago).label('prev_month_posts')
+        ).select_from(Post).where(
+            and_(Post.created_at >= prev_month_start, Post.is_deleted == False)
+        ).subquery()
+        
+        # Активности: изменение за месяц по окну трендов
+        activities_stats = select(
+            func.count().filter(UserActivity.timestamp >= month_ago).label('current_month_activities'),
+            func.count().filter(UserActivity.timestamp < month_ago).label('prev_month_activities')
+        ).select_from(UserActivity).where(UserActivity.timestamp >= prev_month_start).subquery()
+        
+        # Пик активности (час) и самый продуктивный день недели считаются
+        # по окну трендов, а не по всей истории
+        activity_hour = func.extract('hour', UserActivity.timestamp)
+        peak_activity_hour = (
+            select(activity_hour)
+            .where(UserActivity.timestamp >= prev_month_start)
+            .group_by(activity_hour)
+            .order_by(desc(func.count()))
+            .limit(1)
+            .scalar_subquery()
+        )
         
-        monthly_active_users = self.db.query(User).filter(
-            and_(
-                User.last_activity >= month_ago,
-                User.is_active == True
-            )
-        ).count()
+        post_dow = func.extract('dow', Post.created_at)
+        most_productive_dow = (
+            select(post_dow)
+            .where(and_(Post.created_at >= prev_month_start, Post.is_deleted == False))
+            .group_by(post_dow)
+            .order_by(desc(func.count()))
+            .limit(1)
+            .scalar_subquery()
+        )
         
-        # Retention Rate (пользователи, которые вернулись через неделю)
-        week_old_users = self.db.query(User).filter(
-            and_(
-                User.created_at <= week_ago,
-                User.created_at >= month_ago
+        stats = self.db.execute(
+            select(
+                users_stats,
+                posts_stats,
+                activities_stats,
+                peak_activity_hour.label('peak_activity_hour'),
+                most_productive_dow.label('most_productive_dow')
+            ).select_from(
+                users_stats
+                .join(posts_stats, true())
+                .join(activities_stats, true())
             )
-        ).count()
+        ).one()
         
-        retained_users = self.db.query(User).filter(
-            and_(
-                User.created_at <= week_ago,
-                User.created_at >= month_ago,
-                User.last_activity >= yesterday
-            )
-        ).count()
+        total_users = stats.total_users
+        daily_active_users = stats.daily_active_users
+        weekly_active_users = stats.weekly_active_users
+        monthly_active_users = stats.monthly_active_users
         
-        retention_rate = (retained_users / week_old_users * 100) if week_old_users > 0 else 0
+        week_old_users = stats.week_old_users
+        retention_rate = (stats.retained_users / week_old_users * 100) if week_old_users > 0 else 0
         
         # Конверсии
-        total_users = self.db.query(User).count()
-        users_with_posts = self.db.query(User).join(Post).filter(
-            Post.is_deleted == False
-        ).distinct().count()
-        
-        first_post_conversion = (users_with_posts / total_users * 100) if total_users > 0 else 0
+        first_post_conversion = (stats.users_with_posts / total_users * 100) if total_users > 0 else 0
         
         # Конверсия публикации
-        total_posts = self.db.query(Post).filter(Post.is_deleted == False).count()
-        published_posts = self.db.query(Post).filter(
-            and_(Post.is_published == True, Post.is_deleted == False)
-        ).count()
-        
-        publication_conversion = (published_posts / total_posts * 100) if total_posts > 0 else 0
+        total_posts = stats.total_posts
+        publication_conversion = (stats.published_posts / total_posts * 100) if total_posts > 0 else 0
         
         # Вовлеченность пользователей (среднее активностей на пользователя)
-        total_activities = self.db.query(UserActivity).count()
-        user_engagement = total_activities / total_users if total_users > 0 else 0
+        user_engagement = stats.total_activities / total_users if total_users > 0 else 0
         
         # Производительность
         # Среднее время создания поста (условно - время между регистрацией и первым постом)
         avg_creation_time = "Менее часа"  # Упрощенная метрика
         
-        # Пик активности (час)
-        peak_activity_result = self.db.query(
-            func.extract('hour', UserActivity.timestamp).label('hour'),
-            func.count(UserActivity.id).label('count')
-        ).group_by('hour').order_by(desc('count')).first()
-        
-        peak_activity_hour = int(peak_activity_result.hour) if peak_activity_result else 12
-        
-        # Самый продуктивный день недели
-        most_productive_day_result = self.db.query(
-            func.extract('dow', Post.created_at).label('dow'),
-            func.count(Post.id).label('count')
-        ).filter(
-            Post.is_deleted == False
-        ).group_by('dow').order_by(desc('count')).first()
+        peak_activity_hour = int(stats.peak_activity_hour) if stats.peak_activity_hour is not None else 12
         
         days_map = {0: 'Воскресенье', 1: 'Понедельник', 2: 'Вторник', 3: 'Среда', 
                    4: 'Четверг', 5: 'Пятница', 6: 'Суббота'}
         most_productive_day = days_map.get(
-            int(most_productive_day_result.dow) if most_productive_day_result else 1, 
+            int(stats.most_productive_dow) if stats.most_productive_dow is not None else 1, 
             'Понедельник'
         )
         
         # Тренды (рост за последний месяц vs предыдущий месяц)
-        prev_month_start = month_ago - timedelta(days=30)
-        
-        current_month_users = self.db.query(User).filter(
-            User.created_at >= month_ago
-        ).count()
-        
-        prev_month_users = self.db.query(User).filter(
-            and_(
-                User.created_at >= prev_month_start,
-                User.created_at < month_ago
-            )
-        ).count()
-        
-        user_growth_rate = ((current_month_users - prev_month_users) / prev_month_users * 100) \
+        prev_month_users = stats.prev_month_users
+        user_growth_rate = ((stats.current_month_users - prev_month_users) / prev_month_users * 100) \
                           if prev_month_users > 0 else 0
         
-        current_month_posts = self.db.query(Post).filter(
-            and_(
-                Post.created_at >= month_ago,
-                Post.is_deleted == False
-            )
-        ).count()
-        
-        prev_month_posts = self.db.query(Post).filter(
-            and_(
-                Post.created_at >= prev_month_start,
-                Post.created_at < month_ago,
-                Post.is_deleted == False
-            )
-        ).count()
-        
-        post_growth_rate = ((current_month_posts - prev_month_posts) / prev_month_posts * 100) \
+        prev_month_posts = stats.prev_month_posts
+        post_growth_rate = ((stats.current_month_posts - prev_month_posts) / prev_month_posts * 100) \
                           if prev_month_posts > 0 else 0
         
-        current_month_activities = self.db.query(UserActivity).filter(
-            UserActivity.timestamp >= month_ago
-        ).count()
-        
-        prev_month_activities = self.db.query(UserActivity).filter(
-            and_(
-                UserActivity.timestamp >= prev_month_start,
-                UserActivity.timestamp < month_ago
-            )
-        ).count()
-        
-        activity_change = ((current_month_activities - prev_month_activities) / prev_month_activities * 100) \
+        prev_month_activities = stats.prev_month_activities
+        activity_change = ((stats.current_month_activities - prev_month_activities) / prev_month_activities * 100) \
                          if prev_month_activities > 0 else 0
         
         return {
@@ -579,57 +540,6 @@ class AnalyticsService:
             'activity_change': round(activity_change, 1)
         }
     
-    def export_users_data(self) -> List[Dict[str, Any]]:
-        """Экспорт данных пользователей"""
-        users = self.db.query(User).all()
-        
-        users_data = []
-        for user in users:
-            posts_count = len([p for p in user.posts if not p.is_deleted])
-            published_posts = len([p for p in user.posts if p.is_published and not p.is_deleted])
-            activities_count = len(user.activities)
-            
-            users_data.append({
-                'user_id': user.id,
-                'telegram_id': user.telegram_id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_admin': user.is_admin,
-                'is_active': user.is_active,
-                'created_at': user.created_at,
-                'updated_at': user.updated_at,
-                'last_activity': user.last_activity,
-                'posts_count': posts_count,
-                'published_posts': published_posts,
-                'activities_count': activities_count
-            })
-        
-        return users_data
-    
-    def export_posts_data(self) -> List[Dict[str, Any]]:
-        """Экспорт данных постов"""
-        posts = self.db.query(Post).filter(Post.is_deleted == False).all()
-        
-        posts_data = []
-        for post in posts:
-            posts_data.append({
-                'post_id': post.id,
-                'post_number': post.post_number,
-                'title': post.title,
-                'content': post.content,
-                'template_type': post.template_type,
-                'is_published': post.is_published,
-                'author_id': post.author_id,
-                'author_name': post.author.first_name or post.author.username,
-                'created_at': post.created_at,
-                'updated_at': post.updated_at,
-                'published_at': post.published_at,
-                'content_length': len(post.content)
-            })
-        
-        return posts_data
-    
     def export_analytics_data(self) -> List[Dict[str, Any]]:
         """Экспорт аналитических данных"""
         analytics = self.db.query(Analytics).order_by(desc(Analytics.date)).all()
@@ -645,3 +555,7 @@ class AnalyticsService:
             })
         
         return analytics_data
+
+class AsyncAnalyticsService(AsyncServiceAdapter):
+    """Асинхронный вариант AnalyticsService для обработчиков бота"""
+    service_class = AnalyticsService
@@ -0,0 +1,277 @@
+"""
+Бенчмарк запросов аналитики и поиска на тестовом наборе данных
+
+Запуск на отдельной базе (данные добавляются в указанную базу!):
+    python benchmark.py --database-url postgresql://.../bot_bench --seed
+    python benchmark.py --database-url postgresql://.../bot_bench --case basic_analytics
+    python benchmark.py --database-url postgresql://.../bot_bench --seed --posts 1000000 --case search_posts
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, insert, and_, desc
+from sqlalchemy.orm import sessionmaker
+
+from config import Config
+from database import Base
+from models import User, Post, UserActivity
+from services.analytics_service import AnalyticsService
+from services.daily_stats_service import DailyStatsService
+from services.post_service import PostService
+from services.user_service import UserService
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ACTIVITY_TYPES = ['start_command', 'post_create', 'post_publish', 'post_unpublish', 'user_promote']
+TEMPLATE_TYPES = ['news', 'article', 'announcement', 'event', 'product', 'service']
+BATCH_SIZE = 5000
+
+# Словарь для текстов постов: поиск должен находить часть постов, а не все или ни одного
+WORDS = [
+    'бот', 'телеграм', 'новости', 'скидка', 'акция', 'мероприятие', 'концерт', 'выставка',
+    'продукт', 'сервис', 'доставка', 'обновление', 'релиз', 'статья', 'интервью', 'обзор',
+    'город', 'погода', 'спорт', 'футбол', 'музыка', 'кино', 'книга', 'технологии',
+    'программирование', 'python', 'postgresql', 'база', 'данных', 'поиск', 'индекс', 'запрос',
+    'пользователи', 'подписчики', 'канал', 'сообщение', 'рассылка', 'конкурс', 'подарок', 'приз'
+]
+FIRST_NAMES = ['Алексей', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга', 'Никита', 'Татьяна']
+LAST_NAMES = ['Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева', 'Козлов', 'Новикова', 'Морозов', 'Петрова']
+USER_SEARCH_QUERIES = ['иван', 'смирн', 'bench_user_4242', 'Новиков', 'user_99']
+SEARCH_QUERIES = ['скидка', 'концерт выставка', 'python postgresql', 'доставки', 'подарок']
+
+def _random_text(rnd: random.Random, words: int) -> str:
+    """Случайный текст из словаря"""
+    return ' '.join(rnd.choices(WORDS, k=words))
+
+class QueryCounter:
+    """Подсчет запросов, отправленных через движок"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def _insert_batches(db, model, rows):
+    """Вставка строк пакетами"""
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(model), rows[i:i + BATCH_SIZE])
+    db.commit()
+
+def seed_dataset(db, users: int, posts: int, activities: int):
+    """Заполнение базы тестовыми данными"""
+    now = datetime.utcnow()
+    rnd = random.Random(42)
+    base_telegram_id = 10 ** 12 + int(now.timestamp())
+
+    logger.info(f"🌱 Пользователи: {users}")
+    _insert_batches(db, User, [
+        {
+            'telegram_id': base_telegram_id + i,
+            'username': f'bench_user_{i}',
+            'first_name': rnd.choice(FIRST_NAMES),
+            'last_name': rnd.choice(LAST_NAMES),
+            'is_admin': i % 100 == 0,
+            'is_active': rnd.random() > 0.05,
+            'created_at': now - timedelta(days=rnd.randint(0, 365)),
+            'last_activity': now - timedelta(days=rnd.randint(0, 60))
+        }
+        for i in range(users)
+    ])
+
+    user_ids = [row[0] for row in db.query(User.id).filter(User.telegram_id >= base_telegram_id)]
+
+    logger.info(f"🌱 Посты: {posts}")
+    _insert_batches(db, Post, [
+        {
+            'title': _random_text(rnd, 5).capitalize(),
+            'content': _random_text(rnd, rnd.randint(20, 80)),
+            'template_type': rnd.choice(TEMPLATE_TYPES),
+            'is_published': rnd.random() > 0.4,
+            'is_deleted': rnd.random() < 0.05,
+            'author_id': rnd.choice(user_ids),
+            'created_at': now - timedelta(days=rnd.randint(0, 365))
+        }
+        for i in range(posts)
+    ])
+
+    logger.info(f"🌱 Активности: {activities}")
+    _insert_batches(db, UserActivity, [
+        {
+            'user_id': rnd.choice(user_ids),
+            'activity_type': rnd.choice(ACTIVITY_TYPES),
+            'timestamp': now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+        }
+        for _ in range(activities)
+    ])
+
+    # Строки вставлены напрямую, минуя сервисы: счетчики пользователей и
+    # дневная статистика пересчитываются так же, как в init_db.py
+    logger.info("🌱 Счетчики пользователей и дневная статистика")
+    UserService(db).reconcile_counters()
+    DailyStatsService(db).rebuild()
+
+def legacy_basic_analytics(db):
+    """Прежняя реализация get_basic_analytics (отдельный COUNT на каждый показатель)"""
+    week_ago = datetime.utcnow() - timedelta(days=7)
+
+    total_users = db.query(User).count()
+    total_posts = db.query(Post).filter(Post.is_deleted == False).count()
+    published_posts = db.query(Post).filter(
+        and_(Post.is_published == True, Post.is_deleted == False)
+    ).count()
+    weekly_active_users = db.query(User).filter(
+        and_(User.last_activity >= week_ago, User.is_active == True)
+    ).count()
+    new_users_week = db.query(User).filter(User.created_at >= week_ago).count()
+    new_posts_week = db.query(Post).filter(
+        and_(Post.created_at >= week_ago, Post.is_deleted == False)
+    ).count()
+    user_activities_week = db.query(UserActivity).filter(
+        UserActivity.timestamp >= week_ago
+    ).count()
+    db.query(Post).filter(
+        and_(Post.is_published == False, Post.is_deleted == False)
+    ).count()
+
+    return {
+        'total_users': total_users,
+        'total_posts': total_posts,
+        'published_posts': published_posts,
+        'weekly_active_users': weekly_active_users,
+        'new_users_week': new_users_week,
+        'new_posts_week': new_posts_week,
+        'user_activities_week': user_activities_week
+    }
+
+def legacy_search_posts(db, query: str, limit: int = 20):
+    """Прежняя реализация search_posts (ILIKE по заголовку и содержимому)"""
+    search_term = f"%{query}%"
+    return db.query(Post).filter(
+        and_(
+            Post.is_deleted == False,
+            Post.is_published == True,
+            (Post.title.ilike(search_term) | Post.content.ilike(search_term))
+        )
+    ).order_by(desc(Post.published_at)).limit(limit).all()
+
+def legacy_search_users(db, query: str):
+    """Прежняя реализация search_users (ILIKE по трем колонкам, без лимита)"""
+    search_term = f"%{query}%"
+    return db.query(User).filter(
+        (User.first_name.ilike(search_term)) |
+        (User.last_name.ilike(search_term)) |
+        (User.username.ilike(search_term))
+    ).filter(User.is_active == True).all()
+
+def measure(name: str, func, counter: QueryCounter, repeats: int):
+    """Замер количества запросов и времени выполнения"""
+    func()  # прогрев
+
+    counter.count = 0
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    queries = counter.count / repeats
+    logger.info(
+        f"{name:<40} запросов: {queries:>4.0f}   "
+        f"медиана: {statistics.median(timings):>8.2f} мс   "
+        f"p95: {sorted(timings)[int(len(timings) * 0.95) - 1]:>8.2f} мс"
+    )
+
+def bench_basic_analytics(db, counter: QueryCounter, repeats: int):
+    """get_basic_analytics: до и после"""
+    analytics_service = AnalyticsService(db)
+
+    expected = legacy_basic_analytics(db)
+    actual = analytics_service.get_basic_analytics()
+    mismatched = [key for key, value in expected.items() if actual[key] != value]
+    if mismatched:
+        logger.error(f"❌ Результаты различаются: {mismatched}")
+
+    measure("basic_analytics (прежняя реализация)", lambda: legacy_basic_analytics(db), counter, repeats)
+    measure("basic_analytics", analytics_service.get_basic_analytics, counter, repeats)
+
+def bench_admin_analytics(db, counter: QueryCounter, repeats: int):
+    """get_admin_analytics"""
+    analytics_service = AnalyticsService(db)
+    measure("admin_analytics", analytics_service.get_admin_analytics, counter, repeats)
+
+def bench_search_posts(db, counter: QueryCounter, repeats: int):
+    """search_posts: ILIKE и полнотекстовый поиск"""
+    post_service = PostService(db)
+
+    for query in SEARCH_QUERIES:
+        found = len(post_service.search_posts(query))
+        legacy_found = len(legacy_search_posts(db, query))
+        logger.info(f"«{query}»: найдено {found} (прежняя реализация: {legacy_found})")
+
+        measure(f"search_posts «{query}» (ILIKE)", lambda: legacy_search_posts(db, query), counter, repeats)
+        measure(f"search_posts «{query}»", lambda: post_service.search_posts(query), counter, repeats)
+
+def bench_search_users(db, counter: QueryCounter, repeats: int):
+    """search_users: ILIKE без лимита и триграммный поиск со страницами"""
+    user_service = UserService(db)
+
+    for query in USER_SEARCH_QUERIES:
+        users, next_cursor = user_service.search_users(query)
+        logger.info(
+            f"«{query}»: на первой странице {len(users)}, есть продолжение: {next_cursor is not None} "
+            f"(прежняя реализация: {len(legacy_search_users(db, query))})"
+        )
+
+        measure(f"search_users «{query}» (ILIKE)", lambda: legacy_search_users(db, query), counter, repeats)
+        measure(f"search_users «{query}»", lambda: user_service.search_users(query), counter, repeats)
+        if next_cursor is not None:
+            measure(
+                f"search_users «{query}» (2-я страница)",
+                lambda: user_service.search_users(query, cursor=next_cursor), counter, repeats
+            )
+
+BENCHMARKS = {
+    'basic_analytics': bench_basic_analytics,
+    'admin_analytics': bench_admin_analytics,
+    'search_posts': bench_search_posts,
+    'search_users': bench_search_users,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов бота")
+    parser.add_argument('--database-url', default=Config.get_database_url())
+    parser.add_argument('--seed', action='store_true', help="добавить тестовые данные перед замерами")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--activities', type=int, default=500000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--case', choices=sorted(BENCHMARKS), action='append')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    db = sessionmaker(bind=engine)()
+
+    try:
+        if args.seed:
+            Base.metadata.create_all(bind=engine)
+            seed_dataset(db, args.users, args.posts, args.activities)
+
+        counter = QueryCounter(engine)
+        for case in args.case or sorted(BENCHMARKS):
+            BENCHMARKS[case](db, counter, args.repeats)
+    finally:
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
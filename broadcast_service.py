@@ -0,0 +1,375 @@
+"""
+Рассылки сообщений всем пользователям
+
+Получатели читаются пакетами по users.id (keyset), после каждого пакета в
+строке рассылки сохраняются курсор и счетчики. Если процесс упал, рассылка
+продолжается с сохраненного курсора (повторно может прийти только последний
+неподтвержденный пакет). Отправка идет с приоритетом PRIORITY_BULK через
+планировщик исходящих сообщений, поэтому рассылка не превышает лимиты
+Telegram и не задерживает ответы на команды. Пользователи, заблокировавшие
+бота, отмечаются (bot_blocked_at) и в следующие рассылки не попадают.
+"""
+
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from telegram import Bot
+from telegram.error import Forbidden
+from config import Config
+from database import AsyncServiceAdapter, get_async_session
+from models import User, Broadcast
+from services.outbound import PRIORITY_BULK, send_notification
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Рассылки, которые нужно выполнить (или продолжить)
+ACTIVE_STATUSES = ('pending', 'running')
+
+class BroadcastService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_broadcast(self, text: str, created_by: Optional[int] = None,
+                         kind: str = 'custom', parse_mode: Optional[str] = None) -> Broadcast:
+        """Создание рассылки (выполняется BroadcastEngine)"""
+        broadcast = Broadcast(
+            kind=kind,
+            text=text,
+            parse_mode=parse_mode,
+            status='pending',
+            created_by=created_by,
+            last_user_id=0
+        )
+        self.db.add(broadcast)
+        self.db.flush()
+        return broadcast
+
+    def get_broadcast(self, broadcast_id: int) -> Optional[Broadcast]:
+        """Получение рассылки по ID"""
+        return self.db.get(Broadcast, broadcast_id)
+
+    def get_resumable_ids(self) -> List[int]:
+        """Незавершенные рассылки, которые сейчас никто не выполняет"""
+        now = datetime.now(timezone.utc)
+        return list(self.db.scalars(
+            select(Broadcast.id).where(
+                Broadcast.status.in_(ACTIVE_STATUSES),
+                (Broadcast.lease_until == None) | (Broadcast.lease_until < now)
+            ).order_by(Broadcast.id)
+        ))
+
+    def claim(self, broadcast_id: int, owner: str, lease: float) -> Optional[Broadcast]:
+        """
+        Захват рассылки процессом на lease секунд
+
+        Возвращает рассылку или None, если она завершена или ее выполняет
+        другой процесс (аренда еще не истекла).
+        """
+        now = datetime.now(timezone.utc)
+        claimed = self.db.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status.in_(ACTIVE_STATUSES),
+                (Broadcast.lease_until == None) | (Broadcast.lease_until < now) | (Broadcast.owner == owner)
+            )
+            .values(status='running', owner=owner, lease_until=now + timedelta(seconds=lease))
+            .returning(Broadcast.id)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if claimed is None:
+            return None
+
+        broadcast = self.get_broadcast(broadcast_id)
+        self.db.refresh(broadcast)
+        return broadcast
+
+    def get_recipients(self, after_user_id: int, limit: int) -> List[Tuple[int, int]]:
+        """Следующий пакет получателей (id, telegram_id) после курсора"""
+        return [
+            (row.id, row.telegram_id)
+            for row in self.db.execute(
+                select(User.id, User.telegram_id).where(
+                    User.id > after_user_id,
+                    User.is_active == True,
+                    User.bot_blocked_at == None
+                ).order_by(User.id).limit(limit)
+            )
+        ]
+
+    def record_batch(self, broadcast_id: int, owner: str, last_user_id: int, sent: int,
+                     failed: int, blocked_user_ids: List[int], lease: float) -> bool:
+        """
+        Сохранение результата пакета и продление аренды
+
+        Возвращает False, если рассылка отменена или перехвачена другим
+        процессом - тогда ее нужно остановить.
+        """
+        result = self.db.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.owner == owner,
+                Broadcast.status == 'running'
+            )
+            .values(
+                last_user_id=last_user_id,
+                sent_count=Broadcast.sent_count + sent,
+                failed_count=Broadcast.failed_count + failed,
+                blocked_count=Broadcast.blocked_count + len(blocked_user_ids),
+                lease_until=datetime.now(timezone.utc) + timedelta(seconds=lease)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        if blocked_user_ids:
+            self.db.execute(
+                update(User)
+                .where(User.id.in_(blocked_user_ids))
+                .values(bot_blocked_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+
+        return result.rowcount > 0
+
+    def renew_lease(self, broadcast_id: int, owner: str, lease: float) -> bool:
+        """Продление аренды (False, если рассылка отменена или перехвачена)"""
+        result = self.db.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.owner == owner,
+                Broadcast.status == 'running'
+            )
+            .values(lease_until=datetime.now(timezone.utc) + timedelta(seconds=lease))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+    def finish(self, broadcast_id: int, owner: str) -> Optional[Broadcast]:
+        """
+        Завершение рассылки, возвращает итоговую строку
+
+        Возвращает None, если рассылка уже не выполняется этим процессом
+        (отменена или перехвачена после истечения аренды).
+        """
+        result = self.db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.owner == owner, Broadcast.status == 'running')
+            .values(status='done', finished_at=datetime.now(timezone.utc), lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            return None
+
+        broadcast = self.get_broadcast(broadcast_id)
+        self.db.refresh(broadcast)
+        return broadcast
+
+    def cancel_broadcast(self, broadcast_id: int) -> bool:
+        """Отмена рассылки (выполняющий процесс остановится после текущего пакета)"""
+        result = self.db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status.in_(ACTIVE_STATUSES))
+            .values(status='cancelled', finished_at=datetime.now(timezone.utc), lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+class AsyncBroadcastService(AsyncServiceAdapter):
+    """Асинхронный вариант BroadcastService для обработчиков бота"""
+    service_class = BroadcastService
+
+class BroadcastEngine:
+    """
+    Выполнение рассылок в фоне
+
+    При запуске и затем раз в lease секунд подхватывает незавершенные
+    рассылки без действующей аренды: так рассылка упавшего процесса
+    продолжается другим процессом или после перезапуска. Пока пакет
+    отправляется, аренда продлевается каждые lease / 3 секунд, поэтому
+    медленный пакет не отдает рассылку второму процессу.
+    """
+
+    def __init__(self, batch_size: int, lease: float):
+        self.batch_size = batch_size
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def start(self, bot: Bot) -> None:
+        """Подхват незавершенных рассылок (post_init приложения)"""
+        self._watcher = asyncio.create_task(self._watch(bot), name="broadcast-watcher")
+
+    async def stop(self, *args) -> None:
+        """Остановка рассылок (post_stop); аренда истечет, и рассылка продолжится позже"""
+        tasks = list(self._tasks.values())
+        if self._watcher is not None:
+            tasks.append(self._watcher)
+            self._watcher = None
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def launch(self, bot: Bot, broadcast_id: int, notify_chat_id: Optional[int] = None) -> bool:
+        """Запуск рассылки в этом процессе (False, если она уже выполняется здесь)"""
+        if broadcast_id in self._tasks:
+            return False
+
+        task = asyncio.create_task(self._run(bot, broadcast_id, notify_chat_id), name=f"broadcast-{broadcast_id}")
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda task: self._tasks.pop(broadcast_id, None))
+        return True
+
+    async def _watch(self, bot: Bot) -> None:
+        while True:
+            try:
+                async with get_async_session() as db:
+                    broadcast_ids = await AsyncBroadcastService(db).get_resumable_ids()
+
+                for broadcast_id in broadcast_ids:
+                    if self.launch(bot, broadcast_id):
+                        logger.info(f"Продолжение рассылки {broadcast_id}")
+
+            except Exception as e:
+                logger.error(f"Ошибка при поиске незавершенных рассылок: {e}")
+
+            await asyncio.sleep(self.lease)
+
+    async def _run(self, bot: Bot, broadcast_id: int, notify_chat_id: Optional[int]) -> None:
+        """Рассылка по пакетам получателей с сохранением прогресса"""
+        try:
+            async with get_async_session() as db:
+                broadcast = await AsyncBroadcastService(db).claim(broadcast_id, self.owner, self.lease)
+                await db.commit()
+
+            if broadcast is None:
+                return
+
+            cursor = broadcast.last_user_id
+            while True:
+                async with get_async_session() as db:
+                    recipients = await AsyncBroadcastService(db).get_recipients(cursor, self.batch_size)
+
+                if not recipients:
+                    break
+
+                sending = asyncio.gather(*[
+                    self._send(bot, broadcast, telegram_id) for _, telegram_id in recipients
+                ])
+                heartbeat = asyncio.create_task(self._heartbeat(broadcast_id))
+                try:
+                    await asyncio.wait({sending, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    heartbeat.cancel()
+
+                if not sending.done():
+                    # Аренду не удалось продлить: рассылка отменена или перехвачена
+                    sending.cancel()
+                    await asyncio.gather(sending, return_exceptions=True)
+                    logger.info(f"Рассылка {broadcast_id} остановлена: отменена или выполняется другим процессом")
+                    return
+
+                results = sending.result()
+
+                blocked_user_ids = [
+                    user_id for (user_id, _), result in zip(recipients, results) if result == 'blocked'
+                ]
+                cursor = recipients[-1][0]
+
+                async with get_async_session() as db:
+                    running = await AsyncBroadcastService(db).record_batch(
+                        broadcast_id,
+                        self.owner,
+                        last_user_id=cursor,
+                        sent=results.count('sent'),
+                        failed=results.count('failed'),
+                        blocked_user_ids=blocked_user_ids,
+                        lease=self.lease
+                    )
+                    await db.commit()
+
+                if not running:
+                    logger.info(f"Рассылка {broadcast_id} отменена")
+                    return
+
+            async with get_async_session() as db:
+                broadcast = await AsyncBroadcastService(db).finish(broadcast_id, self.owner)
+                await db.commit()
+
+            if broadcast is None:
+                # Отменена после последнего пакета или перехвачена другим процессом
+                logger.info(f"Рассылка {broadcast_id} не завершена этим процессом")
+                return
+
+            logger.info(
+                f"Рассылка {broadcast_id} завершена: отправлено {broadcast.sent_count}, "
+                f"ошибок {broadcast.failed_count}, заблокировали бота {broadcast.blocked_count}"
+            )
+
+            if notify_chat_id is not None:
+                await send_notification(
+                    bot,
+                    notify_chat_id,
+                    f"📣 Рассылка #{broadcast_id} завершена\n\n"
+                    f"✅ Отправлено: {broadcast.sent_count}\n"
+                    f"❌ Ошибок: {broadcast.failed_count}\n"
+                    f"🚫 Заблокировали бота: {broadcast.blocked_count}"
+                )
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            # Аренда истечет, и рассылку подхватит _watch
+            logger.error(f"Ошибка в рассылке {broadcast_id}: {e}")
+
+    async def _heartbeat(self, broadcast_id: int) -> None:
+        """Продление аренды во время отправки пакета, завершается при потере аренды"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+
+            try:
+                async with get_async_session() as db:
+                    renewed = await AsyncBroadcastService(db).renew_lease(broadcast_id, self.owner, self.lease)
+                    await db.commit()
+            except Exception as e:
+                # Аренда еще действует, попытка повторится
+                logger.error(f"Ошибка при продлении аренды рассылки {broadcast_id}: {e}")
+                continue
+
+            if not renewed:
+                return
+
+    async def _send(self, bot: Bot, broadcast: Broadcast, chat_id: int) -> str:
+        """Отправка одному получателю: sent, blocked или failed"""
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=broadcast.text,
+                parse_mode=broadcast.parse_mode,
+                rate_limit_args={'priority': PRIORITY_BULK}
+            )
+            return 'sent'
+
+        except Forbidden:
+            # Бот заблокирован пользователем или аккаунт удален
+            return 'blocked'
+
+        except Exception as e:
+            logger.error(f"Ошибка при отправке рассылки пользователю {chat_id}: {e}")
+            return 'failed'
+
+# Общий исполнитель рассылок приложения
+broadcast_engine = BroadcastEngine(batch_size=Config.BROADCAST_BATCH_SIZE, lease=Config.BROADCAST_LEASE)
@@ -0,0 +1,167 @@
+"""
+Построение графиков вне цикла событий
+
+Графики рисуются в отдельном процессе (ProcessPoolExecutor): функции отрисовки
+получают только простые данные и возвращают PNG. Готовые PNG кэшируются по типу
+графика и дню данных, повторное нажатие в тот же день не запускает отрисовку.
+"""
+
+import asyncio
+from concurrent.futures import BrokenExecutor
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+from config import Config
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _pyplot():
+    """matplotlib загружается только в процессе, который рисует графики"""
+    import matplotlib
+    matplotlib.use('Agg')  # Для работы без GUI
+    import matplotlib.pyplot as plt
+    return plt
+
+def render_analytics_charts(daily_stats: list, template_stats: list) -> bytes:
+    """Построение графиков общей аналитики (PNG, выполняется в процессе-обработчике)"""
+    plt = _pyplot()
+    
+    # Создание графика активности пользователей
+    plt.figure(figsize=(12, 8))
+    
+    try:
+        # График 1: Активность пользователей
+        plt.subplot(2, 2, 1)
+        dates = [stat['date'] for stat in daily_stats]
+        user_activities = [stat['user_activities'] for stat in daily_stats]
+        
+        plt.plot(dates, user_activities, marker='o', color='#2E86AB')
+        plt.title('Активность пользователей (30 дней)')
+        plt.xlabel('Дата')
+        plt.ylabel('Количество действий')
+        plt.xticks(rotation=45)
+        plt.grid(True, alpha=0.3)
+        
+        # График 2: Создание постов
+        plt.subplot(2, 2, 2)
+        post_creations = [stat['posts_created'] for stat in daily_stats]
+        
+        plt.bar(dates, post_creations, color='#A23B72', alpha=0.7)
+        plt.title('Создание постов (30 дней)')
+        plt.xlabel('Дата')
+        plt.ylabel('Количество постов')
+        plt.xticks(rotation=45)
+        plt.grid(True, alpha=0.3)
+        
+        # График 3: Новые пользователи
+        plt.subplot(2, 2, 3)
+        new_users = [stat['new_users'] for stat in daily_stats]
+        
+        plt.plot(dates, new_users, marker='s', color='#F18F01', linewidth=2)
+        plt.title('Новые пользователи (30 дней)')
+        plt.xlabel('Дата')
+        plt.ylabel('Количество пользователей')
+        plt.xticks(rotation=45)
+        plt.grid(True, alpha=0.3)
+        
+        # График 4: Использование шаблонов
+        plt.subplot(2, 2, 4)
+        template_names = [stat['template_name'] for stat in template_stats[:5]]
+        usage_counts = [stat['usage_count'] for stat in template_stats[:5]]
+        
+        plt.pie(usage_counts, labels=template_names, autopct='%1.1f%%', startangle=90)
+        plt.title('Использование шаблонов')
+        
+        plt.tight_layout()
+        
+        # Сохранение графика в буфер
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
+        return buf.getvalue()
+        
+    finally:
+        plt.close()
+
+class ChartRenderer:
+    """Пул процессов отрисовки с кэшем PNG по (тип графика, день данных)"""
+    
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = None
+        self._cache: Dict[Tuple[str, date], asyncio.Future] = {}
+    
+    def cached(self, chart_type: str, day: date) -> Optional[bytes]:
+        """Готовый PNG из кэша (None, если его нет или отрисовка еще идет)"""
+        future = self._cache.get((chart_type, day))
+        if future is None or not future.done() or future.cancelled() or future.exception():
+            return None
+        return future.result()
+    
+    async def render(self, chart_type: str, day: date, render_func: Callable[..., bytes], *args) -> bytes:
+        """
+        Отрисовка графика в пуле процессов
+        
+        Одновременные запросы одного графика ждут одну отрисовку; ошибка
+        не кэшируется. Если процесс пула аварийно завершился (BrokenProcessPool),
+        пул пересоздается при следующем графике.
+        """
+        key = (chart_type, day)
+        future = self._cache.get(key)
+        executor = None  # Сломанный пул останавливает тот, кто запустил отрисовку
+        
+        if future is None:
+            # Графики прошлых дней больше не запрашиваются
+            for stale_key in [cached_key for cached_key in self._cache if cached_key[1] != day]:
+                del self._cache[stale_key]
+            
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                future = loop.run_in_executor(executor, render_func, *args)
+            except BrokenExecutor:
+                # Пул сломался при предыдущей отрисовке
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = loop.run_in_executor(executor, render_func, *args)
+            self._cache[key] = future
+        
+        try:
+            # Отмена ожидающей задачи не прерывает отрисовку для остальных
+            return await asyncio.shield(future)
+        except Exception as e:
+            if self._cache.get(key) is future:
+                del self._cache[key]
+            if isinstance(e, BrokenExecutor):
+                logger.error(f"Пул отрисовки графиков сломан, будет создан заново: {e}")
+                self._discard_executor(executor)
+            raise
+    
+    def _get_executor(self):
+        # Пул создается при первом графике; spawn не копирует в процесс
+        # цикл событий и соединения с базой данных
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def _discard_executor(self, executor) -> None:
+        """Остановка сломанного пула (если его еще не заменили)"""
+        if executor is not None and self._executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    async def stop(self, *args) -> None:
+        """Остановка пула процессов (post_shutdown приложения)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._cache.clear()
+
+# Общий пул отрисовки графиков приложения
+chart_renderer = ChartRenderer(max_workers=Config.CHART_WORKERS)
@@ -13,6 +13,27 @@ class Config:
     # Telegram Bot Token
     BOT_TOKEN = os.getenv("BOT_TOKEN", "your_bot_token_here")
     
+    # Режим получения обновлений: polling или webhook
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    
+    # Webhook: публичный HTTPS-адрес (TLS на обратном прокси) и локальный HTTP-сервер
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 1)))  # Процессов-обработчиков
+    
+    # Обновлений в обработке одновременно (одного пользователя - всегда по очереди);
+    # каждое держит сессию базы данных, поэтому лимит согласован с размером пула
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+    
+    # Лимиты исходящих сообщений Telegram
+    OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # Сообщений в секунду на бота
+    OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # Сообщений в секунду в личный чат
+    OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))  # Сообщений подряд в личный чат
+    OUTBOUND_GROUP_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_PER_MINUTE", "20"))  # Сообщений в минуту в группу
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # Повторов после RetryAfter
+    
     # Database configuration
     DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/telegram_bot")
     
@@ -31,6 +52,49 @@ class Config:
     
     # Настройки экспорта
     EXPORT_LIMIT = int(os.getenv("EXPORT_LIMIT", "10000"))
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # Строк за одно чтение курсора
+    EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(5 * 1024 * 1024)))  # Байт в памяти до переноса на диск
+    
+    # Фоновые задачи (экспорт, отчеты)
+    JOBS_PER_USER = int(os.getenv("JOBS_PER_USER", "2"))  # Одновременных задач на пользователя
+    JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "2"))  # Секунд между обновлениями сообщения
+    
+    # Рассылки
+    BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))  # Получателей между сохранениями прогресса
+    BROADCAST_LEASE = float(os.getenv("BROADCAST_LEASE", "300"))  # Секунд, после которых рассылку упавшего процесса подхватит другой
+    
+    # Процессы отрисовки графиков
+    CHART_WORKERS = int(os.getenv("CHART_WORKERS", "1"))
+    
+    # Хранилище состояний диалогов: memory (один процесс) или database (общее для процессов)
+    STATE_STORE = os.getenv("STATE_STORE", "memory")
+    STATE_TTL = float(os.getenv("STATE_TTL", str(24 * 60 * 60)))  # Секунд без действий до сброса мастера
+    STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))  # Состояний в памяти (backend memory)
+    
+    # Ограничение частоты запросов: memory (на процесс) или database (общее для процессов)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_CAPACITY = float(os.getenv("RATE_LIMIT_CAPACITY", "30"))  # Токенов на пользователя
+    RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", "60"))  # Секунд до полного восполнения
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Корзин в памяти (backend memory)
+    RATE_LIMIT_EXPORT_COST = float(os.getenv("RATE_LIMIT_EXPORT_COST", "10"))
+    RATE_LIMIT_CHARTS_COST = float(os.getenv("RATE_LIMIT_CHARTS_COST", "5"))
+    
+    # Кэш пользователей по Telegram ID
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    
+    # Отложенная запись активности пользователей
+    ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "500"))
+    ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+    ACTIVITY_QUEUE_SIZE = int(os.getenv("ACTIVITY_QUEUE_SIZE", "10000"))
+    
+    # Отложенная запись времени последней активности (точность в секундах)
+    LAST_ACTIVITY_RESOLUTION = float(os.getenv("LAST_ACTIVITY_RESOLUTION", "60"))
+    LAST_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("LAST_ACTIVITY_FLUSH_INTERVAL", "30"))
+    LAST_ACTIVITY_BATCH_SIZE = int(os.getenv("LAST_ACTIVITY_BATCH_SIZE", "1000"))
+    
+    # Отложенная запись дневной статистики (изменения после коммита)
+    DAILY_STATS_FLUSH_INTERVAL = float(os.getenv("DAILY_STATS_FLUSH_INTERVAL", "5"))
     
     @classmethod
     def get_database_url(cls):
@@ -39,3 +103,17 @@ class Config:
             return cls.DATABASE_URL
         else:
             return f"postgresql://{cls.PGUSER}:{cls.PGPASSWORD}@{cls.PGHOST}:{cls.PGPORT}/{cls.PGDATABASE}"
+
+    @classmethod
+    def get_async_database_url(cls):
+        """Получение URL базы данных для асинхронного драйвера (asyncpg)"""
+        url = cls.get_database_url()
+        scheme, _, rest = url.partition("://")
+
+        if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+            scheme = "postgresql+asyncpg"
+
+        # asyncpg не понимает sslmode, вместо него используется параметр ssl
+        rest = rest.replace("sslmode=", "ssl=")
+
+        return f"{scheme}://{rest}"
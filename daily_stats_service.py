@@ -0,0 +1,140 @@
+"""
+Сервис дневной статистики (таблица daily_stats)
+
+Счетчики обновляются инкрементально при записи активностей, постов
+и пользователей, поэтому ряд за N дней читается как N строк.
+
+Изменения не пишутся в транзакции запроса: иначе все запросы, меняющие
+счетчики, ждали бы друг друга на строке текущего дня до своего коммита.
+Они копятся в сессии и после коммита передаются подписчикам
+(буфер write_behind.daily_stats_buffer записывает их пакетом).
+"""
+
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, literal, literal_column, union_all, cast, Date, delete
+from sqlalchemy.dialects.postgresql import insert
+from models import User, Post, UserActivity, DailyStats
+from datetime import datetime, date, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('user_activities', 'posts_created', 'posts_published', 'new_users')
+
+def stats_day(timestamp: Optional[datetime] = None) -> date:
+    """День (UTC), к которому относится событие"""
+    if timestamp is None:
+        return datetime.utcnow().date()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+def increment_statement(day: date, **deltas):
+    """Атомарное прибавление счетчиков дня (INSERT ... ON CONFLICT DO UPDATE)"""
+    statement = insert(DailyStats).values(date=day, **deltas)
+    return statement.on_conflict_do_update(
+        index_elements=[DailyStats.date],
+        set_={name: getattr(DailyStats, name) + statement.excluded[name] for name in deltas}
+    )
+
+_PENDING_KEY = "daily_stats_pending"
+
+# Получатели зафиксированных изменений: callback(день, {счетчик: изменение})
+_committed_listeners: List[Callable[[date, Dict[str, int]], None]] = []
+
+def add_committed_listener(callback: Callable[[date, Dict[str, int]], None]) -> None:
+    """Подписка на изменения счетчиков, зафиксированные транзакцией"""
+    _committed_listeners.append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for day, deltas in session.info.pop(_PENDING_KEY, {}).items():
+        for callback in _committed_listeners:
+            try:
+                callback(day, dict(deltas))
+            except Exception as e:
+                logger.error(f"Ошибка при передаче изменений дневной статистики: {e}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+def _utc_date(column):
+    """Дата в UTC для колонки с часовым поясом"""
+    # Литерал вместо параметра, чтобы выражения в SELECT и GROUP BY совпадали
+    return cast(func.timezone(literal_column("'UTC'"), column), Date)
+
+class DailyStatsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def increment(self, day: date = None, **deltas) -> None:
+        """Изменение счетчиков дня после фиксации текущей транзакции (при откате - нет)"""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        pending = self.db.info.setdefault(_PENDING_KEY, {})
+        pending.setdefault(day or stats_day(), Counter()).update(deltas)
+
+    def get_daily_stats(self, days: int = 30) -> List[DailyStats]:
+        """Получение строк статистики за последние дни (по возрастанию даты)"""
+        cutoff_date = stats_day() - timedelta(days=days)
+
+        return self.db.query(DailyStats).filter(
+            DailyStats.date >= cutoff_date
+        ).order_by(DailyStats.date).all()
+
+    def rebuild(self) -> int:
+        """
+        Полный пересчет таблицы из исходных данных (backfill)
+
+        Выполняется одной транзакцией; возвращает количество дней.
+        """
+        zero = literal(0)
+
+        activities = select(
+            _utc_date(UserActivity.timestamp).label('date'),
+            func.count().label('user_activities'),
+            zero.label('posts_created'),
+            zero.label('posts_published'),
+            zero.label('new_users')
+        ).group_by(_utc_date(UserActivity.timestamp))
+
+        posts = select(
+            _utc_date(Post.created_at).label('date'),
+            zero,
+            func.count(),
+            func.count().filter(Post.is_published == True),
+            zero
+        ).where(Post.is_deleted == False).group_by(_utc_date(Post.created_at))
+
+        users = select(
+            _utc_date(User.created_at).label('date'),
+            zero,
+            zero,
+            zero,
+            func.count()
+        ).group_by(_utc_date(User.created_at))
+
+        combined = union_all(activities, posts, users).subquery()
+        totals = select(
+            combined.c.date,
+            *[func.sum(combined.c[name]) for name in COUNTERS]
+        ).where(combined.c.date.isnot(None)).group_by(combined.c.date)
+
+        try:
+            self.db.execute(delete(DailyStats))
+            self.db.execute(
+                insert(DailyStats).from_select(['date', *COUNTERS], totals)
+            )
+            self.db.commit()
+
+            return self.db.query(DailyStats).count()
+
+        except Exception as e:
+            self.db.rollback()
+            raise e
@@ -3,17 +3,24 @@
 """
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text, inspect, event
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncAttrs
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
-class Base(DeclarativeBase):
+class Base(AsyncAttrs, DeclarativeBase):
     pass
 
+@event.listens_for(Base.metadata, "before_create")
+def _create_extensions(target, connection, **kw):
+    """Расширения PostgreSQL, нужные индексам моделей (до создания таблиц)"""
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 # Создание движка базы данных
 engine = create_engine(
     Config.get_database_url(),
@@ -28,6 +35,24 @@ engine = create_engine(
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для обработчиков бота (не блокирует цикл событий)
+async_engine = create_async_engine(
+    Config.get_async_database_url(),
+    pool_size=10,
+    max_overflow=20,
+    pool_recycle=300,
+    pool_pre_ping=True,
+    echo=False
+)
+
+# Асинхронная сессия; объекты не истекают после commit, чтобы к ним можно
+# было обращаться без повторной загрузки из обработчика
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def get_db():
     """Получение сессии базы данных"""
     db = SessionLocal()
@@ -40,10 +65,15 @@ def init_database():
     """Инициализация базы данных"""
     try:
         # Импорт всех моделей для создания таблиц
-        from models import User, Post, Analytics, UserActivity, PostTemplate
+        from models import User, Post, Analytics, UserActivity, PostTemplate, ConversationState, RateLimitBucket, Broadcast
         
         # Создание всех таблиц
         Base.metadata.create_all(bind=engine)
+        sync_post_number_sequence()
+        counters_added = add_user_counter_columns()
+        add_post_search_vector()
+        add_user_search_indexes()
+        add_user_broadcast_columns()
         
         # Создание админов по умолчанию
         db = SessionLocal()
@@ -51,6 +81,10 @@ def init_database():
             from services.user_service import UserService
             user_service = UserService(db)
             
+            # Заполнение только что добавленных счетчиков
+            if counters_added:
+                user_service.reconcile_counters()
+            
             for admin_id in Config.DEFAULT_ADMINS:
                 user_service.create_or_update_user(
                     telegram_id=admin_id,
@@ -72,6 +106,148 @@ def init_database():
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
 
+def sync_post_number_sequence():
+    """
+    Подключение последовательности номеров к существующей таблице постов
+    
+    Для баз, созданных до появления post_number_seq: создает последовательность,
+    выставляет ее после максимального номера и назначает значением по умолчанию.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    
+    with engine.begin() as connection:
+        connection.execute(text("CREATE SEQUENCE IF NOT EXISTS post_number_seq"))
+        connection.execute(text("""
+            SELECT setval(
+                'post_number_seq',
+                GREATEST(
+                    (SELECT COALESCE(MAX(post_number), 0) FROM posts),
+                    (SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END
+                     FROM post_number_seq)
+                ) + 1,
+                false
+            )
+        """))
+        connection.execute(text(
+            "ALTER TABLE posts ALTER COLUMN post_number SET DEFAULT nextval('post_number_seq')"
+        ))
+
+USER_COUNTER_COLUMNS = ('posts_count', 'published_posts_count', 'activities_count')
+
+def add_user_counter_columns() -> bool:
+    """
+    Добавление колонок-счетчиков в существующую таблицу users
+    
+    Возвращает True, если колонки были добавлены и их нужно заполнить
+    (UserService.reconcile_counters).
+    """
+    existing_columns = {column['name'] for column in inspect(engine).get_columns('users')}
+    missing_columns = [name for name in USER_COUNTER_COLUMNS if name not in existing_columns]
+    
+    if not missing_columns:
+        return False
+    
+    with engine.begin() as connection:
+        for name in missing_columns:
+            connection.execute(text(
+                f"ALTER TABLE users ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"
+            ))
+    
+    logger.info(f"Добавлены счетчики пользователей: {', '.join(missing_columns)}")
+    return True
+
+def add_post_search_vector():
+    """
+    Добавление поискового вектора и GIN-индекса в существующую таблицу постов
+    
+    Колонка генерируемая (STORED): PostgreSQL заполняет ее для всех постов
+    при добавлении и пересчитывает при изменении заголовка или содержимого.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    
+    from models import POST_SEARCH_EXPRESSION
+    
+    existing_columns = {column['name'] for column in inspect(engine).get_columns('posts')}
+    
+    with engine.begin() as connection:
+        if 'search_vector' not in existing_columns:
+            connection.execute(text(
+                f"ALTER TABLE posts ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS ({POST_SEARCH_EXPRESSION}) STORED"
+            ))
+            logger.info("Добавлен поисковый вектор постов")
+        
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_post_search ON posts USING gin (search_vector)"
+        ))
+
+USER_SEARCH_COLUMNS = ('first_name', 'last_name', 'username')
+
+def add_user_search_indexes():
+    """Добавление триграммных индексов поиска в существующую таблицу users"""
+    if engine.dialect.name != "postgresql":
+        return
+    
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for name in USER_SEARCH_COLUMNS:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS idx_user_{name}_trgm ON users USING gin ({name} gin_trgm_ops)"
+            ))
+
+def add_user_broadcast_columns():
+    """Добавление отметки о блокировке бота и индекса получателей рассылок в таблицу users"""
+    existing_columns = {column['name'] for column in inspect(engine).get_columns('users')}
+    
+    with engine.begin() as connection:
+        if 'bot_blocked_at' not in existing_columns:
+            connection.execute(text("ALTER TABLE users ADD COLUMN bot_blocked_at TIMESTAMP WITH TIME ZONE"))
+            logger.info("Добавлена отметка о блокировке бота пользователем")
+        
+        if engine.dialect.name == "postgresql":
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_user_broadcast ON users (id) "
+                "WHERE is_active AND bot_blocked_at IS NULL"
+            ))
+
 def get_session():
     """Получение новой сессии базы данных"""
     return SessionLocal()
+
+def get_async_session() -> AsyncSession:
+    """Получение новой асинхронной сессии базы данных"""
+    return AsyncSessionLocal()
+
+async def dispose_async_engine(*args) -> None:
+    """Закрытие пула соединений асинхронного движка"""
+    await async_engine.dispose()
+
+class AsyncServiceAdapter:
+    """
+    Асинхронный вариант синхронного сервиса
+    
+    Каждый метод сервиса выполняется через AsyncSession.run_sync: запросы идут
+    через asyncpg и не блокируют цикл событий, а сама логика запросов остается
+    в одном месте - в синхронном сервисе.
+    """
+    
+    service_class = None
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    def __getattr__(self, name):
+        method = getattr(self.service_class, name)
+        
+        if not callable(method):
+            raise AttributeError(name)
+        
+        async def call(*args, **kwargs):
+            return await self.db.run_sync(
+                lambda session: method(self.service_class(session), *args, **kwargs)
+            )
+        
+        call.__name__ = name
+        return call
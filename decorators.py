@@ -2,11 +2,13 @@
 Декораторы для проверки прав доступа
 """
 
+import math
 from functools import wraps
 from telegram import Update
-from telegram.ext import ContextTypes
-from database import get_session
-from services.user_service import UserService
+from utils.middleware import BotContext
+from services.write_behind import last_activity_tracker
+from services.user_cache import user_cache
+from services.rate_limiter import rate_limiter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,58 +16,52 @@ logger = logging.getLogger(__name__)
 def admin_required(func):
     """Декоратор для проверки прав администратора"""
     @wraps(func)
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+    async def wrapper(update: Update, context: BotContext, *args, **kwargs):
         try:
-            user_id = update.effective_user.id
-            db = get_session()
+            # Пользователь уже загружен middleware для текущего Update
+            db_user = context.db_user
             
-            try:
-                user_service = UserService(db)
-                db_user = user_service.get_user_by_telegram_id(user_id)
-                
-                if not db_user:
-                    # Пользователь не найден в базе данных
-                    if update.message:
-                        await update.message.reply_text(
-                            "❌ Пользователь не найден в системе. Используйте /start для регистрации."
-                        )
-                    elif update.callback_query:
-                        await update.callback_query.answer(
-                            "❌ Пользователь не найден в системе.", 
-                            show_alert=True
-                        )
-                    return
-                
-                if not db_user.is_admin:
-                    # Пользователь не является администратором
-                    error_message = "❌ Недостаточно прав. Эта команда доступна только администраторам."
-                    
-                    if update.message:
-                        await update.message.reply_text(error_message)
-                    elif update.callback_query:
-                        await update.callback_query.answer(error_message, show_alert=True)
-                    return
-                
-                if not db_user.is_active:
-                    # Пользователь заблокирован
-                    error_message = "❌ Ваш аккаунт заблокирован. Обратитесь к администратору."
-                    
-                    if update.message:
-                        await update.message.reply_text(error_message)
-                    elif update.callback_query:
-                        await update.callback_query.answer(error_message, show_alert=True)
-                    return
-                
-                # Обновление времени последней активности
-                user_service.update_last_activity(user_id)
-                db.commit()
-                
-                # Вызов оригинальной функции
-                return await func(update, context, *args, **kwargs)
+            if not db_user:
+                # Пользователь не найден в базе данных
+                if update.message:
+                    await update.message.reply_text(
+                        "❌ Пользователь не найден в системе. Используйте /start для регистрации."
+                    )
+                elif update.callback_query:
+                    await update.callback_query.answer(
+                        "❌ Пользователь не найден в системе.", 
+                        show_alert=True
+                    )
+                return
+            
+            if not db_user.is_admin:
+                # Пользователь не является администратором
+                error_message = "❌ Недостаточно прав. Эта команда доступна только администраторам."
                 
-            finally:
-                db.close()
+                if update.message:
+                    await update.message.reply_text(error_message)
+                elif update.callback_query:
+                    await update.callback_query.answer(error_message, show_alert=True)
+                return
+            
+            if not db_user.is_active:
+                # Пользователь заблокирован
+                error_message = "❌ Ваш аккаунт заблокирован. Обратитесь к администратору."
                 
+                if update.message:
+                    await update.message.reply_text(error_message)
+                elif update.callback_query:
+                    await update.callback_query.answer(error_message, show_alert=True)
+                return
+            
+            # Обновление времени последней активности (записывается пакетом в фоне)
+            now = current_time()
+            if last_activity_tracker.touch(db_user, now):
+                context.db_user = user_cache.update(db_user, last_activity=now)
+            
+            # Вызов оригинальной функции
+            return await func(update, context, *args, **kwargs)
+            
         except Exception as e:
             logger.error(f"Ошибка в декораторе admin_required: {e}")
             
@@ -81,48 +77,42 @@ def admin_required(func):
 def active_user_required(func):
     """Декоратор для проверки активности пользователя"""
     @wraps(func)
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+    async def wrapper(update: Update, context: BotContext, *args, **kwargs):
         try:
-            user_id = update.effective_user.id
-            db = get_session()
+            # Пользователь уже загружен middleware для текущего Update
+            db_user = context.db_user
             
-            try:
-                user_service = UserService(db)
-                db_user = user_service.get_user_by_telegram_id(user_id)
-                
-                if not db_user:
-                    # Пользователь не найден в базе данных
-                    if update.message:
-                        await update.message.reply_text(
-                            "❌ Пользователь не найден в системе. Используйте /start для регистрации."
-                        )
-                    elif update.callback_query:
-                        await update.callback_query.answer(
-                            "❌ Пользователь не найден в системе.", 
-                            show_alert=True
-                        )
-                    return
-                
-                if not db_user.is_active:
-                    # Пользователь заблокирован
-                    error_message = "❌ Ваш аккаунт заблокирован. Обратитесь к администратору."
-                    
-                    if update.message:
-                        await update.message.reply_text(error_message)
-                    elif update.callback_query:
-                        await update.callback_query.answer(error_message, show_alert=True)
-                    return
-                
-                # Обновление времени последней активности
-                user_service.update_last_activity(user_id)
-                db.commit()
-                
-                # Вызов оригинальной функции
-                return await func(update, context, *args, **kwargs)
-                
-            finally:
-                db.close()
+            if not db_user:
+                # Пользователь не найден в базе данных
+                if update.message:
+                    await update.message.reply_text(
+                        "❌ Пользователь не найден в системе. Используйте /start для регистрации."
+                    )
+                elif update.callback_query:
+                    await update.callback_query.answer(
+                        "❌ Пользователь не найден в системе.", 
+                        show_alert=True
+                    )
+                return
+            
+            if not db_user.is_active:
+                # Пользователь заблокирован
+                error_message = "❌ Ваш аккаунт заблокирован. Обратитесь к администратору."
                 
+                if update.message:
+                    await update.message.reply_text(error_message)
+                elif update.callback_query:
+                    await update.callback_query.answer(error_message, show_alert=True)
+                return
+            
+            # Обновление времени последней активности (записывается пакетом в фоне)
+            now = current_time()
+            if last_activity_tracker.touch(db_user, now):
+                context.db_user = user_cache.update(db_user, last_activity=now)
+            
+            # Вызов оригинальной функции
+            return await func(update, context, *args, **kwargs)
+            
         except Exception as e:
             logger.error(f"Ошибка в декораторе active_user_required: {e}")
             
@@ -135,50 +125,47 @@ def active_user_required(func):
     
     return wrapper
 
-def rate_limit(max_calls: int = 10, time_window: int = 60):
+def rate_limit(cost: float = 1):
     """
     Декоратор для ограничения частоты вызовов
     
     Args:
-        max_calls: Максимальное количество вызовов
-        time_window: Временное окно в секундах
+        cost: Стоимость вызова в токенах лимита пользователя (RATE_LIMIT_CAPACITY
+            токенов, восполняются за RATE_LIMIT_WINDOW секунд)
     """
-    from collections import defaultdict
-    from time import time
-    
-    call_history = defaultdict(list)
-    
     def decorator(func):
         @wraps(func)
-        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-            user_id = update.effective_user.id
-            current_time = time()
-            
-            # Очистка старых записей
-            call_history[user_id] = [
-                call_time for call_time in call_history[user_id]
-                if current_time - call_time < time_window
-            ]
-            
-            # Проверка лимита
-            if len(call_history[user_id]) >= max_calls:
-                error_message = f"❌ Слишком много запросов. Попробуйте через {time_window} секунд."
-                
-                if update.message:
-                    await update.message.reply_text(error_message)
-                elif update.callback_query:
-                    await update.callback_query.answer(error_message, show_alert=True)
+        async def wrapper(update: Update, context: BotContext, *args, **kwargs):
+            if not await check_rate_limit(update, cost):
                 return
             
-            # Добавление текущего вызова
-            call_history[user_id].append(current_time)
-            
             # Вызов оригинальной функции
             return await func(update, context, *args, **kwargs)
         
         return wrapper
     return decorator
 
+async def check_rate_limit(update: Update, cost: float = 1) -> bool:
+    """
+    Списание стоимости действия с лимита пользователя
+    
+    При превышении лимита пользователь получает сообщение и возвращается False.
+    """
+    if not update.effective_user:
+        return True
+    
+    retry_after = await rate_limiter.acquire(update.effective_user.id, cost)
+    if not retry_after:
+        return True
+    
+    error_message = f"❌ Слишком много запросов. Попробуйте через {math.ceil(retry_after)} сек."
+    
+    if update.callback_query:
+        await update.callback_query.answer(error_message, show_alert=True)
+    elif update.message:
+        await update.message.reply_text(error_message)
+    return False
+
 def log_user_action(action_type: str):
     """
     Декоратор для логирования действий пользователя
@@ -188,23 +175,17 @@ def log_user_action(action_type: str):
     """
     def decorator(func):
         @wraps(func)
-        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        async def wrapper(update: Update, context: BotContext, *args, **kwargs):
             try:
-                user_id = update.effective_user.id
-                
                 # Вызов оригинальной функции
                 result = await func(update, context, *args, **kwargs)
                 
                 # Логирование действия после успешного выполнения
-                db = get_session()
+                # (строка ставится в очередь и записывается в фоне)
                 try:
-                    from services.analytics_service import AnalyticsService
-                    from services.user_service import UserService
+                    from services.write_behind import activity_sink
                     
-                    user_service = UserService(db)
-                    analytics_service = AnalyticsService(db)
-                    
-                    db_user = user_service.get_user_by_telegram_id(user_id)
+                    db_user = context.db_user
                     if db_user:
                         # Подготовка дополнительных данных
                         activity_data = {
@@ -218,19 +199,14 @@ def log_user_action(action_type: str):
                         if hasattr(context, 'args') and context.args:
                             activity_data['command_args'] = context.args
                         
-                        analytics_service.log_user_activity(
+                        activity_sink.record(
                             user_id=db_user.id,
                             activity_type=action_type,
                             activity_data=activity_data
                         )
-                        
-                        db.commit()
                 
                 except Exception as log_error:
                     logger.error(f"Ошибка при логировании действия {action_type}: {log_error}")
-                    db.rollback()
-                finally:
-                    db.close()
                 
                 return result
                 
@@ -251,7 +227,7 @@ def handle_errors(error_message: str = "❌ Произошла ошибка пр
     """
     def decorator(func):
         @wraps(func)
-        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        async def wrapper(update: Update, context: BotContext, *args, **kwargs):
             try:
                 return await func(update, context, *args, **kwargs)
             except Exception as e:
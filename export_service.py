@@ -0,0 +1,192 @@
+"""
+Потоковый экспорт данных (CSV / NDJSON)
+
+Строки читаются серверным курсором пакетами (yield_per) и сразу пишутся
+в SpooledTemporaryFile: в памяти находится один пакет строк, а файл больше
+EXPORT_SPOOL_SIZE байт переносится на диск.
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+from typing import Any, Callable, Dict, Iterator, Optional
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from config import Config
+from database import AsyncServiceAdapter
+from models import User, Post
+from services.analytics_service import AnalyticsService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Формат в callback_data -> формат файла (json выгружается построчно)
+EXPORT_FORMATS = {'csv': 'csv', 'json': 'ndjson', 'ndjson': 'ndjson'}
+EXPORT_DATASETS = ('users', 'posts', 'analytics')
+
+@dataclass
+class ExportResult:
+    """Готовый файл экспорта (файл закрывает вызывающий код)"""
+    file: SpooledTemporaryFile
+    filename: str
+    rows: int
+    truncated: bool
+
+class ExportService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _users_statement(self):
+        """Колонки экспорта пользователей"""
+        return select(
+            User.id.label('user_id'),
+            User.telegram_id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            User.is_admin,
+            User.is_active,
+            User.created_at,
+            User.updated_at,
+            User.last_activity,
+            User.posts_count,
+            User.published_posts_count.label('published_posts'),
+            User.activities_count
+        ).order_by(User.id)
+
+    def _posts_statement(self):
+        """Колонки экспорта постов (автор присоединяется в том же запросе)"""
+        return select(
+            Post.id.label('post_id'),
+            Post.post_number,
+            Post.title,
+            Post.content,
+            Post.template_type,
+            Post.is_published,
+            Post.author_id,
+            func.coalesce(func.nullif(User.first_name, ''), User.username).label('author_name'),
+            Post.created_at,
+            Post.updated_at,
+            Post.published_at,
+            func.length(Post.content).label('content_length')
+        ).join(User, Post.author_id == User.id).where(
+            Post.is_deleted == False
+        ).order_by(Post.id)
+
+    def iter_rows(self, dataset: str, limit: int) -> Iterator[Dict[str, Any]]:
+        """
+        Строки набора данных по одной
+
+        Запрос ограничен limit + 1 строками: лишняя строка показывает,
+        что данные не поместились в лимит.
+        """
+        if dataset == 'analytics':
+            # Не больше ANALYTICS_RETENTION_DAYS строк, потоковое чтение не нужно
+            daily = AnalyticsService(self.db).get_daily_statistics(days=Config.ANALYTICS_RETENTION_DAYS)
+            yield from islice(daily, limit + 1)
+            return
+
+        if dataset == 'users':
+            statement = self._users_statement()
+        elif dataset == 'posts':
+            statement = self._posts_statement()
+        else:
+            raise ValueError(f"Неизвестный набор данных: {dataset}")
+
+        result = self.db.execute(
+            statement.limit(limit + 1).execution_options(yield_per=Config.EXPORT_BATCH_SIZE)
+        )
+        try:
+            for row in result.mappings():
+                yield dict(row)
+        finally:
+            result.close()
+
+    def export(self, dataset: str, export_format: str, limit: Optional[int] = None,
+               progress: Optional[Callable[[int], None]] = None) -> ExportResult:
+        """
+        Запись набора данных в файл, не более limit (EXPORT_LIMIT) строк
+
+        progress вызывается с количеством записанных строк после каждого пакета.
+        """
+        file_format = EXPORT_FORMATS.get(export_format)
+        if file_format is None:
+            raise ValueError(f"Неизвестный формат экспорта: {export_format}")
+
+        limit = Config.EXPORT_LIMIT if limit is None else limit
+        rows = self.iter_rows(dataset, limit)
+        limited = islice(rows, limit)
+        if progress is not None:
+            limited = _report_progress(limited, Config.EXPORT_BATCH_SIZE, progress)
+
+        file = SpooledTemporaryFile(max_size=Config.EXPORT_SPOOL_SIZE)
+        try:
+            text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+
+            if file_format == 'csv':
+                written = write_csv(text, limited)
+            else:
+                written = write_ndjson(text, limited)
+
+            truncated = next(rows, None) is not None
+            rows.close()
+
+            text.flush()
+            text.detach()
+            file.seek(0)
+
+        except Exception:
+            rows.close()
+            file.close()
+            raise
+
+        if truncated:
+            logger.warning(f"Экспорт {dataset} ограничен {limit} строками (EXPORT_LIMIT)")
+
+        return ExportResult(
+            file=file,
+            filename=f"{dataset}_{datetime.now().strftime('%Y%m%d')}.{file_format}",
+            rows=written,
+            truncated=truncated
+        )
+
+def _report_progress(rows: Iterator[Dict[str, Any]], every: int,
+                     progress: Callable[[int], None]) -> Iterator[Dict[str, Any]]:
+    """Передача строк дальше с вызовом progress каждые every строк"""
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % every == 0:
+            progress(count)
+
+def write_csv(text: io.TextIOBase, rows: Iterator[Dict[str, Any]]) -> int:
+    """Запись строк в CSV (заголовок берется из первой строки)"""
+    written = 0
+    writer = None
+
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(text, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        written += 1
+
+    return written
+
+def write_ndjson(text: io.TextIOBase, rows: Iterator[Dict[str, Any]]) -> int:
+    """Запись строк в NDJSON (один JSON-объект на строку)"""
+    written = 0
+
+    for row in rows:
+        text.write(json.dumps(row, ensure_ascii=False, default=str))
+        text.write('\n')
+        written += 1
+
+    return written
+
+class AsyncExportService(AsyncServiceAdapter):
+    """Асинхронный вариант ExportService для обработчиков бота"""
+    service_class = ExportService
@@ -12,10 +12,11 @@ from sqlalchemy.orm import sessionmaker
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
-from database import Base, engine
+from database import Base, engine, sync_post_number_sequence, add_user_counter_columns, add_post_search_vector, add_user_search_indexes, add_user_broadcast_columns
 from models import User, Post, UserActivity, Analytics, PostTemplate
 from services.user_service import UserService
 from services.analytics_service import AnalyticsService
+from services.daily_stats_service import DailyStatsService
 import logging
 
 # Настройка логирования
@@ -56,7 +57,7 @@ def check_existing_tables():
         inspector = inspect(engine)
         existing_tables = inspector.get_table_names()
         
-        expected_tables = ['users', 'posts', 'user_activities', 'analytics', 'post_templates']
+        expected_tables = ['users', 'posts', 'user_activities', 'analytics', 'post_templates', 'daily_stats']
         
         logger.info(f"📋 Существующие таблицы: {existing_tables}")
         
@@ -250,6 +251,9 @@ def create_indexes():
                 "CREATE INDEX IF NOT EXISTS idx_posts_published ON posts(is_published);",
                 "CREATE INDEX IF NOT EXISTS idx_posts_deleted ON posts(is_deleted);",
                 "CREATE INDEX IF NOT EXISTS idx_posts_template ON posts(template_type);",
+                "CREATE INDEX IF NOT EXISTS idx_post_published_number ON posts(is_published, post_number);",
+                "CREATE INDEX IF NOT EXISTS idx_post_author_number ON posts(author_id, post_number);",
+                "CREATE INDEX IF NOT EXISTS idx_post_template_number ON posts(template_type, post_number);",
                 "CREATE INDEX IF NOT EXISTS idx_activities_user ON user_activities(user_id);",
                 "CREATE INDEX IF NOT EXISTS idx_activities_type ON user_activities(activity_type);",
                 "CREATE INDEX IF NOT EXISTS idx_activities_timestamp ON user_activities(timestamp);",
@@ -273,6 +277,73 @@ def create_indexes():
         logger.error(f"❌ Ошибка при создании индексов: {e}")
         return False
 
+def sync_post_numbering():
+    """Синхронизация последовательности номеров постов"""
+    try:
+        sync_post_number_sequence()
+        logger.info("✅ Последовательность post_number_seq синхронизирована")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка при синхронизации нумерации постов: {e}")
+        return False
+
+def rebuild_daily_stats():
+    """Заполнение таблицы дневной статистики из исходных данных"""
+    try:
+        SessionLocal = sessionmaker(bind=engine)
+        db = SessionLocal()
+        
+        try:
+            days_count = DailyStatsService(db).rebuild()
+            logger.info(f"✅ Дневная статистика пересчитана, дней: {days_count}")
+            return True
+        finally:
+            db.close()
+            
+    except Exception as e:
+        logger.error(f"❌ Ошибка при пересчете дневной статистики: {e}")
+        return False
+
+def reconcile_user_counters():
+    """Добавление и сверка счетчиков пользователей"""
+    try:
+        add_user_counter_columns()
+        
+        SessionLocal = sessionmaker(bind=engine)
+        db = SessionLocal()
+        
+        try:
+            fixed_count = UserService(db).reconcile_counters()
+            logger.info(f"✅ Счетчики пользователей сверены, исправлено: {fixed_count}")
+            return True
+        finally:
+            db.close()
+            
+    except Exception as e:
+        logger.error(f"❌ Ошибка при сверке счетчиков пользователей: {e}")
+        return False
+
+def setup_search():
+    """Подготовка полнотекстового поиска постов и триграммного поиска пользователей"""
+    try:
+        add_post_search_vector()
+        add_user_search_indexes()
+        logger.info("✅ Поиск постов и пользователей настроен")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка при настройке поиска: {e}")
+        return False
+
+def setup_broadcasts():
+    """Подготовка таблицы пользователей к рассылкам"""
+    try:
+        add_user_broadcast_columns()
+        logger.info("✅ Рассылки настроены")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка при настройке рассылок: {e}")
+        return False
+
 def verify_database_integrity():
     """Проверка целостности базы данных"""
     try:
@@ -343,9 +414,14 @@ def run_migration():
         ("Проверка существующих таблиц", check_existing_tables),
         ("Создание схемы БД", create_database_schema),
         ("Создание индексов", create_indexes),
+        ("Синхронизация нумерации постов", sync_post_numbering),
+        ("Настройка поиска", setup_search),
+        ("Настройка рассылок", setup_broadcasts),
         ("Создание администраторов", create_default_admins),
         ("Создание шаблонов постов", create_default_templates),
         ("Создание начальной аналитики", create_initial_analytics),
+        ("Заполнение дневной статистики", rebuild_daily_stats),
+        ("Сверка счетчиков пользователей", reconcile_user_counters),
         ("Проверка целостности БД", verify_database_integrity),
         ("Создание резервной копии", backup_database)
     ]
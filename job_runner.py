@@ -0,0 +1,232 @@
+"""
+Фоновые задачи пользователей (экспорт данных, тяжелые отчеты)
+
+Обработчик только ставит задачу и сразу отвечает на нажатие кнопки, сама
+работа идет отдельной asyncio-задачей. Ход выполнения показывается в одном
+сообщении, которое редактируется на месте, результат отправляется файлом.
+"""
+
+import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, Dict, Hashable, Optional, Tuple
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from config import Config
+from services.outbound import PRIORITY_BACKGROUND
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobLimitError(Exception):
+    """У пользователя уже выполняется максимум задач"""
+
+@dataclass
+class JobResult:
+    """Результат задачи: файл отправляется документом (или фото)"""
+    file: BinaryIO
+    filename: str
+    caption: str = ""
+    photo: bool = False
+    parse_mode: Optional[str] = None
+
+@dataclass
+class Job:
+    """Выполняющаяся задача"""
+    id: int
+    key: Hashable
+    owner_id: int
+    chat_id: int
+    title: str
+    progress: str = "в очереди"
+    message_id: Optional[int] = None
+    task: Optional[asyncio.Task] = None
+
+    def report(self, progress: str) -> None:
+        """Обновление хода выполнения (сообщение редактируется в фоне)"""
+        self.progress = progress
+
+JobWork = Callable[[Job], Awaitable[JobResult]]
+
+# Сообщения задач уступают очередь ответам на команды (см. services.outbound)
+JOB_RATE_LIMIT_ARGS = {'priority': PRIORITY_BACKGROUND}
+
+class JobRunner:
+    """
+    Исполнитель фоновых задач
+
+    Одинаковые задачи (с тем же key) не запускаются повторно, пока выполняется
+    первая; у одного владельца одновременно не больше max_per_owner задач.
+    """
+
+    def __init__(self, max_per_owner: int, progress_interval: float):
+        self.max_per_owner = max_per_owner
+        self.progress_interval = progress_interval
+        self._jobs: Dict[int, Job] = {}
+        self._by_key: Dict[Hashable, Job] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, bot: Bot, owner_id: int, chat_id: int, key: Hashable,
+               title: str, work: JobWork) -> Tuple[Job, bool]:
+        """
+        Запуск задачи
+
+        Возвращает задачу и True, если она создана, или уже выполняющуюся
+        задачу с тем же ключом и False. При превышении лимита - JobLimitError.
+        """
+        existing = self.check(owner_id, key)
+        if existing is not None:
+            return existing, False
+
+        job = Job(id=next(self._ids), key=key, owner_id=owner_id, chat_id=chat_id, title=title)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+
+        # Задача снимается с учета при любом завершении, в том числе при отмене до старта
+        job.task = asyncio.create_task(self._run(bot, job, work), name=f"job-{job.id}")
+        job.task.add_done_callback(lambda task: self._forget(job))
+
+        return job, True
+
+    def check(self, owner_id: int, key: Hashable) -> Optional[Job]:
+        """
+        Проверка перед запуском без создания задачи
+
+        Возвращает уже выполняющуюся задачу с тем же ключом или None, если
+        задачу можно запустить. При превышении лимита - JobLimitError.
+        """
+        existing = self._by_key.get(key)
+        if existing is not None:
+            return existing
+
+        if sum(1 for job in self._jobs.values() if job.owner_id == owner_id) >= self.max_per_owner:
+            raise JobLimitError(f"Не больше {self.max_per_owner} задач одновременно")
+
+        return None
+
+    def cancel(self, job_id: int, owner_id: int) -> bool:
+        """Отмена задачи ее владельцем"""
+        job = self._jobs.get(job_id)
+        if job is None or job.owner_id != owner_id or job.task is None:
+            return False
+
+        job.task.cancel()
+        return True
+
+    async def stop(self, *args) -> None:
+        """Отмена всех задач (post_stop приложения, бот еще доступен)"""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, bot: Bot, job: Job, work: JobWork) -> None:
+        """Выполнение задачи и доставка результата"""
+        reporter = None
+        delivered = False
+
+        try:
+            message = await bot.send_message(
+                chat_id=job.chat_id,
+                text=self._render(job),
+                reply_markup=self._cancel_keyboard(job),
+                rate_limit_args=JOB_RATE_LIMIT_ARGS
+            )
+            job.message_id = message.message_id
+            reporter = asyncio.create_task(self._report_progress(bot, job))
+
+            result = await work(job)
+
+            reporter.cancel()
+            await self._edit(bot, job, f"📤 {job.title}: отправка результата...", cancellable=False)
+
+            with result.file:
+                if result.photo:
+                    await bot.send_photo(
+                        chat_id=job.chat_id,
+                        photo=result.file,
+                        caption=result.caption,
+                        parse_mode=result.parse_mode,
+                        filename=result.filename,
+                        rate_limit_args=JOB_RATE_LIMIT_ARGS
+                    )
+                else:
+                    await bot.send_document(
+                        chat_id=job.chat_id,
+                        document=result.file,
+                        caption=result.caption,
+                        parse_mode=result.parse_mode,
+                        filename=result.filename,
+                        rate_limit_args=JOB_RATE_LIMIT_ARGS
+                    )
+            delivered = True
+
+            await self._edit(bot, job, f"✅ {job.title}: готово", cancellable=False)
+
+        except asyncio.CancelledError:
+            # Результат уже у пользователя - "отменено" было бы неправдой
+            if not delivered:
+                await self._edit(bot, job, f"🚫 {job.title}: отменено", cancellable=False)
+            raise
+
+        except Exception as e:
+            logger.error(f"Ошибка в фоновой задаче {job.title}: {e}")
+            await self._edit(bot, job, f"❌ {job.title}: ошибка при выполнении", cancellable=False)
+
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+    async def _report_progress(self, bot: Bot, job: Job) -> None:
+        """Периодическое обновление сообщения о ходе выполнения"""
+        shown = None
+        while True:
+            if job.progress != shown:
+                shown = job.progress
+                await self._edit(bot, job, self._render(job))
+
+            await asyncio.sleep(self.progress_interval)
+
+    async def _edit(self, bot: Bot, job: Job, text: str, cancellable: bool = True) -> None:
+        """Редактирование сообщения задачи (ошибки Telegram не прерывают задачу)"""
+        if job.message_id is None:
+            return
+
+        try:
+            await bot.edit_message_text(
+                chat_id=job.chat_id,
+                message_id=job.message_id,
+                text=text,
+                reply_markup=self._cancel_keyboard(job) if cancellable else None,
+                rate_limit_args=JOB_RATE_LIMIT_ARGS
+            )
+        except BadRequest:
+            # Текст не изменился или сообщение удалено
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении сообщения задачи {job.title}: {e}")
+
+    def _forget(self, job: Job) -> None:
+        self._jobs.pop(job.id, None)
+        if self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    @staticmethod
+    def _render(job: Job) -> str:
+        return f"⏳ {job.title}: {job.progress}"
+
+    @staticmethod
+    def _cancel_keyboard(job: Job) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("✖️ Отменить", callback_data=f"analytics_job_cancel_{job.id}")]
+        ])
+
+# Общий исполнитель фоновых задач приложения
+job_runner = JobRunner(
+    max_per_owner=Config.JOBS_PER_USER,
+    progress_interval=Config.JOB_PROGRESS_INTERVAL
+)
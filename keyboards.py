@@ -96,17 +96,25 @@ def get_post_actions_keyboard(post, is_admin: bool = False) -> InlineKeyboardMar
     
     return InlineKeyboardMarkup(keyboard)
 
-def get_post_list_keyboard(posts: List, page: int = 0, posts_per_page: int = 5, 
+def get_post_list_keyboard(posts: List, page: int = 0, scope: str = "all",
+                          has_prev: bool = False, has_next: bool = False,
                           callback_prefix: str = "post_view") -> InlineKeyboardMarkup:
-    """Получение клавиатуры для списка постов с пагинацией"""
+    """
+    Получение клавиатуры для страницы списка постов
+    
+    Args:
+        posts: Посты текущей страницы (от новых к старым)
+        page: Номер страницы (с нуля), только для отображения
+        scope: Список постов ("all" или "my")
+        has_prev: Есть ли более новые посты
+        has_next: Есть ли более старые посты
+    
+    Курсором служит номер крайнего поста страницы:
+    post_page_{scope}_{page}_{n|p}_{post_number}
+    """
     keyboard = []
     
-    # Посты на текущей странице
-    start_idx = page * posts_per_page
-    end_idx = start_idx + posts_per_page
-    page_posts = posts[start_idx:end_idx]
-    
-    for post in page_posts:
+    for post in posts:
         status_emoji = "🟢" if post.is_published else "🟡"
         button_text = f"{status_emoji} #{post.post_number} - {post.title[:25]}..."
         keyboard.append([
@@ -114,23 +122,28 @@ def get_post_list_keyboard(posts: List, page: int = 0, posts_per_page: int = 5,
         ])
     
     # Навигация по страницам
-    if len(posts) > posts_per_page:
+    if posts and (has_prev or has_next):
         nav_buttons = []
         
-        if page > 0:
+        if has_prev:
             nav_buttons.append(
-                InlineKeyboardButton("⬅️ Назад", callback_data=f"post_page_{page-1}")
+                InlineKeyboardButton(
+                    "⬅️ Назад",
+                    callback_data=f"post_page_{scope}_{page - 1}_p_{posts[0].post_number}"
+                )
             )
         
         # Информация о странице
-        total_pages = (len(posts) - 1) // posts_per_page + 1
         nav_buttons.append(
-            InlineKeyboardButton(f"📄 {page + 1}/{total_pages}", callback_data="post_page_info")
+            InlineKeyboardButton(f"📄 {page + 1}", callback_data="post_page_info")
         )
         
-        if end_idx < len(posts):
+        if has_next:
             nav_buttons.append(
-                InlineKeyboardButton("➡️ Вперед", callback_data=f"post_page_{page+1}")
+                InlineKeyboardButton(
+                    "➡️ Вперед",
+                    callback_data=f"post_page_{scope}_{page + 1}_n_{posts[-1].post_number}"
+                )
             )
         
         keyboard.append(nav_buttons)
@@ -138,7 +151,7 @@ def get_post_list_keyboard(posts: List, page: int = 0, posts_per_page: int = 5,
     # Основные действия
     keyboard.append([
         InlineKeyboardButton("➕ Добавить объект", callback_data="post_create"),
-        InlineKeyboardButton("🔄 Обновить", callback_data="post_list_refresh")
+        InlineKeyboardButton("🔄 Обновить", callback_data=f"post_list_{scope}")
     ])
     
     # Возврат в главное меню
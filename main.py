@@ -4,14 +4,22 @@ Telegram бот для управления постами с автоматич
 
 import os
 import asyncio
+import importlib
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ChatMemberHandler, MessageHandler, filters
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from config import Config
-from database import init_database
-from handlers import start, posts, admin, analytics
+from database import init_database, dispose_async_engine
+# Обработчики админки и аналитики импортируются при первом обращении (lazy_callback)
+from handlers import start, posts
+from utils.middleware import BotContext, SessionMiddlewareApplication, PerUserUpdateProcessor
+from services.write_behind import start_write_behind, stop_write_behind
+from services.job_runner import job_runner
+from services.outbound import create_outbound_scheduler
+from services.broadcast_service import broadcast_engine
+from utils.charts import chart_renderer
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,7 +28,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def post_init(application: Application) -> None:
+    """Запуск фоновых задач после инициализации приложения"""
+    await start_write_behind()
+    await broadcast_engine.start(application.bot)
+
+async def post_stop(application: Application) -> None:
+    """Остановка фоновых задач, пока бот еще может отправлять сообщения"""
+    await job_runner.stop()
+    await broadcast_engine.stop()
+
+async def post_shutdown(application: Application) -> None:
+    """Запись буферизованных данных и закрытие соединений при остановке"""
+    await chart_renderer.stop()
+    await stop_write_behind()
+    await dispose_async_engine()
+
+async def error_handler(update: Update, context: BotContext) -> None:
     """Обработчик ошибок"""
     logger.error(f"Update {update} caused error {context.error}")
     
@@ -29,13 +53,40 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             "❌ Произошла ошибка при обработке команды. Попробуйте еще раз."
         )
 
-def main():
-    """Основная функция запуска бота"""
-    # Инициализация базы данных
-    init_database()
+def lazy_callback(module_name: str, name: str):
+    """
+    Обработчик из модуля, который импортируется при первом вызове
     
-    # Создание приложения
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    Редко используемые модули (админка, аналитика) не замедляют запуск бота.
+    """
+    async def callback(update: Update, context: BotContext):
+        handler = getattr(importlib.import_module(module_name), name)
+        return await handler(update, context)
+    
+    callback.__name__ = name
+    return callback
+
+def build_application(token: str = None, request=None) -> Application:
+    """Создание приложения с зарегистрированными обработчиками"""
+    builder = (
+        Application.builder()
+        .token(token or Config.BOT_TOKEN)
+        .application_class(SessionMiddlewareApplication)
+        .context_types(ContextTypes(context=BotContext))
+        .concurrent_updates(PerUserUpdateProcessor(Config.UPDATE_CONCURRENCY))
+        .rate_limiter(create_outbound_scheduler())
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    
+    if request is not None:
+        builder = builder.request(request)
+    
+    application = builder.build()
+    
+    admin = "handlers.admin"
+    analytics = "handlers.analytics"
     
     # Регистрация обработчиков команд
     application.add_handler(CommandHandler("start", start.start_command))
@@ -49,29 +100,51 @@ def main():
     application.add_handler(CommandHandler("edit_post", posts.edit_post_command))
     
     # Административные команды
-    application.add_handler(CommandHandler("admin", admin.admin_panel_command))
-    application.add_handler(CommandHandler("manage_users", admin.manage_users_command))
-    application.add_handler(CommandHandler("manage_posts", admin.manage_posts_command))
-    application.add_handler(CommandHandler("promote_user", admin.promote_user_command))
+    application.add_handler(CommandHandler("admin", lazy_callback(admin, "admin_panel_command")))
+    application.add_handler(CommandHandler("manage_users", lazy_callback(admin, "manage_users_command")))
+    application.add_handler(CommandHandler("manage_posts", lazy_callback(admin, "manage_posts_command")))
+    application.add_handler(CommandHandler("promote_user", lazy_callback(admin, "promote_user_command")))
+    application.add_handler(CommandHandler("broadcast", lazy_callback(admin, "broadcast_command")))
     
     # Команды аналитики
-    application.add_handler(CommandHandler("analytics", analytics.analytics_command))
-    application.add_handler(CommandHandler("user_stats", analytics.user_stats_command))
-    application.add_handler(CommandHandler("post_stats", analytics.post_stats_command))
-    application.add_handler(CommandHandler("export_data", analytics.export_data_command))
+    application.add_handler(CommandHandler("analytics", lazy_callback(analytics, "analytics_command")))
+    application.add_handler(CommandHandler("user_stats", lazy_callback(analytics, "user_stats_command")))
+    application.add_handler(CommandHandler("post_stats", lazy_callback(analytics, "post_stats_command")))
+    application.add_handler(CommandHandler("export_data", lazy_callback(analytics, "export_data_command")))
     
     # Обработчики callback query
     application.add_handler(CallbackQueryHandler(posts.handle_post_callback, pattern="^post_"))
-    application.add_handler(CallbackQueryHandler(admin.handle_admin_callback, pattern="^admin_"))
-    application.add_handler(CallbackQueryHandler(analytics.handle_analytics_callback, pattern="^analytics_"))
+    application.add_handler(CallbackQueryHandler(lazy_callback(admin, "handle_admin_callback"), pattern="^admin_"))
+    application.add_handler(CallbackQueryHandler(lazy_callback(analytics, "handle_analytics_callback"), pattern="^analytics_"))
     application.add_handler(CallbackQueryHandler(start.handle_main_callback, pattern="^main_"))
     
+    # Блокировка и разблокировка бота пользователем
+    application.add_handler(ChatMemberHandler(start.handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+    
     # Обработчик текстовых сообщений
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, posts.handle_text_message))
     
     # Обработчик ошибок
     application.add_error_handler(error_handler)
     
+    return application
+
+def main():
+    """Основная функция запуска бота"""
+    # Инициализация базы данных
+    init_database()
+    
+    if Config.BOT_MODE == "webhook":
+        # Обработчики создают приложения в своих процессах
+        from webhook import run_webhook
+        
+        logger.info("Запуск Telegram бота (webhook)...")
+        run_webhook()
+        return
+    
+    # Создание приложения
+    application = build_application()
+    
     # Запуск бота
     logger.info("Запуск Telegram бота...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,138 @@
+"""
+Middleware: одна сессия базы данных и один пользователь на каждый Update,
+параллельная обработка обновлений разных пользователей
+"""
+
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Hashable, Optional
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor, CallbackContext, ExtBot
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_session
+from services.user_service import AsyncUserService
+from services.user_cache import UserSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сессия и пользователь текущего Update (у каждой задачи asyncio свой контекст)
+_current_session: ContextVar[Optional[AsyncSession]] = ContextVar("current_session", default=None)
+_current_user: ContextVar[Optional[UserSnapshot]] = ContextVar("current_user", default=None)
+
+class BotContext(CallbackContext[ExtBot, dict, dict, dict]):
+    """Контекст обработчика с доступом к сессии и пользователю текущего Update"""
+
+    @property
+    def db(self) -> Optional[AsyncSession]:
+        """Сессия базы данных, открытая middleware для текущего Update"""
+        return _current_session.get()
+
+    @property
+    def db_user(self) -> Optional[UserSnapshot]:
+        """Снимок пользователя, загруженный middleware (None, если не зарегистрирован)"""
+        return _current_user.get()
+
+    @db_user.setter
+    def db_user(self, user: Optional[UserSnapshot]) -> None:
+        _current_user.set(user)
+
+@asynccontextmanager
+async def update_session(update: object):
+    """
+    Открытие сессии на время обработки Update
+
+    Снимок пользователя берется из кэша (при промахе - один запрос) и доступен
+    декораторам и обработчикам через context.db_user. Сессия не фиксируется
+    автоматически: обработчик сам вызывает await context.db.commit(). Ошибки
+    обработчиков перехватывают они сами или error_handler, поэтому успешный
+    Update здесь не отличить от неудачного, и все незафиксированное (в том
+    числе изменения обработчика, прервавшегося ошибкой) откатывается при
+    закрытии сессии.
+    """
+    db = get_async_session()
+    session_token = _current_session.set(db)
+    user_token = _current_user.set(None)
+
+    try:
+        if isinstance(update, Update) and update.effective_user:
+            user_service = AsyncUserService(db)
+            _current_user.set(await user_service.get_user_snapshot(update.effective_user.id))
+
+        yield db
+
+    finally:
+        # Незафиксированные изменения откатываются при закрытии
+        await db.close()
+        _current_user.reset(user_token)
+        _current_session.reset(session_token)
+
+class SessionMiddlewareApplication(Application):
+    """Application, оборачивающее обработку каждого Update в update_session"""
+
+    async def process_update(self, update: object) -> None:
+        try:
+            async with update_session(update):
+                await super().process_update(update)
+        except Exception as e:
+            logger.error(f"Ошибка в middleware сессии для update {update}: {e}")
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка для пользователя
+
+    Обновления разных пользователей обрабатываются одновременно (не больше
+    max_concurrent задач), обновления одного пользователя - строго по очереди,
+    поэтому шаги мастера и прочее состояние пользователя не гоняются друг с другом.
+    Блокировка пользователя удаляется, как только у нее не остается ожидающих.
+    """
+
+    def __init__(self, max_concurrent: int):
+        # Общий семафор базового класса берется до блокировки пользователя, и
+        # очередь одного пользователя занимала бы все места; лимит - свой, после блокировки
+        super().__init__(max_concurrent_updates=sys.maxsize)
+        self.max_concurrent = max_concurrent
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._locks: Dict[Hashable, list] = {}  # ключ -> [блокировка, число задач]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @staticmethod
+    def update_key(update: object) -> Optional[Hashable]:
+        """Ключ очереди: пользователь, для обновлений без пользователя - чат"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.update_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -2,9 +2,10 @@
 Модели базы данных
 """
 
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, ForeignKey, Index, JSON
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, Float, String, Text, Boolean, Date, DateTime, ForeignKey, Index, JSON, Sequence, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, query_expression
+from sqlalchemy.sql import func, text
 from database import Base
 
 class User(Base):
@@ -21,20 +22,54 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     last_activity = Column(DateTime(timezone=True), server_default=func.now())
+    bot_blocked_at = Column(DateTime(timezone=True), nullable=True)  # Пользователь заблокировал бота: рассылки его пропускают
+    
+    # Денормализованные счетчики (обновляются сервисами в той же транзакции)
+    posts_count = Column(Integer, nullable=False, default=0, server_default="0")  # Без удаленных
+    published_posts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    activities_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Связи
     posts = relationship("Post", back_populates="author", cascade="all, delete-orphan")
     activities = relationship("UserActivity", back_populates="user", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Триграммные индексы поиска пользователей (pg_trgm): ILIKE '%...%' и similarity
+        Index('idx_user_first_name_trgm', 'first_name', postgresql_using='gin', postgresql_ops={'first_name': 'gin_trgm_ops'}),
+        Index('idx_user_last_name_trgm', 'last_name', postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'}),
+        Index('idx_user_username_trgm', 'username', postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'}),
+        # Получатели рассылок по порядку id (keyset), недоступные в индекс не входят
+        Index('idx_user_broadcast', 'id', postgresql_where=text('is_active AND bot_blocked_at IS NULL')),
+    )
+    
     def __repr__(self):
         return f"<User(telegram_id={self.telegram_id}, username={self.username})>"
 
+# Последовательность глобальной нумерации постов: nextval не блокирует
+# параллельные транзакции и никогда не выдает один номер дважды
+post_number_seq = Sequence("post_number_seq", metadata=Base.metadata)
+
+# Поисковый вектор поста: русская морфология и точные словоформы (simple),
+# заголовок весит больше содержимого
+POST_SEARCH_EXPRESSION = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(content, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'B')"
+)
+
 class Post(Base):
     """Модель поста"""
     __tablename__ = "posts"
     
     id = Column(Integer, primary_key=True, index=True)
-    post_number = Column(Integer, unique=True, index=True, nullable=False)  # Глобальная нумерация
+    post_number = Column(
+        Integer,
+        server_default=post_number_seq.next_value(),
+        unique=True,
+        index=True,
+        nullable=False
+    )  # Глобальная нумерация
     title = Column(String(500), nullable=False)
     content = Column(Text, nullable=False)
     template_type = Column(String(100), nullable=True)  # Тип использованного шаблона
@@ -45,6 +80,14 @@ class Post(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     published_at = Column(DateTime(timezone=True), nullable=True)
     
+    # Полнотекстовый поиск: вектор вычисляется базой данных при записи
+    # (колонка таблицы без атрибута модели, см. __mapper_args__)
+    search_vector = Column(TSVECTOR, Computed(POST_SEARCH_EXPRESSION, persisted=True))
+    
+    # Заполняются только в результатах поиска (PostService.search_posts)
+    search_rank = query_expression()
+    search_snippet = query_expression()
+    
     # Связи
     author = relationship("User", back_populates="posts")
     
@@ -52,8 +95,17 @@ class Post(Base):
     __table_args__ = (
         Index('idx_post_author_created', 'author_id', 'created_at'),
         Index('idx_post_published', 'is_published', 'published_at'),
+        # Keyset-пагинация списков по номеру поста
+        Index('idx_post_published_number', 'is_published', 'post_number'),
+        Index('idx_post_author_number', 'author_id', 'post_number'),
+        Index('idx_post_template_number', 'template_type', 'post_number'),
+        Index('idx_post_search', 'search_vector', postgresql_using='gin'),
     )
     
+    # Номер поста возвращается через RETURNING сразу при flush; поисковый
+    # вектор не отображается, чтобы не возвращать его при каждой записи
+    __mapper_args__ = {'eager_defaults': True, 'exclude_properties': ['search_vector']}
+    
     def __repr__(self):
         return f"<Post(post_number={self.post_number}, title={self.title[:50]})>"
 
@@ -73,6 +125,53 @@ class PostTemplate(Base):
     def __repr__(self):
         return f"<PostTemplate(name={self.name})>"
 
+class ConversationState(Base):
+    """Модель состояния диалога (мастер создания поста), одна строка на пользователя"""
+    __tablename__ = "conversation_states"
+    
+    telegram_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    state = Column(String(32), nullable=False)
+    template_id = Column(String(50), nullable=False)  # ID шаблона, а не сам шаблон
+    current_field = Column(SmallInteger, nullable=False, default=0)
+    fields = Column(JSON, nullable=False)  # Заполненные поля: имя -> значение
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<ConversationState(telegram_id={self.telegram_id}, state={self.state})>"
+
+class RateLimitBucket(Base):
+    """Модель корзины общего ограничителя запросов (одна строка на ключ)"""
+    __tablename__ = "rate_limits"
+    
+    key = Column(String(64), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<RateLimitBucket(key={self.key}, tokens={self.tokens})>"
+
+class Broadcast(Base):
+    """Модель рассылки (прогресс сохраняется после каждого пакета получателей)"""
+    __tablename__ = "broadcasts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(32), nullable=False, default='custom')  # custom, new_post, weekly_report
+    text = Column(Text, nullable=False)
+    parse_mode = Column(String(16), nullable=True)
+    status = Column(String(16), nullable=False, default='pending', index=True)  # pending, running, done, cancelled
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    last_user_id = Column(Integer, nullable=False, default=0)  # Курсор: users.id последнего обработанного получателя
+    sent_count = Column(Integer, nullable=False, default=0, server_default="0")
+    failed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    blocked_count = Column(Integer, nullable=False, default=0, server_default="0")
+    owner = Column(String(128), nullable=True)  # Процесс, выполняющий рассылку
+    lease_until = Column(DateTime(timezone=True), nullable=True)  # До этого времени рассылку не забирает другой процесс
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<Broadcast(id={self.id}, status={self.status})>"
+
 class UserActivity(Base):
     """Модель активности пользователя"""
     __tablename__ = "user_activities"
@@ -112,3 +211,16 @@ class Analytics(Base):
     
     def __repr__(self):
         return f"<Analytics(metric={self.metric_name}, value={self.metric_value})>"
+
+class DailyStats(Base):
+    """Модель дневной статистики (обновляется инкрементально при записи данных)"""
+    __tablename__ = "daily_stats"
+    
+    date = Column(Date, primary_key=True)
+    user_activities = Column(Integer, nullable=False, default=0, server_default="0")
+    posts_created = Column(Integer, nullable=False, default=0, server_default="0")  # Без удаленных
+    posts_published = Column(Integer, nullable=False, default=0, server_default="0")  # Из созданных в этот день
+    new_users = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    def __repr__(self):
+        return f"<DailyStats(date={self.date}, activities={self.user_activities})>"
@@ -0,0 +1,235 @@
+"""
+Планировщик исходящих запросов к Bot API с учетом лимитов Telegram
+
+Подключается к приложению как rate_limiter (ApplicationBuilder.rate_limiter),
+поэтому через него проходят все отправки бота. Отправка сообщений ограничена
+общей корзиной (OUTBOUND_GLOBAL_RATE в секунду) и корзиной чата (личные чаты
+и группы - свои лимиты). Когда общих токенов не хватает, первыми их получают
+запросы с меньшим приоритетом: ответы пользователю раньше уведомлений,
+уведомления раньше результатов фоновых задач и рассылок. RetryAfter от
+Telegram приостанавливает все отправки на указанное время, запрос повторяется.
+
+Корзины хранятся в памяти процесса. В режиме webhook каждый из
+WEBHOOK_WORKERS обработчиков получает свою долю общего лимита
+(OUTBOUND_GLOBAL_RATE / WEBHOOK_WORKERS). Лимиты чатов тоже считаются в
+каждом процессе отдельно. Ответы пользователю отправляет его процесс, но
+уведомления и рассылки из другого процесса в тот же чат учитываются
+отдельно: на короткое время такой чат может получить больше сообщений,
+чем OUTBOUND_CHAT_RATE, и тогда сработает повтор по RetryAfter.
+
+Приоритет передается в rate_limit_args:
+    await bot.send_message(..., rate_limit_args={'priority': PRIORITY_BULK})
+"""
+
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from time import monotonic
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, List, Optional, Tuple
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import Config
+from services.rate_limiter import MemoryRateLimiter
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # Ответы на команды и нажатия (по умолчанию)
+PRIORITY_NOTIFICATION = 1  # Уведомления другим пользователям
+PRIORITY_BACKGROUND = 2  # Ход и результаты фоновых задач (экспорт, графики)
+PRIORITY_BULK = 3  # Массовые рассылки
+
+# Методы, на которые распространяются лимиты отправки сообщений
+LIMITED_METHODS = ('send', 'copyMessage', 'forwardMessage', 'editMessage')
+
+class OutboundScheduler(BaseRateLimiter[Dict[str, Any]]):
+    """
+    Ограничение исходящих сообщений с приоритетами
+
+    Запросы в один чат выполняются по очереди: запрос занимает очередь
+    чата до результата, включая повторы после RetryAfter, поэтому порядок
+    сообщений в чате сохраняется. Сначала ожидается токен чата, затем токен
+    общей корзины в порядке приоритета. Корзины чатов хранятся
+    так же, как корзины ограничителя запросов пользователей: восполнившиеся
+    удаляются, их число ограничено.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float,
+                 group_per_minute: float, max_retries: int, max_chats: int = 100000):
+        self.max_retries = max_retries
+        self._global = MemoryRateLimiter(capacity=global_rate, window=1, max_keys=1)
+        self._private = MemoryRateLimiter(capacity=chat_burst, window=chat_burst / chat_rate, max_keys=max_chats)
+        self._groups = MemoryRateLimiter(capacity=group_per_minute, window=60, max_keys=max_chats)
+        self._chat_locks: Dict[Any, list] = {}  # чат -> [блокировка, число запросов]
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.sent = 0
+        self.retried = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Any:
+        if not endpoint.startswith(LIMITED_METHODS):
+            return await callback(*args, **kwargs)
+
+        priority = (rate_limit_args or {}).get('priority', PRIORITY_INTERACTIVE)
+        chat_id = data.get('chat_id')
+
+        async with self._chat_turn(chat_id):
+            for attempt in range(self.max_retries + 1):
+                await self._acquire_chat(chat_id)
+                await self._acquire_global(priority)
+
+                try:
+                    result = await callback(*args, **kwargs)
+                    self.sent += 1
+                    return result
+
+                except RetryAfter as e:
+                    delay = e.retry_after
+                    if isinstance(delay, timedelta):
+                        delay = delay.total_seconds()
+
+                    if attempt == self.max_retries:
+                        raise
+
+                    # Флуд-контроль действует на бота целиком: пауза для всех отправок
+                    logger.warning(f"RetryAfter {delay} с для {endpoint} (чат {chat_id}), повтор {attempt + 1}")
+                    self.retried += 1
+                    self._paused_until = max(self._paused_until, monotonic() + delay)
+                    await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _chat_turn(self, chat_id: Any) -> AsyncIterator[None]:
+        """Очередь запросов в чат (FIFO), блокировки удаляются вместе с последним запросом"""
+        if chat_id is None:
+            yield
+            return
+
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+
+    async def _acquire_chat(self, chat_id: Any) -> None:
+        """Ожидание токена корзины чата (вызывается в очереди чата)"""
+        if chat_id is None:
+            return
+
+        is_group = isinstance(chat_id, str) or chat_id < 0
+        buckets = self._groups if is_group else self._private
+
+        while True:
+            retry_after = buckets.take(chat_id, 1, monotonic())
+            if not retry_after:
+                return
+            await asyncio.sleep(retry_after)
+
+    async def _acquire_global(self, priority: int) -> None:
+        """Ожидание токена общей корзины в порядке приоритета"""
+        if not self._waiting and monotonic() >= self._paused_until:
+            if not self._global.take(None, 1, monotonic()):
+                return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._order), future))
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="outbound-dispatcher")
+        self._wakeup.set()
+
+        await future
+
+    async def _dispatch(self) -> None:
+        """Выдача токенов общей корзины ожидающим запросам"""
+        while True:
+            while not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            _, _, future = self._waiting[0]
+            if future.cancelled():
+                heapq.heappop(self._waiting)
+                continue
+
+            now = monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            retry_after = self._global.take(None, 1, now)
+            if retry_after:
+                await asyncio.sleep(retry_after)
+                continue
+
+            heapq.heappop(self._waiting)
+            future.set_result(None)
+
+    def get_stats(self) -> dict:
+        """Статистика планировщика"""
+        return {
+            'waiting': len(self._waiting),
+            'sent': self.sent,
+            'retried': self.retried
+        }
+
+def create_outbound_scheduler() -> OutboundScheduler:
+    """Планировщик с лимитами из настроек (общий лимит делится между процессами webhook)"""
+    processes = Config.WEBHOOK_WORKERS if Config.BOT_MODE == 'webhook' else 1
+
+    return OutboundScheduler(
+        global_rate=Config.OUTBOUND_GLOBAL_RATE / processes,
+        chat_rate=Config.OUTBOUND_CHAT_RATE,
+        chat_burst=Config.OUTBOUND_CHAT_BURST,
+        group_per_minute=Config.OUTBOUND_GROUP_PER_MINUTE,
+        max_retries=Config.OUTBOUND_MAX_RETRIES
+    )
+
+async def send_notification(bot: Bot, chat_id: int, text: str, **kwargs) -> bool:
+    """
+    Уведомление пользователю с приоритетом PRIORITY_NOTIFICATION
+
+    Предназначено для запуска отдельной задачей (application.create_task), чтобы
+    обработчик не ждал очереди; ошибки доставки только логируются.
+    """
+    try:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            rate_limit_args={'priority': PRIORITY_NOTIFICATION},
+            **kwargs
+        )
+        return True
+    except Exception as e:
+        # Пользователь заблокировал бота, чат не найден и т.д.
+        logger.info(f"Уведомление пользователю {chat_id} не доставлено: {e}")
+        return False
@@ -2,11 +2,20 @@
 Сервис для работы с постами
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy.orm import Session, joinedload, load_only, with_expression
+from sqlalchemy import func, desc, and_, select
 from models import Post, User
+from database import AsyncServiceAdapter
+from services.daily_stats_service import DailyStatsService, stats_day
+from services.user_service import UserService
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
+
+# Колонки поста, достаточные для строк списков (без содержимого)
+POST_LIST_COLUMNS = ('post_number', 'title', 'is_published', 'author_id', 'created_at', 'published_at')
+
+# Оформление фрагментов с найденными словами (ts_headline)
+SEARCH_SNIPPET_OPTIONS = "StartSel=«, StopSel=», MaxWords=25, MinWords=10, MaxFragments=2, FragmentDelimiter= … "
 
 class PostService:
     def __init__(self, db: Session):
@@ -15,12 +24,8 @@ class PostService:
     def create_post(self, title: str, content: str, author_id: int, template_type: str = None) -> Post:
         """Создание нового поста"""
         try:
-            # Получение следующего номера поста
-            last_post = self.db.query(Post).order_by(desc(Post.post_number)).first()
-            next_number = (last_post.post_number + 1) if last_post else 1
-            
+            # Номер поста выдается последовательностью post_number_seq при вставке
             post = Post(
-                post_number=next_number,
                 title=title,
                 content=content,
                 author_id=author_id,
@@ -32,12 +37,35 @@ class PostService:
             self.db.add(post)
             self.db.flush()  # Получить ID без коммита
             
+            DailyStatsService(self.db).increment(posts_created=1)
+            UserService(self.db).increment_counters(author_id, posts_count=1)
+            
             return post
             
         except Exception as e:
             self.db.rollback()
             raise e
     
+    def _list_query(self, with_author: bool = True, columns: Sequence[str] = None):
+        """
+        Запрос для списков постов с явной стратегией загрузки
+        
+        Args:
+            with_author: Загрузить автора тем же запросом (JOIN), без запроса на каждый пост
+            columns: Загрузить только указанные колонки поста (остальные - отложенно)
+        """
+        query = self.db.query(Post)
+        
+        if columns:
+            query = query.options(load_only(*[getattr(Post, name) for name in columns]))
+        
+        if with_author:
+            query = query.options(
+                joinedload(Post.author).load_only(User.first_name, User.username)
+            )
+        
+        return query
+    
     def get_post_by_id(self, post_id: int) -> Optional[Post]:
         """Получение поста по ID"""
         return self.db.query(Post).filter(
@@ -50,36 +78,85 @@ class PostService:
             and_(Post.post_number == post_number, Post.is_deleted == False)
         ).first()
     
-    def get_user_posts(self, user_id: int, include_deleted: bool = False) -> List[Post]:
+    def get_user_posts(self, user_id: int, include_deleted: bool = False,
+                       with_author: bool = False, columns: Sequence[str] = None,
+                       limit: int = None) -> List[Post]:
         """Получение постов пользователя"""
-        query = self.db.query(Post).filter(Post.author_id == user_id)
+        query = self._list_query(with_author, columns).filter(Post.author_id == user_id)
         
         if not include_deleted:
             query = query.filter(Post.is_deleted == False)
         
-        return query.order_by(desc(Post.created_at)).all()
+        return query.order_by(desc(Post.created_at)).limit(limit).all()
+    
+    def get_posts_page(self, cursor: int = None, direction: str = "next", limit: int = 5,
+                       author_id: int = None, template_type: str = None,
+                       published_only: bool = False, with_author: bool = False,
+                       columns: Sequence[str] = POST_LIST_COLUMNS) -> Tuple[List[Post], bool]:
+        """
+        Страница постов с keyset-пагинацией по номеру поста (от новых к старым)
+        
+        Args:
+            cursor: Номер поста на границе страницы (None - первая страница)
+            direction: "next" - посты старше cursor, "prev" - посты новее cursor
+            limit: Количество постов на странице
+        
+        Returns:
+            Посты страницы (от новых к старым) и признак наличия
+            следующей страницы в направлении direction
+        """
+        query = self._list_query(with_author, columns).filter(Post.is_deleted == False)
+        
+        if author_id is not None:
+            query = query.filter(Post.author_id == author_id)
+        if template_type is not None:
+            query = query.filter(Post.template_type == template_type)
+        if published_only:
+            query = query.filter(Post.is_published == True)
+        
+        if direction == "prev":
+            if cursor is not None:
+                query = query.filter(Post.post_number > cursor)
+            query = query.order_by(Post.post_number)
+        else:
+            if cursor is not None:
+                query = query.filter(Post.post_number < cursor)
+            query = query.order_by(desc(Post.post_number))
+        
+        # Лишняя строка показывает, есть ли еще страница
+        posts = query.limit(limit + 1).all()
+        has_more = len(posts) > limit
+        posts = posts[:limit]
+        
+        if direction == "prev":
+            posts.reverse()
+        
+        return posts, has_more
     
-    def get_published_posts(self, limit: int = 50) -> List[Post]:
+    def get_published_posts(self, limit: int = 50, with_author: bool = True,
+                            columns: Sequence[str] = None) -> List[Post]:
         """Получение опубликованных постов"""
-        return self.db.query(Post).filter(
+        return self._list_query(with_author, columns).filter(
             and_(
                 Post.is_published == True,
                 Post.is_deleted == False
             )
         ).order_by(desc(Post.published_at)).limit(limit).all()
     
-    def get_unpublished_posts(self, limit: int = 50) -> List[Post]:
+    def get_unpublished_posts(self, limit: int = 50, with_author: bool = True,
+                              columns: Sequence[str] = None) -> List[Post]:
         """Получение неопубликованных постов"""
-        return self.db.query(Post).filter(
+        return self._list_query(with_author, columns).filter(
             and_(
                 Post.is_published == False,
                 Post.is_deleted == False
             )
         ).order_by(desc(Post.created_at)).limit(limit).all()
     
-    def get_recent_posts(self, limit: int = 20) -> List[Post]:
+    def get_recent_posts(self, limit: int = 20, with_author: bool = True,
+                         columns: Sequence[str] = None) -> List[Post]:
         """Получение последних постов"""
-        return self.db.query(Post).filter(
+        return self._list_query(with_author, columns).filter(
             Post.is_deleted == False
         ).order_by(desc(Post.created_at)).limit(limit).all()
     
@@ -117,6 +194,16 @@ class PostService:
             else:
                 post.published_at = None
             
+            published_delta = 1 if post.is_published else -1
+            DailyStatsService(self.db).increment(
+                stats_day(post.created_at),
+                posts_published=published_delta
+            )
+            UserService(self.db).increment_counters(
+                post.author_id,
+                published_posts_count=published_delta
+            )
+            
             return True
             
         except Exception:
@@ -136,6 +223,17 @@ class PostService:
                 post.is_deleted = True
                 post.updated_at = datetime.utcnow()
             
+            DailyStatsService(self.db).increment(
+                stats_day(post.created_at),
+                posts_created=-1,
+                posts_published=-1 if post.is_published else 0
+            )
+            UserService(self.db).increment_counters(
+                post.author_id,
+                posts_count=-1,
+                published_posts_count=-1 if post.is_published else 0
+            )
+            
             return True
             
         except Exception:
@@ -143,24 +241,43 @@ class PostService:
             return False
     
     def search_posts(self, query: str, limit: int = 20) -> List[Post]:
-        """Поиск постов по тексту"""
-        search_term = f"%{query}%"
-        return self.db.query(Post).filter(
+        """
+        Полнотекстовый поиск опубликованных постов
+        
+        Поиск идет по GIN-индексу search_vector (русская морфология и точные
+        словоформы). Посты упорядочены по релевантности; у каждого заполнены
+        search_rank и search_snippet (фрагмент содержимого с найденными словами).
+        """
+        ts_query = func.websearch_to_tsquery('russian', query).op('||')(
+            func.websearch_to_tsquery('simple', query)
+        )
+        rank = func.ts_rank_cd(Post.search_vector, ts_query)
+        
+        # Сначала отбираются лучшие посты, фрагменты строятся только для них
+        matches = select(Post.id, rank.label('rank')).where(
             and_(
                 Post.is_deleted == False,
                 Post.is_published == True,
-                (Post.title.ilike(search_term) | Post.content.ilike(search_term))
+                Post.search_vector.op('@@')(ts_query)
             )
-        ).order_by(desc(Post.published_at)).limit(limit).all()
+        ).order_by(desc('rank'), desc(Post.published_at)).limit(limit).subquery()
+        
+        return self.db.query(Post).join(matches, Post.id == matches.c.id).options(
+            with_expression(Post.search_rank, matches.c.rank),
+            with_expression(
+                Post.search_snippet,
+                func.ts_headline('russian', Post.content, ts_query, SEARCH_SNIPPET_OPTIONS)
+            )
+        ).order_by(desc(matches.c.rank), desc(Post.published_at)).all()
     
-    def get_posts_by_template(self, template_type: str) -> List[Post]:
+    def get_posts_by_template(self, template_type: str, limit: int = None) -> List[Post]:
         """Получение постов по типу шаблона"""
         return self.db.query(Post).filter(
             and_(
                 Post.template_type == template_type,
                 Post.is_deleted == False
             )
-        ).order_by(desc(Post.created_at)).all()
+        ).order_by(desc(Post.created_at)).limit(limit).all()
     
     def get_posts_count(self) -> int:
         """Получение общего количества постов"""
@@ -236,25 +353,17 @@ class PostService:
         ).order_by(desc(Post.created_at)).all()
     
     def get_daily_posts_stats(self, days: int = 30) -> List[dict]:
-        """Получение ежедневной статистики постов"""
-        from sqlalchemy import Date, cast
-        
-        results = self.db.query(
-            cast(Post.created_at, Date).label('date'),
-            func.count(Post.id).label('posts_count'),
-            func.sum(func.case((Post.is_published == True, 1), else_=0)).label('published_count')
-        ).filter(
-            and_(
-                Post.created_at >= datetime.utcnow() - timedelta(days=days),
-                Post.is_deleted == False
-            )
-        ).group_by(cast(Post.created_at, Date)).order_by('date').all()
-        
+        """Получение ежедневной статистики постов (из таблицы daily_stats)"""
         return [
             {
-                'date': result.date,
-                'posts_count': result.posts_count,
-                'published_count': result.published_count or 0
+                'date': stats.date,
+                'posts_count': stats.posts_created,
+                'published_count': stats.posts_published
             }
-            for result in results
+            for stats in DailyStatsService(self.db).get_daily_stats(days)
+            if stats.posts_created > 0
         ]
+
+class AsyncPostService(AsyncServiceAdapter):
+    """Асинхронный вариант PostService для обработчиков бота"""
+    service_class = PostService
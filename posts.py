@@ -3,57 +3,53 @@
 """
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from database import get_session
-from services.post_service import PostService
-from services.user_service import UserService
-from services.analytics_service import AnalyticsService
-from utils.templates import get_post_templates, get_template_fields
-from utils.keyboards import get_posts_keyboard, get_post_actions_keyboard
+from utils.middleware import BotContext
+from services.post_service import AsyncPostService, POST_LIST_COLUMNS
+from services.user_service import AsyncUserService
+from services.write_behind import activity_sink
+from services.state_store import state_store, UserState
+from utils.templates import get_post_templates, get_template_fields, get_template_by_id, render_template
+from utils.keyboards import get_posts_keyboard, get_post_actions_keyboard, get_post_list_keyboard
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Состояния для создания поста
-user_states = {}
+# Количество постов на странице списка
+POSTS_PER_PAGE = 5
 
-async def create_post_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def create_post_command(update: Update, context: BotContext) -> None:
     """Обработчик команды создания поста"""
     try:
-        db = get_session()
+        db_user = context.db_user
         
-        try:
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение доступных шаблонов
-            templates = get_post_templates()
-            
-            if not templates:
-                await update.message.reply_text("❌ Шаблоны постов недоступны.")
-                return
-            
-            # Создание клавиатуры с шаблонами
-            keyboard_buttons = []
-            for template in templates:
-                keyboard_buttons.append([
-                    InlineKeyboardButton(
-                        f"📋 {template['name']}", 
-                        callback_data=f"post_template_{template['id']}"
-                    )
-                ])
-            
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение доступных шаблонов
+        templates = get_post_templates()
+        
+        if not templates:
+            await update.message.reply_text("❌ Шаблоны постов недоступны.")
+            return
+        
+        # Создание клавиатуры с шаблонами
+        keyboard_buttons = []
+        for template in templates:
             keyboard_buttons.append([
-                InlineKeyboardButton("❌ Отмена", callback_data="post_cancel")
+                InlineKeyboardButton(
+                    f"📋 {template['name']}", 
+                    callback_data=f"post_template_{template['id']}"
+                )
             ])
-            
-            keyboard = InlineKeyboardMarkup(keyboard_buttons)
-            
-            text = """
+        
+        keyboard_buttons.append([
+            InlineKeyboardButton("❌ Отмена", callback_data="post_cancel")
+        ])
+        
+        keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        
+        text = """
 📝 **Создание нового поста**
 
 Выберите шаблон для создания поста:
@@ -64,17 +60,14 @@ async def create_post_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 • Объявление - для важных объявлений
 • Обзор - для обзоров и рецензий
             """
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в create_post_command: {e}")
         await update.message.reply_text("❌ Ошибка при создании поста.")
 
-async def my_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def my_posts_command(update: Update, context: BotContext) -> None:
     """Обработчик команды просмотра своих постов"""
     try:
         await my_posts_callback(update, context, is_command=True)
@@ -82,121 +75,109 @@ async def my_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         logger.error(f"Ошибка в my_posts_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении постов.")
 
-async def my_posts_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, is_command=False) -> None:
+async def my_posts_callback(update: Update, context: BotContext, is_command=False) -> None:
     """Обработчик просмотра своих постов (callback и команда)"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
+        user_service = AsyncUserService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                message_text = "❌ Пользователь не найден. Используйте /start"
-                if is_command:
-                    await update.message.reply_text(message_text)
-                else:
-                    await update.callback_query.edit_message_text(message_text)
-                return
-            
-            # Получение постов пользователя
-            posts = post_service.get_user_posts(db_user.id)
-            
-            if not posts:
-                text = "📝 **Мои посты**\n\nУ вас пока нет созданных постов.\n\nИспользуйте /create_post для создания первого поста."
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
-                    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-                ])
+        db_user = context.db_user
+        
+        if not db_user:
+            message_text = "❌ Пользователь не найден. Используйте /start"
+            if is_command:
+                await update.message.reply_text(message_text)
             else:
-                active_posts = [p for p in posts if not p.is_deleted]
-                published_posts = [p for p in active_posts if p.is_published]
-                
-                text = f"""
+                await update.callback_query.edit_message_text(message_text)
+            return
+        
+        # Счетчики пользователя и последние 5 постов
+        user = await user_service.get_user_by_id(db_user.id)
+        posts = await post_service.get_user_posts(db_user.id, columns=POST_LIST_COLUMNS, limit=5)
+        
+        if not posts:
+            text = "📝 **Мои посты**\n\nУ вас пока нет созданных постов.\n\nИспользуйте /create_post для создания первого поста."
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ])
+        else:
+            text = f"""
 📝 **Мои посты**
 
 📊 **Статистика:**
-• Всего постов: {len(active_posts)}
-• Опубликовано: {len(published_posts)}
-• Черновиков: {len(active_posts) - len(published_posts)}
+• Всего постов: {user.posts_count}
+• Опубликовано: {user.published_posts_count}
+• Черновиков: {user.posts_count - user.published_posts_count}
 
 📋 **Последние посты:**
                 """
-                
-                # Показываем последние 5 постов
-                for post in active_posts[:5]:
-                    status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
-                    text += f"\n• #{post.post_number} - {post.title[:30]}... ({status})"
-                
-                keyboard_buttons = [
-                    [InlineKeyboardButton("📋 Все мои посты", callback_data="post_list_my")],
-                    [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
-                    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-                ]
-                keyboard = InlineKeyboardMarkup(keyboard_buttons)
             
-            if is_command:
-                await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            else:
-                await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
+            # Показываем последние 5 постов
+            for post in posts:
+                status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
+                text += f"\n• #{post.post_number} - {post.title[:30]}... ({status})"
             
+            keyboard_buttons = [
+                [InlineKeyboardButton("📋 Все мои посты", callback_data="post_list_my")],
+                [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ]
+            keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        
+        if is_command:
+            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        else:
+            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в my_posts_callback: {e}")
 
-async def all_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def all_posts_command(update: Update, context: BotContext) -> None:
     """Обработчик команды просмотра всех постов"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение всех опубликованных постов
-            posts = post_service.get_published_posts(limit=20)
-            
-            if not posts:
-                text = "📰 **Все посты**\n\nПостов пока нет.\n\nСтаньте первым, кто создаст пост!"
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
-                    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-                ])
-            else:
-                text = f"📰 **Все посты** (последние {len(posts)})\n\n"
-                
-                for post in posts:
-                    author_name = post.author.first_name or post.author.username or "Аноним"
-                    text += f"• #{post.post_number} - {post.title[:40]}...\n"
-                    text += f"  👤 {author_name} | 📅 {post.published_at.strftime('%d.%m.%Y')}\n\n"
-                
-                keyboard_buttons = [
-                    [InlineKeyboardButton("📋 Подробный список", callback_data="post_list_all")],
-                    [InlineKeyboardButton("🔍 Поиск постов", callback_data="post_search")],
-                    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-                ]
-                keyboard = InlineKeyboardMarkup(keyboard_buttons)
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение всех опубликованных постов
+        posts = await post_service.get_published_posts(limit=20, columns=POST_LIST_COLUMNS)
+        
+        if not posts:
+            text = "📰 **Все посты**\n\nПостов пока нет.\n\nСтаньте первым, кто создаст пост!"
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("➕ Создать пост", callback_data="post_create")],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ])
+        else:
+            text = f"📰 **Все посты** (последние {len(posts)})\n\n"
             
-        finally:
-            db.close()
+            for post in posts:
+                author = await post.awaitable_attrs.author
+                author_name = author.first_name or author.username or "Аноним"
+                text += f"• #{post.post_number} - {post.title[:40]}...\n"
+                text += f"  👤 {author_name} | 📅 {post.published_at.strftime('%d.%m.%Y')}\n\n"
             
+            keyboard_buttons = [
+                [InlineKeyboardButton("📋 Подробный список", callback_data="post_list_all")],
+                [InlineKeyboardButton("🔍 Поиск постов", callback_data="post_search")],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ]
+            keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в all_posts_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении постов.")
 
-async def edit_post_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def edit_post_command(update: Update, context: BotContext) -> None:
     """Обработчик команды редактирования поста"""
     try:
         args = context.args
@@ -212,58 +193,53 @@ async def edit_post_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("❌ Номер поста должен быть числом.")
             return
         
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение поста
-            post = post_service.get_post_by_number(post_number)
-            
-            if not post:
-                await update.message.reply_text(f"❌ Пост #{post_number} не найден.")
-                return
-            
-            # Проверка прав доступа
-            if post.author_id != db_user.id and not db_user.is_admin:
-                await update.message.reply_text("❌ Вы можете редактировать только свои посты.")
-                return
-            
-            # Показ информации о посте и возможности редактирования
-            status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
-            text = f"""
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение поста
+        post = await post_service.get_post_by_number(post_number)
+        
+        if not post:
+            await update.message.reply_text(f"❌ Пост #{post_number} не найден.")
+            return
+        
+        # Проверка прав доступа
+        if post.author_id != db_user.id and not db_user.is_admin:
+            await update.message.reply_text("❌ Вы можете редактировать только свои посты.")
+            return
+        
+        # Показ информации о посте и возможности редактирования
+        status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
+        author = await post.awaitable_attrs.author
+        text = f"""
 ✏️ **Редактирование поста #{post.post_number}**
 
 📋 **Текущая информация:**
 • Заголовок: {post.title}
 • Статус: {status}
-• Автор: {post.author.first_name or post.author.username}
+• Автор: {author.first_name or author.username}
 • Создан: {post.created_at.strftime('%d.%m.%Y %H:%M')}
 • Обновлен: {post.updated_at.strftime('%d.%m.%Y %H:%M')}
 
 **Содержание:**
 {post.content[:200]}{'...' if len(post.content) > 200 else ''}
             """
-            
-            keyboard = get_post_actions_keyboard(post, db_user.is_admin)
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = get_post_actions_keyboard(post, db_user.is_admin)
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в edit_post_command: {e}")
         await update.message.reply_text("❌ Ошибка при редактировании поста.")
 
-async def handle_post_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def handle_post_callback(update: Update, context: BotContext) -> None:
     """Обработчик callback query для постов"""
     try:
         query = update.callback_query
@@ -281,8 +257,7 @@ async def handle_post_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             
         elif data == "cancel":
             # Отмена создания поста
-            if update.effective_user.id in user_states:
-                del user_states[update.effective_user.id]
+            await state_store.delete(update.effective_user.id)
             
             await query.edit_message_text(
                 "❌ Создание поста отменено.",
@@ -291,6 +266,20 @@ async def handle_post_callback(update: Update, context: ContextTypes.DEFAULT_TYP
                 ])
             )
             
+        elif data.startswith("list_"):
+            # Первая страница списка: post_list_{scope}
+            await show_posts_page(update, context, data.replace("list_", ""))
+            
+        elif data.startswith("page_") and data != "page_info":
+            # Следующая/предыдущая страница: post_page_{scope}_{page}_{n|p}_{cursor}
+            scope, page, direction, cursor = data.replace("page_", "").split("_")
+            await show_posts_page(
+                update, context, scope,
+                page=int(page),
+                cursor=int(cursor),
+                direction="prev" if direction == "p" else "next"
+            )
+            
         elif data.startswith("view_"):
             post_number = int(data.replace("view_", ""))
             await show_post_details(update, context, post_number)
@@ -311,45 +300,87 @@ async def handle_post_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         logger.error(f"Ошибка в handle_post_callback: {e}")
         await query.message.reply_text("❌ Ошибка при обработке действия.")
 
-async def handle_template_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, template_id: str) -> None:
+async def show_posts_page(update: Update, context: BotContext, scope: str, page: int = 0,
+                          cursor: int = None, direction: str = "next") -> None:
+    """Страница списка постов (keyset-пагинация по номеру поста)"""
+    try:
+        post_service = AsyncPostService(context.db)
+        
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.callback_query.edit_message_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        if scope == "my":
+            title = "📋 **Мои посты**"
+            filters = {'author_id': db_user.id}
+        else:
+            scope = "all"
+            title = "📰 **Все посты**"
+            filters = {'published_only': True}
+        
+        # Один индексный запрос на страницу независимо от общего числа постов
+        posts, has_more = await post_service.get_posts_page(
+            cursor=cursor,
+            direction=direction,
+            limit=POSTS_PER_PAGE,
+            **filters
+        )
+        
+        if direction == "prev":
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = cursor is not None, has_more
+        
+        if posts:
+            text = f"{title}\n\nСтраница {page + 1}. Выберите пост для просмотра:"
+        else:
+            text = f"{title}\n\nПостов пока нет."
+        
+        keyboard = get_post_list_keyboard(
+            posts,
+            page=page,
+            scope=scope,
+            has_prev=has_prev,
+            has_next=has_next
+        )
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
+    except Exception as e:
+        logger.error(f"Ошибка в show_posts_page: {e}")
+        await update.callback_query.edit_message_text("❌ Ошибка при получении списка постов.")
+
+async def handle_template_selection(update: Update, context: BotContext, template_id: str) -> None:
     """Обработка выбора шаблона для поста"""
     try:
-        templates = get_post_templates()
-        template = next((t for t in templates if t['id'] == template_id), None)
+        template = get_template_by_id(template_id)
         
         if not template:
             await update.callback_query.edit_message_text("❌ Шаблон не найден.")
             return
         
         # Инициализация состояния пользователя
-        user_states[update.effective_user.id] = {
-            'state': 'creating_post',
-            'template': template,
-            'fields': {},
-            'current_field': 0
-        }
+        state = UserState(state='creating_post', template_id=template['id'])
+        await state_store.set(update.effective_user.id, state)
         
         # Начинаем заполнение первого поля
-        await ask_next_field(update, context)
+        await ask_next_field(update, context, state)
         
     except Exception as e:
         logger.error(f"Ошибка в handle_template_selection: {e}")
 
-async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def ask_next_field(update: Update, context: BotContext, state: UserState) -> None:
     """Запрос следующего поля шаблона"""
     try:
-        user_id = update.effective_user.id
-        if user_id not in user_states:
-            return
-        
-        state = user_states[user_id]
-        template = state['template']
-        fields = get_template_fields(template['id'])
-        current_field_index = state['current_field']
+        template = get_template_by_id(state.template_id)
+        fields = get_template_fields(state.template_id)
+        current_field_index = state.current_field
         
         if current_field_index >= len(fields):
             # Все поля заполнены, создаем пост
-            await create_post_from_template(update, context)
+            await create_post_from_template(update, context, state)
             return
         
         field = fields[current_field_index]
@@ -374,13 +405,18 @@ async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     except Exception as e:
         logger.error(f"Ошибка в ask_next_field: {e}")
 
-async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def handle_text_message(update: Update, context: BotContext) -> None:
     """Обработчик текстовых сообщений"""
     try:
-        user_id = update.effective_user.id
+        state = await state_store.get(update.effective_user.id)
         
-        if user_id in user_states and user_states[user_id]['state'] == 'creating_post':
-            await process_field_input(update, context)
+        if state is not None and get_template_by_id(state.template_id) is None:
+            # Шаблон удален после сохранения состояния - мастер не продолжить
+            await state_store.delete(update.effective_user.id)
+            state = None
+        
+        if state is not None and state.state == 'creating_post':
+            await process_field_input(update, context, state)
         else:
             # Обычное сообщение, можно добавить общий ответ
             await update.message.reply_text(
@@ -391,14 +427,11 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         logger.error(f"Ошибка в handle_text_message: {e}")
 
-async def process_field_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def process_field_input(update: Update, context: BotContext, state: UserState) -> None:
     """Обработка ввода поля шаблона"""
     try:
-        user_id = update.effective_user.id
-        state = user_states[user_id]
-        template = state['template']
-        fields = get_template_fields(template['id'])
-        current_field_index = state['current_field']
+        fields = get_template_fields(state.template_id)
+        current_field_index = state.current_field
         
         if current_field_index >= len(fields):
             return
@@ -414,30 +447,26 @@ async def process_field_input(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
         
         # Сохранение значения поля
-        state['fields'][field['name']] = user_input
-        state['current_field'] += 1
+        state.fields[field['name']] = user_input
+        state.current_field += 1
+        await state_store.set(update.effective_user.id, state)
         
         # Переход к следующему полю
-        await ask_next_field_via_message(update, context)
+        await ask_next_field_via_message(update, context, state)
         
     except Exception as e:
         logger.error(f"Ошибка в process_field_input: {e}")
 
-async def ask_next_field_via_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def ask_next_field_via_message(update: Update, context: BotContext, state: UserState) -> None:
     """Запрос следующего поля через новое сообщение"""
     try:
-        user_id = update.effective_user.id
-        if user_id not in user_states:
-            return
-        
-        state = user_states[user_id]
-        template = state['template']
-        fields = get_template_fields(template['id'])
-        current_field_index = state['current_field']
+        template = get_template_by_id(state.template_id)
+        fields = get_template_fields(state.template_id)
+        current_field_index = state.current_field
         
         if current_field_index >= len(fields):
             # Все поля заполнены, создаем пост
-            await create_post_from_template(update, context)
+            await create_post_from_template(update, context, state)
             return
         
         field = fields[current_field_index]
@@ -464,55 +493,46 @@ async def ask_next_field_via_message(update: Update, context: ContextTypes.DEFAU
     except Exception as e:
         logger.error(f"Ошибка в ask_next_field_via_message: {e}")
 
-async def create_post_from_template(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def create_post_from_template(update: Update, context: BotContext, state: UserState) -> None:
     """Создание поста из заполненного шаблона"""
     try:
-        user_id = update.effective_user.id
-        if user_id not in user_states:
+        template = get_template_by_id(state.template_id)
+        fields_data = state.fields
+        
+        db = context.db
+        post_service = AsyncPostService(db)
+        
+        db_user = context.db_user
+        
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден.")
             return
         
-        state = user_states[user_id]
-        template = state['template']
-        fields_data = state['fields']
+        # Формирование контента поста из шаблона
+        title = fields_data.get('title', 'Без названия')
+        content = render_template(template['id'], fields_data)
         
-        db = get_session()
+        # Создание поста
+        post = await post_service.create_post(
+            title=title,
+            content=content,
+            author_id=db_user.id,
+            template_type=template['id']
+        )
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            analytics_service = AnalyticsService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(user_id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден.")
-                return
-            
-            # Формирование контента поста из шаблона
-            title = fields_data.get('title', 'Без названия')
-            content = template['content_template'].format(**fields_data)
-            
-            # Создание поста
-            post = post_service.create_post(
-                title=title,
-                content=content,
-                author_id=db_user.id,
-                template_type=template['id']
-            )
-            
-            # Логирование активности
-            analytics_service.log_user_activity(
-                user_id=db_user.id,
-                activity_type="post_create",
-                activity_data={"post_id": post.id, "template": template['id']}
-            )
-            
-            db.commit()
-            
-            # Очистка состояния
-            del user_states[user_id]
-            
-            text = f"""
+        await db.commit()
+        
+        # Логирование активности (запись в фоне)
+        activity_sink.record(
+            user_id=db_user.id,
+            activity_type="post_create",
+            activity_data={"post_id": post.id, "template": template['id']}
+        )
+        
+        # Очистка состояния
+        await state_store.delete(update.effective_user.id)
+        
+        text = f"""
 ✅ **Пост успешно создан!**
 
 📋 **Информация о посте:**
@@ -523,44 +543,40 @@ async def create_post_from_template(update: Update, context: ContextTypes.DEFAUL
 
 Пост создан как черновик. Вы можете опубликовать его позже.
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("🟢 Опубликовать", callback_data=f"post_publish_{post.post_number}"),
-                    InlineKeyboardButton("✏️ Редактировать", callback_data=f"post_edit_{post.post_number}")
-                ],
-                [
-                    InlineKeyboardButton("📝 Мои посты", callback_data="main_my_posts"),
-                    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                ]
-            ])
-            
-            await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("🟢 Опубликовать", callback_data=f"post_publish_{post.post_number}"),
+                InlineKeyboardButton("✏️ Редактировать", callback_data=f"post_edit_{post.post_number}")
+            ],
+            [
+                InlineKeyboardButton("📝 Мои посты", callback_data="main_my_posts"),
+                InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+            ]
+        ])
+        
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в create_post_from_template: {e}")
         await update.message.reply_text("❌ Ошибка при создании поста.")
 
-async def show_post_details(update: Update, context: ContextTypes.DEFAULT_TYPE, post_number: int) -> None:
+async def show_post_details(update: Update, context: BotContext, post_number: int) -> None:
     """Показ детальной информации о посте"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
+        post = await post_service.get_post_by_number(post_number)
         
-        try:
-            post_service = PostService(db)
-            post = post_service.get_post_by_number(post_number)
-            
-            if not post:
-                await update.callback_query.edit_message_text("❌ Пост не найден.")
-                return
-            
-            status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
-            author_name = post.author.first_name or post.author.username or "Аноним"
-            
-            text = f"""
+        if not post:
+            await update.callback_query.edit_message_text("❌ Пост не найден.")
+            return
+        
+        status = "🟢 Опубликован" if post.is_published else "🟡 Черновик"
+        author = await post.awaitable_attrs.author
+        author_name = author.first_name or author.username or "Аноним"
+        
+        text = f"""
 📋 **Пост #{post.post_number}**
 
 **{post.title}**
@@ -572,82 +588,71 @@ async def show_post_details(update: Update, context: ContextTypes.DEFAULT_TYPE,
 **Содержание:**
 {post.content}
             """
+        
+        keyboard_buttons = [
+            [InlineKeyboardButton("🔙 Назад", callback_data="post_list_all")]
+        ]
+        
+        # Добавляем кнопки действий для автора или админа
+        db_user = context.db_user
+        
+        if db_user and (post.author_id == db_user.id or db_user.is_admin):
+            keyboard_buttons.insert(0, [
+                InlineKeyboardButton("✏️ Редактировать", callback_data=f"post_edit_{post_number}"),
+                InlineKeyboardButton("🗑 Удалить", callback_data=f"post_delete_{post_number}")
+            ])
             
-            keyboard_buttons = [
-                [InlineKeyboardButton("🔙 Назад", callback_data="post_list_all")]
-            ]
-            
-            # Добавляем кнопки действий для автора или админа
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if db_user and (post.author_id == db_user.id or db_user.is_admin):
-                keyboard_buttons.insert(0, [
-                    InlineKeyboardButton("✏️ Редактировать", callback_data=f"post_edit_{post_number}"),
-                    InlineKeyboardButton("🗑 Удалить", callback_data=f"post_delete_{post_number}")
+            if not post.is_published:
+                keyboard_buttons.insert(1, [
+                    InlineKeyboardButton("🟢 Опубликовать", callback_data=f"post_publish_{post_number}")
                 ])
-                
-                if not post.is_published:
-                    keyboard_buttons.insert(1, [
-                        InlineKeyboardButton("🟢 Опубликовать", callback_data=f"post_publish_{post_number}")
-                    ])
-            
-            keyboard = InlineKeyboardMarkup(keyboard_buttons)
-            
-            await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в show_post_details: {e}")
 
-async def toggle_post_publication(update: Update, context: ContextTypes.DEFAULT_TYPE, post_number: int) -> None:
+async def toggle_post_publication(update: Update, context: BotContext, post_number: int) -> None:
     """Переключение статуса публикации поста"""
     try:
-        db = get_session()
+        db = context.db
+        post_service = AsyncPostService(db)
         
-        try:
-            user_service = UserService(db)
-            post_service = PostService(db)
-            analytics_service = AnalyticsService(db)
-            
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            post = post_service.get_post_by_number(post_number)
-            
-            if not post or not db_user:
-                await update.callback_query.edit_message_text("❌ Пост или пользователь не найден.")
-                return
+        db_user = context.db_user
+        post = await post_service.get_post_by_number(post_number)
+        
+        if not post or not db_user:
+            await update.callback_query.edit_message_text("❌ Пост или пользователь не найден.")
+            return
+        
+        # Проверка прав доступа
+        if post.author_id != db_user.id and not db_user.is_admin:
+            await update.callback_query.answer("❌ Недостаточно прав", show_alert=True)
+            return
+        
+        # Переключение статуса
+        success = await post_service.toggle_post_publication(post_number)
+        
+        if success:
+            await db.commit()
             
-            # Проверка прав доступа
-            if post.author_id != db_user.id and not db_user.is_admin:
-                await update.callback_query.answer("❌ Недостаточно прав", show_alert=True)
-                return
+            # Логирование активности (запись в фоне)
+            action = "publish" if not post.is_published else "unpublish"
+            activity_sink.record(
+                user_id=db_user.id,
+                activity_type=f"post_{action}",
+                activity_data={"post_id": post.id}
+            )
             
-            # Переключение статуса
-            success = post_service.toggle_post_publication(post_number)
+            status_text = "опубликован" if not post.is_published else "снят с публикации"
+            await update.callback_query.answer(f"✅ Пост {status_text}", show_alert=True)
             
-            if success:
-                # Логирование активности
-                action = "publish" if not post.is_published else "unpublish"
-                analytics_service.log_user_activity(
-                    user_id=db_user.id,
-                    activity_type=f"post_{action}",
-                    activity_data={"post_id": post.id}
-                )
-                
-                db.commit()
-                
-                status_text = "опубликован" if not post.is_published else "снят с публикации"
-                await update.callback_query.answer(f"✅ Пост {status_text}", show_alert=True)
-                
-                # Обновление сообщения
-                await show_post_details(update, context, post_number)
-            else:
-                await update.callback_query.answer("❌ Ошибка при изменении статуса", show_alert=True)
-                
-        finally:
-            db.close()
+            # Обновление сообщения
+            await show_post_details(update, context, post_number)
+        else:
+            await update.callback_query.answer("❌ Ошибка при изменении статуса", show_alert=True)
             
     except Exception as e:
         logger.error(f"Ошибка в toggle_post_publication: {e}")
@@ -0,0 +1,183 @@
+"""
+Ограничение частоты запросов пользователей (token bucket)
+
+У каждого ключа (пользователя) есть корзина на capacity токенов, которая
+восполняется равномерно за window секунд. Команда списывает свою стоимость:
+тяжелые операции (экспорт, графики) стоят дороже обычных. На ключ хранится
+два числа, корзины, восполнившиеся полностью, удаляются.
+
+Backend выбирается настройкой RATE_LIMIT_BACKEND:
+- memory: корзины в памяти процесса;
+- database: таблица rate_limits, общий лимит для всех процессов бота.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from time import monotonic
+from typing import Hashable
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from config import Config
+from database import AsyncSessionLocal
+from models import RateLimitBucket
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter(ABC):
+    """Базовый ограничитель: capacity токенов, полное восполнение за window секунд"""
+
+    def __init__(self, capacity: float, window: float):
+        self.capacity = capacity
+        self.window = window
+        self.rate = capacity / window
+
+    @abstractmethod
+    async def acquire(self, key: Hashable, cost: float = 1) -> float:
+        """
+        Списание cost токенов с корзины ключа
+
+        Возвращает 0, если действие разрешено, иначе через сколько секунд
+        токенов хватит (при отказе ничего не списывается). Стоимость больше
+        capacity ограничивается capacity: такое действие требует полной корзины.
+        """
+
+class MemoryRateLimiter(RateLimiter):
+    """
+    Корзины в памяти процесса
+
+    Ключи упорядочены по последнему обращению; корзины, которые успели
+    восполниться, удаляются с начала порядка при каждом обращении. При
+    превышении max_keys вытесняются давно не обращавшиеся ключи.
+    """
+
+    def __init__(self, capacity: float, window: float, max_keys: int):
+        super().__init__(capacity, window)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # ключ -> (токены, время обновления)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def acquire(self, key: Hashable, cost: float = 1) -> float:
+        return self.take(key, cost, monotonic())
+
+    def take(self, key: Hashable, cost: float, now: float) -> float:
+        """Синхронная часть acquire (время передается явно)"""
+        cost = min(cost, self.capacity)
+
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens = self.capacity
+        else:
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+
+        if tokens >= cost:
+            tokens -= cost
+            retry_after = 0.0
+        else:
+            retry_after = (cost - tokens) / self.rate
+
+        self._buckets[key] = (tokens, now)
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float) -> None:
+        # Полная корзина ничем не отличается от отсутствующей
+        while self._buckets:
+            tokens, updated_at = next(iter(self._buckets.values()))
+            if len(self._buckets) <= self.max_keys and tokens + (now - updated_at) * self.rate < self.capacity:
+                break
+            self._buckets.popitem(last=False)
+
+class DatabaseRateLimiter(RateLimiter):
+    """
+    Корзины в таблице rate_limits (общие для всех процессов)
+
+    Восполнение и списание выполняются одним INSERT ... ON CONFLICT DO UPDATE,
+    поэтому одновременные запросы из разных процессов не списывают токены дважды.
+    При ошибке базы данных действие разрешается. Полностью восполнившиеся
+    строки удаляются не чаще раза в purge_interval секунд.
+    """
+
+    def __init__(self, capacity: float, window: float, purge_interval: float = 600):
+        super().__init__(capacity, window)
+        self.purge_interval = purge_interval
+        self._next_purge = monotonic() + purge_interval
+
+    def _refilled(self):
+        """Токены строки с учетом восполнения на текущий момент"""
+        elapsed = func.extract('epoch', func.now() - RateLimitBucket.updated_at)
+        return func.least(self.capacity, RateLimitBucket.tokens + elapsed * self.rate)
+
+    async def acquire(self, key: Hashable, cost: float = 1) -> float:
+        cost = min(cost, self.capacity)
+        key = str(key)
+
+        statement = insert(RateLimitBucket).values(
+            key=key,
+            tokens=self.capacity - cost,
+            updated_at=func.now()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={'tokens': self._refilled() - cost, 'updated_at': func.now()},
+            where=self._refilled() >= cost
+        ).returning(RateLimitBucket.tokens)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                allowed = (await db.execute(statement)).first() is not None
+
+                if allowed:
+                    retry_after = 0.0
+                else:
+                    tokens = (await db.execute(
+                        select(self._refilled()).where(RateLimitBucket.key == key)
+                    )).scalar_one()
+                    retry_after = (cost - tokens) / self.rate
+
+                await db.commit()
+
+        except Exception as e:
+            logger.error(f"Ошибка в общем ограничителе запросов: {e}")
+            return 0.0
+
+        if monotonic() >= self._next_purge:
+            self._next_purge = monotonic() + self.purge_interval
+            await self.purge_idle()
+
+        return max(retry_after, 0.0)
+
+    async def purge_idle(self) -> int:
+        """Удаление строк, корзины которых восполнились полностью"""
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    delete(RateLimitBucket).where(
+                        RateLimitBucket.updated_at < func.now() - timedelta(seconds=self.window)
+                    )
+                )
+                await db.commit()
+            return result.rowcount
+
+        except Exception as e:
+            logger.error(f"Ошибка при очистке ограничителя запросов: {e}")
+            return 0
+
+def create_rate_limiter(backend: str) -> RateLimiter:
+    """Ограничитель по названию backend (RATE_LIMIT_BACKEND)"""
+    if backend == 'memory':
+        return MemoryRateLimiter(
+            capacity=Config.RATE_LIMIT_CAPACITY,
+            window=Config.RATE_LIMIT_WINDOW,
+            max_keys=Config.RATE_LIMIT_MAX_KEYS
+        )
+    if backend == 'database':
+        return DatabaseRateLimiter(capacity=Config.RATE_LIMIT_CAPACITY, window=Config.RATE_LIMIT_WINDOW)
+
+    raise ValueError(f"Неизвестный backend ограничителя запросов: {backend}")
+
+# Общий ограничитель запросов приложения
+rate_limiter = create_rate_limiter(Config.RATE_LIMIT_BACKEND)
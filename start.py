@@ -2,43 +2,41 @@
 Обработчики стартовых команд и основного меню
 """
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from database import get_session
-from services.user_service import UserService
-from services.analytics_service import AnalyticsService
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
+from utils.middleware import BotContext
+from services.user_service import AsyncUserService
+from services.write_behind import activity_sink
 from utils.keyboards import get_main_menu_keyboard
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def start_command(update: Update, context: BotContext) -> None:
     """Обработчик команды /start"""
     try:
         user = update.effective_user
-        db = get_session()
+        db = context.db
+        user_service = AsyncUserService(db)
         
-        try:
-            user_service = UserService(db)
-            analytics_service = AnalyticsService(db)
-            
-            # Создание или обновление пользователя
-            db_user = user_service.create_or_update_user(
-                telegram_id=user.id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name
-            )
-            
-            # Логирование активности
-            analytics_service.log_user_activity(
-                user_id=db_user.id,
-                activity_type="start_command"
-            )
-            
-            db.commit()
-            
-            welcome_text = f"""
+        # Создание или обновление пользователя
+        db_user = await user_service.create_or_update_user(
+            telegram_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+        await db.commit()
+        
+        # Снимок пользователя для декораторов и обработчиков этого Update
+        context.db_user = await user_service.get_user_snapshot(user.id)
+        
+        # Логирование активности (запись в фоне, после фиксации пользователя)
+        activity_sink.record(
+            user_id=db_user.id,
+            activity_type="start_command"
+        )
+        
+        welcome_text = f"""
 🤖 Добро пожаловать, {user.first_name}!
 
 Это бот для управления постами с расширенными возможностями:
@@ -57,38 +55,31 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 Используйте меню ниже для навигации или команду /help для получения справки.
             """
-            
-            keyboard = get_main_menu_keyboard(db_user.is_admin)
-            
-            await update.message.reply_text(
-                welcome_text,
-                reply_markup=keyboard,
-                parse_mode='Markdown'
-            )
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = get_main_menu_keyboard(db_user.is_admin)
+        
+        await update.message.reply_text(
+            welcome_text,
+            reply_markup=keyboard,
+            parse_mode='Markdown'
+        )
+        
     except Exception as e:
         logger.error(f"Ошибка в start_command: {e}")
         await update.message.reply_text(
             "❌ Произошла ошибка при запуске. Попробуйте еще раз."
         )
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def help_command(update: Update, context: BotContext) -> None:
     """Обработчик команды /help"""
     try:
-        db = get_session()
+        db_user = context.db_user
         
-        try:
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            help_text = """
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        help_text = """
 📚 **Справка по командам:**
 
 **Основные команды:**
@@ -107,9 +98,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /user_stats - Статистика пользователей
 /post_stats - Статистика постов
             """
-            
-            if db_user.is_admin:
-                help_text += """
+        
+        if db_user.is_admin:
+            help_text += """
 **Административные команды:**
 /admin - Панель администратора
 /manage_users - Управление пользователями
@@ -117,42 +108,37 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /promote_user - Назначить администратора
 /export_data - Экспорт данных
                 """
-            
-            help_text += """
+        
+        help_text += """
 **Как использовать:**
 1. Создавайте объекты через интерактивные шаблоны
 2. Управляйте своими объектами через личный кабинет
 3. Просматривайте аналитику и статистику
 4. Используйте inline-кнопки для удобной навигации
             """
-            
-            await update.message.reply_text(help_text, parse_mode='Markdown')
-            
-        finally:
-            db.close()
-            
+        
+        await update.message.reply_text(help_text, parse_mode='Markdown')
+        
     except Exception as e:
         logger.error(f"Ошибка в help_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении справки.")
 
-async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def profile_command(update: Update, context: BotContext) -> None:
     """Обработчик команды /profile"""
     try:
-        db = get_session()
+        user_service = AsyncUserService(context.db)
+        db_user = context.db_user
         
-        try:
-            user_service = UserService(db)
-            db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-            
-            if not db_user:
-                await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
-                return
-            
-            # Получение статистики пользователя
-            posts_count = len([p for p in db_user.posts if not p.is_deleted])
-            published_posts = len([p for p in db_user.posts if p.is_published and not p.is_deleted])
-            
-            profile_text = f"""
+        if not db_user:
+            await update.message.reply_text("❌ Пользователь не найден. Используйте /start")
+            return
+        
+        # Получение статистики пользователя
+        user_stats = await user_service.get_user_statistics(db_user.id)
+        posts_count = user_stats['total_posts']
+        published_posts = user_stats['published_posts']
+        
+        profile_text = f"""
 👤 **Профиль пользователя**
 
 **Основная информация:**
@@ -167,29 +153,26 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 • Дата регистрации: {db_user.created_at.strftime('%d.%m.%Y %H:%M')}
 • Последняя активность: {db_user.last_activity.strftime('%d.%m.%Y %H:%M')}
             """
-            
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📝 Мои посты", callback_data="main_my_posts"),
-                    InlineKeyboardButton("📊 Моя статистика", callback_data="main_my_stats")
-                ],
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-            ])
-            
-            await update.message.reply_text(
-                profile_text,
-                reply_markup=keyboard,
-                parse_mode='Markdown'
-            )
-            
-        finally:
-            db.close()
-            
+        
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📝 Мои посты", callback_data="main_my_posts"),
+                InlineKeyboardButton("📊 Моя статистика", callback_data="main_my_stats")
+            ],
+            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+        ])
+        
+        await update.message.reply_text(
+            profile_text,
+            reply_markup=keyboard,
+            parse_mode='Markdown'
+        )
+        
     except Exception as e:
         logger.error(f"Ошибка в profile_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении профиля.")
 
-async def handle_main_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def handle_main_callback(update: Update, context: BotContext) -> None:
     """Обработчик callback query для главного меню"""
     try:
         query = update.callback_query
@@ -198,21 +181,16 @@ async def handle_main_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         data = query.data.replace("main_", "")
         
         if data == "menu":
-            db = get_session()
-            try:
-                user_service = UserService(db)
-                db_user = user_service.get_user_by_telegram_id(update.effective_user.id)
-                
-                keyboard = get_main_menu_keyboard(db_user.is_admin if db_user else False)
-                
-                await query.edit_message_text(
-                    "🏠 **Главное меню**\n\nВыберите действие:",
-                    reply_markup=keyboard,
-                    parse_mode='Markdown'
-                )
-            finally:
-                db.close()
-                
+            db_user = context.db_user
+            
+            keyboard = get_main_menu_keyboard(db_user.is_admin if db_user else False)
+            
+            await query.edit_message_text(
+                "🏠 **Главное меню**\n\nВыберите действие:",
+                reply_markup=keyboard,
+                parse_mode='Markdown'
+            )
+            
         elif data == "my_posts" or data == "my_objects":
             # Перенаправление на команду просмотра объектов
             from handlers.posts import my_posts_callback
@@ -226,3 +204,19 @@ async def handle_main_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     except Exception as e:
         logger.error(f"Ошибка в handle_main_callback: {e}")
         await query.message.reply_text("❌ Ошибка при обработке действия.")
+
+async def handle_my_chat_member(update: Update, context: BotContext) -> None:
+    """Пользователь заблокировал или разблокировал бота (рассылки его пропускают)"""
+    try:
+        member = update.my_chat_member
+        if member.chat.type != 'private':
+            return
+        
+        blocked = member.new_chat_member.status == ChatMember.BANNED
+        
+        db = context.db
+        if await AsyncUserService(db).set_bot_blocked(member.from_user.id, blocked):
+            await db.commit()
+        
+    except Exception as e:
+        logger.error(f"Ошибка в handle_my_chat_member: {e}")
@@ -0,0 +1,151 @@
+"""
+Бенчмарк запуска бота: время импорта и обработки первых обновлений
+
+Каждый замер выполняется в новом процессе интерпретатора (холодный импорт).
+Запросы к Bot API обслуживает OfflineRequest без обращения к сети, база данных
+нужна (middleware загружает пользователя):
+    python startup_benchmark.py --database-url postgresql://.../bot_bench
+
+Если медиана замера превышает бюджет (STARTUP_BUDGET), скрипт завершается с кодом 1.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import logging
+
+from telegram.request import BaseRequest
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Бюджет в секундах (медиана); при изменении указывать причину в сообщении коммита
+STARTUP_BUDGET = {
+    'import_main': 1.5,        # import main: модели, сервисы, горячие обработчики
+    'build_application': 0.5,  # регистрация обработчиков и HTTP-клиент Bot API
+    'first_update': 0.5,       # /help: сессия, загрузка пользователя, ответ
+    'first_lazy_update': 0.5,  # /analytics: плюс импорт модуля аналитики
+}
+
+BENCH_TOKEN = "123456:startup-benchmark"
+BENCH_CHAT_ID = 777000
+
+class OfflineRequest(BaseRequest):
+    """Ответы Bot API без сети (getMe и отправка сообщений)"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+
+        if api_method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif api_method.startswith('send'):
+            result = {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': BENCH_CHAT_ID, 'type': 'private'}
+            }
+        else:
+            result = True
+
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+def command_update(update_id: int, command: str) -> dict:
+    """Update с командой от тестового пользователя"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': BENCH_CHAT_ID, 'type': 'private'},
+            'from': {'id': BENCH_CHAT_ID, 'is_bot': False, 'first_name': 'Bench'},
+            'text': command,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        }
+    }
+
+def run_child() -> None:
+    """Один замер в текущем (новом) процессе, результат - JSON в stdout"""
+    timings = {}
+
+    started = time.perf_counter()
+    import main
+    timings['import_main'] = time.perf_counter() - started
+
+    from telegram import Update
+    from database import dispose_async_engine
+
+    async def process_updates():
+        started = time.perf_counter()
+        application = main.build_application(token=BENCH_TOKEN, request=OfflineRequest())
+        timings['build_application'] = time.perf_counter() - started
+
+        async with application:
+            for update_id, (name, command) in enumerate(
+                [('first_update', '/help'), ('first_lazy_update', '/analytics')], 1
+            ):
+                update = Update.de_json(command_update(update_id, command), application.bot)
+                started = time.perf_counter()
+                await application.process_update(update)
+                timings[name] = time.perf_counter() - started
+
+        await dispose_async_engine()
+
+    asyncio.run(process_updates())
+    print(json.dumps(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска бота")
+    parser.add_argument('--database-url', default=os.getenv("DATABASE_URL"))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+
+    runs = []
+    for _ in range(args.repeats):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child'],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    exceeded = []
+    for name, budget in STARTUP_BUDGET.items():
+        median = statistics.median(run[name] for run in runs)
+        status = "✅" if median <= budget else "❌"
+        logger.info(f"{status} {name:<20} медиана: {median * 1000:>8.1f} мс   бюджет: {budget * 1000:>8.1f} мс")
+        if median > budget:
+            exceeded.append(name)
+
+    if exceeded:
+        logger.error(f"❌ Превышен бюджет запуска: {', '.join(exceeded)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
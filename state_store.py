@@ -0,0 +1,191 @@
+"""
+Хранилище состояний диалогов (мастер создания поста)
+
+Состояние хранится компактно: ID шаблона, номер текущего поля и уже
+введенные значения. Backend выбирается настройкой STATE_STORE:
+- memory: словарь в памяти процесса с TTL и ограничением размера;
+- database: таблица conversation_states, состояние переживает перезапуск
+  и доступно всем процессам бота.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Dict, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from config import Config
+from database import AsyncSessionLocal
+from models import ConversationState
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class UserState:
+    """Состояние пользователя в мастере создания поста"""
+    state: str
+    template_id: str
+    fields: Dict[str, str] = field(default_factory=dict)
+    current_field: int = 0
+
+class StateStore(ABC):
+    """
+    Базовое хранилище состояний по Telegram ID
+
+    Изменения объекта UserState не сохраняются сами по себе: после
+    изменения состояние записывается через set (это же продлевает TTL).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def get(self, telegram_id: int) -> Optional[UserState]:
+        """Состояние пользователя (None, если его нет или оно устарело)"""
+
+    @abstractmethod
+    async def set(self, telegram_id: int, state: UserState) -> None:
+        """Сохранение состояния"""
+
+    @abstractmethod
+    async def delete(self, telegram_id: int) -> None:
+        """Удаление состояния"""
+
+class MemoryStateStore(StateStore):
+    """
+    Состояния в памяти процесса
+
+    Записи живут не дольше ttl секунд с последнего изменения, при
+    превышении max_size вытесняются давно не изменявшиеся.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, telegram_id: int) -> Optional[UserState]:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return None
+
+        state, expires_at = entry
+        if expires_at <= monotonic():
+            del self._entries[telegram_id]
+            return None
+
+        return state
+
+    async def set(self, telegram_id: int, state: UserState) -> None:
+        self._entries[telegram_id] = (state, monotonic() + self.ttl)
+        self._entries.move_to_end(telegram_id)
+
+        # Порядок записей совпадает с порядком истечения: устаревшие в начале
+        now = monotonic()
+        while self._entries:
+            _, expires_at = next(iter(self._entries.values()))
+            if expires_at > now and len(self._entries) <= self.max_size:
+                break
+            self._entries.popitem(last=False)
+
+    async def delete(self, telegram_id: int) -> None:
+        self._entries.pop(telegram_id, None)
+
+class DatabaseStateStore(StateStore):
+    """
+    Состояния в таблице conversation_states (одна строка на пользователя)
+
+    Устаревшие строки не читаются и перезаписываются при следующем set;
+    брошенные удаляются не чаще раза в purge_interval секунд.
+    """
+
+    def __init__(self, ttl: float, purge_interval: float = 3600):
+        super().__init__(ttl)
+        self.purge_interval = purge_interval
+        self._next_purge = monotonic()
+
+    async def get(self, telegram_id: int) -> Optional[UserState]:
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(
+                    ConversationState.state,
+                    ConversationState.template_id,
+                    ConversationState.fields,
+                    ConversationState.current_field
+                ).where(
+                    ConversationState.telegram_id == telegram_id,
+                    ConversationState.expires_at > datetime.now(timezone.utc)
+                )
+            )).first()
+
+        if row is None:
+            return None
+
+        return UserState(
+            state=row.state,
+            template_id=row.template_id,
+            fields=dict(row.fields),
+            current_field=row.current_field
+        )
+
+    async def set(self, telegram_id: int, state: UserState) -> None:
+        values = {
+            'state': state.state,
+            'template_id': state.template_id,
+            'fields': state.fields,
+            'current_field': state.current_field,
+            'expires_at': datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        }
+        statement = insert(ConversationState).values(telegram_id=telegram_id, **values)
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[ConversationState.telegram_id],
+                set_=values
+            ))
+            await db.commit()
+
+        if monotonic() >= self._next_purge:
+            self._next_purge = monotonic() + self.purge_interval
+            await self.purge_expired()
+
+    async def delete(self, telegram_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(ConversationState).where(ConversationState.telegram_id == telegram_id)
+            )
+            await db.commit()
+
+    async def purge_expired(self) -> int:
+        """Удаление устаревших состояний, возвращает количество строк"""
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    delete(ConversationState).where(
+                        ConversationState.expires_at <= datetime.now(timezone.utc)
+                    )
+                )
+                await db.commit()
+            return result.rowcount
+
+        except Exception as e:
+            logger.error(f"Ошибка при удалении устаревших состояний: {e}")
+            return 0
+
+def create_state_store(backend: str) -> StateStore:
+    """Хранилище состояний по названию backend (STATE_STORE)"""
+    if backend == 'memory':
+        return MemoryStateStore(ttl=Config.STATE_TTL, max_size=Config.STATE_CACHE_SIZE)
+    if backend == 'database':
+        return DatabaseStateStore(ttl=Config.STATE_TTL)
+
+    raise ValueError(f"Неизвестное хранилище состояний: {backend}")
+
+# Общее хранилище состояний приложения
+state_store = create_state_store(Config.STATE_STORE)
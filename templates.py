@@ -1,18 +1,23 @@
 """
 Шаблоны для создания постов
+
+Определения шаблонов компилируются один раз при импорте в неизменяемый
+реестр (template_registry): поиск по ID за O(1), поля - кортежи
+неизменяемых словарей, подстановки content_template разобраны заранее.
 """
 
-from typing import List, Dict, Any, Optional
+from string import Formatter
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Tuple
 
-def get_post_templates() -> List[Dict[str, Any]]:
-    """Получение списка доступных шаблонов постов"""
-    templates = [
-        {
-            'id': 'news',
-            'name': 'Новость',
-            'description': 'Шаблон для новостных сообщений',
-            'icon': '📰',
-            'content_template': """📰 **{title}**
+# Исходные определения шаблонов (используются только для построения реестра)
+_POST_TEMPLATES = [
+    {
+        'id': 'news',
+        'name': 'Новость',
+        'description': 'Шаблон для новостных сообщений',
+        'icon': '📰',
+        'content_template': """📰 **{title}**
 
 📅 **Дата:** {date}
 📍 **Место:** {location}
@@ -26,13 +31,13 @@ def get_post_templates() -> List[Dict[str, Any]]:
 🔗 **Источник:** {source}
 
 #новости #{category}"""
-        },
-        {
-            'id': 'article',
-            'name': 'Статья',
-            'description': 'Шаблон для развернутых статей и аналитических материалов',
-            'icon': '📝',
-            'content_template': """📝 **{title}**
+    },
+    {
+        'id': 'article',
+        'name': 'Статья',
+        'description': 'Шаблон для развернутых статей и аналитических материалов',
+        'icon': '📝',
+        'content_template': """📝 **{title}**
 
 👤 **Автор:** {author}
 📅 **Дата публикации:** {date}
@@ -55,13 +60,13 @@ def get_post_templates() -> List[Dict[str, Any]]:
 
 📚 **Источники:**
 {sources}"""
-        },
-        {
-            'id': 'announcement',
-            'name': 'Объявление',
-            'description': 'Шаблон для важных объявлений и уведомлений',
-            'icon': '📢',
-            'content_template': """📢 **ОБЪЯВЛЕНИЕ**
+    },
+    {
+        'id': 'announcement',
+        'name': 'Объявление',
+        'description': 'Шаблон для важных объявлений и уведомлений',
+        'icon': '📢',
+        'content_template': """📢 **ОБЪЯВЛЕНИЕ**
 
 🎯 **{title}**
 
@@ -82,13 +87,13 @@ def get_post_templates() -> List[Dict[str, Any]]:
 ⚡ **Срочность:** {urgency}
 
 #объявление #{category}"""
-        },
-        {
-            'id': 'review',
-            'name': 'Обзор',
-            'description': 'Шаблон для обзоров товаров, услуг, мероприятий',
-            'icon': '⭐',
-            'content_template': """⭐ **ОБЗОР: {title}**
+    },
+    {
+        'id': 'review',
+        'name': 'Обзор',
+        'description': 'Шаблон для обзоров товаров, услуг, мероприятий',
+        'icon': '⭐',
+        'content_template': """⭐ **ОБЗОР: {title}**
 
 📊 **Общая оценка:** {rating}/10
 
@@ -112,13 +117,13 @@ def get_post_templates() -> List[Dict[str, Any]]:
 {recommendation}
 
 #обзор #{category} #рейтинг"""
-        },
-        {
-            'id': 'tutorial',
-            'name': 'Руководство',
-            'description': 'Шаблон для обучающих материалов и инструкций',
-            'icon': '📚',
-            'content_template': """📚 **РУКОВОДСТВО: {title}**
+    },
+    {
+        'id': 'tutorial',
+        'name': 'Руководство',
+        'description': 'Шаблон для обучающих материалов и инструкций',
+        'icon': '📚',
+        'content_template': """📚 **РУКОВОДСТВО: {title}**
 
 🎯 **Цель:** {objective}
 ⏱ **Время выполнения:** {duration}
@@ -147,13 +152,13 @@ def get_post_templates() -> List[Dict[str, Any]]:
 {result}
 
 #руководство #{category} #обучение"""
-        },
-        {
-            'id': 'event',
-            'name': 'Мероприятие',
-            'description': 'Шаблон для анонсов и отчетов о мероприятиях',
-            'icon': '🎉',
-            'content_template': """🎉 **МЕРОПРИЯТИЕ: {title}**
+    },
+    {
+        'id': 'event',
+        'name': 'Мероприятие',
+        'description': 'Шаблон для анонсов и отчетов о мероприятиях',
+        'icon': '🎉',
+        'content_template': """🎉 **МЕРОПРИЯТИЕ: {title}**
 
 📅 **Дата:** {date}
 ⏰ **Время:** {start_time} - {end_time}
@@ -179,560 +184,648 @@ def get_post_templates() -> List[Dict[str, Any]]:
 {additional_info}
 
 #мероприятие #{category} #событие"""
+    }
+]
+
+_TEMPLATE_FIELDS = {
+    'news': [
+        {
+            'name': 'title',
+            'label': '📰 Заголовок новости',
+            'description': 'Краткий и информативный заголовок',
+            'placeholder': 'Введите заголовок новости...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'date',
+            'label': '📅 Дата события',
+            'description': 'Когда произошло событие',
+            'placeholder': 'Например: 15 декабря 2024',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'location',
+            'label': '📍 Место события',
+            'description': 'Где произошло событие',
+            'placeholder': 'Город, адрес или регион',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'summary',
+            'label': '📋 Краткое описание',
+            'description': 'Суть новости в 2-3 предложениях',
+            'placeholder': 'Опишите суть события кратко...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'content',
+            'label': '📝 Подробности',
+            'description': 'Детальное описание события',
+            'placeholder': 'Расскажите подробно о событии...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'source',
+            'label': '🔗 Источник',
+            'description': 'Источник информации',
+            'placeholder': 'Ссылка или название источника',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'category',
+            'label': '🏷 Категория',
+            'description': 'Тематическая категория новости',
+            'placeholder': 'политика, спорт, технологии...',
+            'required': False,
+            'type': 'text'
         }
-    ]
+    ],
+    
+    'article': [
+        {
+            'name': 'title',
+            'label': '📝 Название статьи',
+            'description': 'Заголовок вашей статьи',
+            'placeholder': 'Введите название статьи...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'author',
+            'label': '👤 Автор',
+            'description': 'Имя автора статьи',
+            'placeholder': 'Ваше имя или псевдоним',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'date',
+            'label': '📅 Дата публикации',
+            'description': 'Дата написания статьи',
+            'placeholder': 'Например: 15 декабря 2024',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'reading_time',
+            'label': '⏱ Время чтения',
+            'description': 'Примерное время чтения',
+            'placeholder': '5-10 минут',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'abstract',
+            'label': '📋 Аннотация',
+            'description': 'Краткое описание содержания статьи',
+            'placeholder': 'О чем эта статья...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'intro',
+            'label': '🚀 Введение',
+            'description': 'Вводная часть статьи',
+            'placeholder': 'Введение к теме...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'main_content',
+            'label': '📖 Основная часть',
+            'description': 'Основное содержание статьи',
+            'placeholder': 'Основной текст статьи...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'conclusion',
+            'label': '🏁 Заключение',
+            'description': 'Выводы и заключительные мысли',
+            'placeholder': 'Подведите итоги...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'tag1',
+            'label': '🏷 Тег 1',
+            'description': 'Первый тематический тег',
+            'placeholder': 'технологии',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'tag2',
+            'label': '🏷 Тег 2',
+            'description': 'Второй тематический тег',
+            'placeholder': 'аналитика',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'tag3',
+            'label': '🏷 Тег 3',
+            'description': 'Третий тематический тег',
+            'placeholder': 'исследование',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'sources',
+            'label': '📚 Источники',
+            'description': 'Список использованных источников',
+            'placeholder': 'Ссылки на источники...',
+            'required': False,
+            'type': 'textarea'
+        }
+    ],
+    
+    'announcement': [
+        {
+            'name': 'title',
+            'label': '📢 Заголовок объявления',
+            'description': 'Краткий и ясный заголовок',
+            'placeholder': 'О чем объявление...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'priority',
+            'label': '⚠️ Уровень важности',
+            'description': 'Насколько важно это объявление',
+            'placeholder': 'Высокая / Средняя / Низкая',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'date',
+            'label': '📅 Дата',
+            'description': 'Дата события или объявления',
+            'placeholder': '15 декабря 2024',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'time',
+            'label': '⏰ Время',
+            'description': 'Время события (если применимо)',
+            'placeholder': '14:00',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'details',
+            'label': '📋 Детали',
+            'description': 'Подробная информация',
+            'placeholder': 'Подробно опишите объявление...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'target_audience',
+            'label': '👥 Целевая аудитория',
+            'description': 'Для кого это объявление',
+            'placeholder': 'Для всех сотрудников / Для студентов...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'location',
+            'label': '📍 Место',
+            'description': 'Где происходит событие',
+            'placeholder': 'Адрес или место проведения',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'contacts',
+            'label': '📞 Контакты',
+            'description': 'Контактная информация',
+            'placeholder': 'Телефон, email, имя ответственного...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'urgency',
+            'label': '⚡ Срочность',
+            'description': 'Насколько срочно',
+            'placeholder': 'До конца дня / В течение недели...',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'category',
+            'label': '🏷 Категория',
+            'description': 'Тип объявления',
+            'placeholder': 'работа, учеба, мероприятие...',
+            'required': False,
+            'type': 'text'
+        }
+    ],
+    
+    'review': [
+        {
+            'name': 'title',
+            'label': '⭐ Название обзора',
+            'description': 'Что вы обозреваете',
+            'placeholder': 'Название товара/услуги/события...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'rating',
+            'label': '📊 Оценка (1-10)',
+            'description': 'Ваша общая оценка по 10-балльной шкале',
+            'placeholder': '8',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'description',
+            'label': '📋 Краткая характеристика',
+            'description': 'Что это такое в нескольких словах',
+            'placeholder': 'Краткое описание...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'pros',
+            'label': '✅ Плюсы',
+            'description': 'Что вам понравилось',
+            'placeholder': '• Первый плюс\n• Второй плюс...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'cons',
+            'label': '❌ Минусы',
+            'description': 'Что не понравилось',
+            'placeholder': '• Первый минус\n• Второй минус...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'price',
+            'label': '💰 Цена/Стоимость',
+            'description': 'Сколько это стоит',
+            'placeholder': '1000 рублей / Бесплатно...',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'target_audience',
+            'label': '🎯 Кому подойдет',
+            'description': 'Для какой аудитории это подходит',
+            'placeholder': 'Начинающим / Профессионалам...',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'detailed_review',
+            'label': '📝 Детальное мнение',
+            'description': 'Развернутый отзыв',
+            'placeholder': 'Подробно расскажите о своем опыте...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'recommendation',
+            'label': '🏆 Рекомендация',
+            'description': 'Ваша итоговая рекомендация',
+            'placeholder': 'Рекомендую / Не рекомендую потому что...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'category',
+            'label': '🏷 Категория',
+            'description': 'К какой категории относится',
+            'placeholder': 'технологии, еда, развлечения...',
+            'required': False,
+            'type': 'text'
+        }
+    ],
     
-    return templates
+    'tutorial': [
+        {
+            'name': 'title',
+            'label': '📚 Название руководства',
+            'description': 'Что вы будете объяснять',
+            'placeholder': 'Как сделать...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'objective',
+            'label': '🎯 Цель',
+            'description': 'Чего достигнет читатель',
+            'placeholder': 'После прочтения вы сможете...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'duration',
+            'label': '⏱ Время выполнения',
+            'description': 'Сколько времени потребуется',
+            'placeholder': '30 минут',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'difficulty',
+            'label': '📊 Уровень сложности',
+            'description': 'Насколько сложно это выполнить',
+            'placeholder': 'Легко / Средне / Сложно',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'requirements',
+            'label': '🛠 Что понадобится',
+            'description': 'Необходимые инструменты, знания, материалы',
+            'placeholder': '• Компьютер\n• Программа X\n• Базовые знания...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'step1',
+            'label': '1️⃣ Шаг 1',
+            'description': 'Первый шаг инструкции',
+            'placeholder': 'Опишите первое действие...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'step2',
+            'label': '2️⃣ Шаг 2',
+            'description': 'Второй шаг инструкции',
+            'placeholder': 'Опишите второе действие...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'step3',
+            'label': '3️⃣ Шаг 3',
+            'description': 'Третий шаг инструкции',
+            'placeholder': 'Опишите третье действие...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'step4',
+            'label': '4️⃣ Шаг 4',
+            'description': 'Четвертый шаг (если нужен)',
+            'placeholder': 'Опишите четвертое действие или оставьте пустым...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'tips',
+            'label': '💡 Полезные советы',
+            'description': 'Дополнительные рекомендации',
+            'placeholder': 'Советы для лучшего результата...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'warnings',
+            'label': '⚠️ Важные моменты',
+            'description': 'На что обратить особое внимание',
+            'placeholder': 'Чего следует избегать...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'result',
+            'label': '🏁 Ожидаемый результат',
+            'description': 'Что получится в итоге',
+            'placeholder': 'В результате у вас будет...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'category',
+            'label': '🏷 Категория',
+            'description': 'Тематическая категория',
+            'placeholder': 'программирование, дизайн, готовка...',
+            'required': False,
+            'type': 'text'
+        }
+    ],
+    
+    'event': [
+        {
+            'name': 'title',
+            'label': '🎉 Название мероприятия',
+            'description': 'Как называется ваше мероприятие',
+            'placeholder': 'Название события...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'date',
+            'label': '📅 Дата проведения',
+            'description': 'Когда состоится мероприятие',
+            'placeholder': '15 декабря 2024',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'start_time',
+            'label': '⏰ Время начала',
+            'description': 'Во сколько начинается',
+            'placeholder': '18:00',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'end_time',
+            'label': '🏁 Время окончания',
+            'description': 'Во сколько заканчивается',
+            'placeholder': '21:00',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'venue',
+            'label': '📍 Место проведения',
+            'description': 'Где состоится мероприятие',
+            'placeholder': 'Адрес или название места...',
+            'required': True,
+            'type': 'text'
+        },
+        {
+            'name': 'description',
+            'label': '📋 Описание',
+            'description': 'Что это за мероприятие',
+            'placeholder': 'Опишите суть мероприятия...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'target_audience',
+            'label': '👥 Целевая аудитория',
+            'description': 'Для кого предназначено',
+            'placeholder': 'Для студентов, специалистов...',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'participation_info',
+            'label': '🎫 Условия участия',
+            'description': 'Как принять участие',
+            'placeholder': 'Регистрация обязательна / Свободный вход...',
+            'required': True,
+            'type': 'textarea'
+        },
+        {
+            'name': 'cost',
+            'label': '💰 Стоимость',
+            'description': 'Сколько стоит участие',
+            'placeholder': 'Бесплатно / 500 рублей...',
+            'required': False,
+            'type': 'text'
+        },
+        {
+            'name': 'program',
+            'label': '📝 Программа',
+            'description': 'План мероприятия',
+            'placeholder': 'Расписание и программа...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'contacts',
+            'label': '📞 Контакты',
+            'description': 'Как связаться для записи',
+            'placeholder': 'Телефон, email...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'additional_info',
+            'label': '🔗 Дополнительно',
+            'description': 'Дополнительная информация',
+            'placeholder': 'Ссылки, особые условия...',
+            'required': False,
+            'type': 'textarea'
+        },
+        {
+            'name': 'category',
+            'label': '🏷 Категория',
+            'description': 'Тип мероприятия',
+            'placeholder': 'конференция, семинар, концерт...',
+            'required': False,
+            'type': 'text'
+        }
+    ]
+}
 
-def get_template_fields(template_id: str) -> List[Dict[str, Any]]:
-    """Получение полей конкретного шаблона"""
+class TemplateFormatter:
+    """
+    Заранее разобранный content_template
     
-    fields_map = {
-        'news': [
-            {
-                'name': 'title',
-                'label': '📰 Заголовок новости',
-                'description': 'Краткий и информативный заголовок',
-                'placeholder': 'Введите заголовок новости...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'date',
-                'label': '📅 Дата события',
-                'description': 'Когда произошло событие',
-                'placeholder': 'Например: 15 декабря 2024',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'location',
-                'label': '📍 Место события',
-                'description': 'Где произошло событие',
-                'placeholder': 'Город, адрес или регион',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'summary',
-                'label': '📋 Краткое описание',
-                'description': 'Суть новости в 2-3 предложениях',
-                'placeholder': 'Опишите суть события кратко...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'content',
-                'label': '📝 Подробности',
-                'description': 'Детальное описание события',
-                'placeholder': 'Расскажите подробно о событии...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'source',
-                'label': '🔗 Источник',
-                'description': 'Источник информации',
-                'placeholder': 'Ссылка или название источника',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'category',
-                'label': '🏷 Категория',
-                'description': 'Тематическая категория новости',
-                'placeholder': 'политика, спорт, технологии...',
-                'required': False,
-                'type': 'text'
-            }
-        ],
-        
-        'article': [
-            {
-                'name': 'title',
-                'label': '📝 Название статьи',
-                'description': 'Заголовок вашей статьи',
-                'placeholder': 'Введите название статьи...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'author',
-                'label': '👤 Автор',
-                'description': 'Имя автора статьи',
-                'placeholder': 'Ваше имя или псевдоним',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'date',
-                'label': '📅 Дата публикации',
-                'description': 'Дата написания статьи',
-                'placeholder': 'Например: 15 декабря 2024',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'reading_time',
-                'label': '⏱ Время чтения',
-                'description': 'Примерное время чтения',
-                'placeholder': '5-10 минут',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'abstract',
-                'label': '📋 Аннотация',
-                'description': 'Краткое описание содержания статьи',
-                'placeholder': 'О чем эта статья...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'intro',
-                'label': '🚀 Введение',
-                'description': 'Вводная часть статьи',
-                'placeholder': 'Введение к теме...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'main_content',
-                'label': '📖 Основная часть',
-                'description': 'Основное содержание статьи',
-                'placeholder': 'Основной текст статьи...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'conclusion',
-                'label': '🏁 Заключение',
-                'description': 'Выводы и заключительные мысли',
-                'placeholder': 'Подведите итоги...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'tag1',
-                'label': '🏷 Тег 1',
-                'description': 'Первый тематический тег',
-                'placeholder': 'технологии',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'tag2',
-                'label': '🏷 Тег 2',
-                'description': 'Второй тематический тег',
-                'placeholder': 'аналитика',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'tag3',
-                'label': '🏷 Тег 3',
-                'description': 'Третий тематический тег',
-                'placeholder': 'исследование',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'sources',
-                'label': '📚 Источники',
-                'description': 'Список использованных источников',
-                'placeholder': 'Ссылки на источники...',
-                'required': False,
-                'type': 'textarea'
-            }
-        ],
-        
-        'announcement': [
-            {
-                'name': 'title',
-                'label': '📢 Заголовок объявления',
-                'description': 'Краткий и ясный заголовок',
-                'placeholder': 'О чем объявление...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'priority',
-                'label': '⚠️ Уровень важности',
-                'description': 'Насколько важно это объявление',
-                'placeholder': 'Высокая / Средняя / Низкая',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'date',
-                'label': '📅 Дата',
-                'description': 'Дата события или объявления',
-                'placeholder': '15 декабря 2024',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'time',
-                'label': '⏰ Время',
-                'description': 'Время события (если применимо)',
-                'placeholder': '14:00',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'details',
-                'label': '📋 Детали',
-                'description': 'Подробная информация',
-                'placeholder': 'Подробно опишите объявление...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'target_audience',
-                'label': '👥 Целевая аудитория',
-                'description': 'Для кого это объявление',
-                'placeholder': 'Для всех сотрудников / Для студентов...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'location',
-                'label': '📍 Место',
-                'description': 'Где происходит событие',
-                'placeholder': 'Адрес или место проведения',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'contacts',
-                'label': '📞 Контакты',
-                'description': 'Контактная информация',
-                'placeholder': 'Телефон, email, имя ответственного...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'urgency',
-                'label': '⚡ Срочность',
-                'description': 'Насколько срочно',
-                'placeholder': 'До конца дня / В течение недели...',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'category',
-                'label': '🏷 Категория',
-                'description': 'Тип объявления',
-                'placeholder': 'работа, учеба, мероприятие...',
-                'required': False,
-                'type': 'text'
-            }
-        ],
-        
-        'review': [
-            {
-                'name': 'title',
-                'label': '⭐ Название обзора',
-                'description': 'Что вы обозреваете',
-                'placeholder': 'Название товара/услуги/события...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'rating',
-                'label': '📊 Оценка (1-10)',
-                'description': 'Ваша общая оценка по 10-балльной шкале',
-                'placeholder': '8',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'description',
-                'label': '📋 Краткая характеристика',
-                'description': 'Что это такое в нескольких словах',
-                'placeholder': 'Краткое описание...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'pros',
-                'label': '✅ Плюсы',
-                'description': 'Что вам понравилось',
-                'placeholder': '• Первый плюс\n• Второй плюс...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'cons',
-                'label': '❌ Минусы',
-                'description': 'Что не понравилось',
-                'placeholder': '• Первый минус\n• Второй минус...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'price',
-                'label': '💰 Цена/Стоимость',
-                'description': 'Сколько это стоит',
-                'placeholder': '1000 рублей / Бесплатно...',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'target_audience',
-                'label': '🎯 Кому подойдет',
-                'description': 'Для какой аудитории это подходит',
-                'placeholder': 'Начинающим / Профессионалам...',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'detailed_review',
-                'label': '📝 Детальное мнение',
-                'description': 'Развернутый отзыв',
-                'placeholder': 'Подробно расскажите о своем опыте...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'recommendation',
-                'label': '🏆 Рекомендация',
-                'description': 'Ваша итоговая рекомендация',
-                'placeholder': 'Рекомендую / Не рекомендую потому что...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'category',
-                'label': '🏷 Категория',
-                'description': 'К какой категории относится',
-                'placeholder': 'технологии, еда, развлечения...',
-                'required': False,
-                'type': 'text'
-            }
-        ],
+    В отличие от str.format(**fields) не падает на отсутствующих полях:
+    незаполненное поле заменяется на missing (по умолчанию пустая строка).
+    """
+    
+    def __init__(self, content_template: str):
+        self.parts: Tuple[Tuple[str, Optional[str]], ...] = tuple(
+            self._parse(content_template)
+        )
+        self.placeholders: Tuple[str, ...] = tuple(
+            dict.fromkeys(name for _, name in self.parts if name is not None)
+        )
+    
+    @staticmethod
+    def _parse(content_template: str):
+        for literal, name, format_spec, conversion in Formatter().parse(content_template):
+            if name is not None and (not name.isidentifier() or format_spec or conversion):
+                raise ValueError(f"Неподдерживаемая подстановка в шаблоне: {{{name}}}")
+            yield literal, name
+    
+    def format(self, values: Mapping[str, Any], missing: str = "") -> str:
+        """
+        Подстановка значений полей
         
-        'tutorial': [
-            {
-                'name': 'title',
-                'label': '📚 Название руководства',
-                'description': 'Что вы будете объяснять',
-                'placeholder': 'Как сделать...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'objective',
-                'label': '🎯 Цель',
-                'description': 'Чего достигнет читатель',
-                'placeholder': 'После прочтения вы сможете...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'duration',
-                'label': '⏱ Время выполнения',
-                'description': 'Сколько времени потребуется',
-                'placeholder': '30 минут',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'difficulty',
-                'label': '📊 Уровень сложности',
-                'description': 'Насколько сложно это выполнить',
-                'placeholder': 'Легко / Средне / Сложно',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'requirements',
-                'label': '🛠 Что понадобится',
-                'description': 'Необходимые инструменты, знания, материалы',
-                'placeholder': '• Компьютер\n• Программа X\n• Базовые знания...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'step1',
-                'label': '1️⃣ Шаг 1',
-                'description': 'Первый шаг инструкции',
-                'placeholder': 'Опишите первое действие...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'step2',
-                'label': '2️⃣ Шаг 2',
-                'description': 'Второй шаг инструкции',
-                'placeholder': 'Опишите второе действие...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'step3',
-                'label': '3️⃣ Шаг 3',
-                'description': 'Третий шаг инструкции',
-                'placeholder': 'Опишите третье действие...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'step4',
-                'label': '4️⃣ Шаг 4',
-                'description': 'Четвертый шаг (если нужен)',
-                'placeholder': 'Опишите четвертое действие или оставьте пустым...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'tips',
-                'label': '💡 Полезные советы',
-                'description': 'Дополнительные рекомендации',
-                'placeholder': 'Советы для лучшего результата...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'warnings',
-                'label': '⚠️ Важные моменты',
-                'description': 'На что обратить особое внимание',
-                'placeholder': 'Чего следует избегать...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'result',
-                'label': '🏁 Ожидаемый результат',
-                'description': 'Что получится в итоге',
-                'placeholder': 'В результате у вас будет...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'category',
-                'label': '🏷 Категория',
-                'description': 'Тематическая категория',
-                'placeholder': 'программирование, дизайн, готовка...',
-                'required': False,
-                'type': 'text'
-            }
-        ],
+        missing может содержать {name} - имя незаполненного поля.
+        """
+        chunks = []
+        for literal, name in self.parts:
+            chunks.append(literal)
+            if name is not None:
+                value = values.get(name)
+                chunks.append(str(value) if value else missing.format(name=name))
         
-        'event': [
-            {
-                'name': 'title',
-                'label': '🎉 Название мероприятия',
-                'description': 'Как называется ваше мероприятие',
-                'placeholder': 'Название события...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'date',
-                'label': '📅 Дата проведения',
-                'description': 'Когда состоится мероприятие',
-                'placeholder': '15 декабря 2024',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'start_time',
-                'label': '⏰ Время начала',
-                'description': 'Во сколько начинается',
-                'placeholder': '18:00',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'end_time',
-                'label': '🏁 Время окончания',
-                'description': 'Во сколько заканчивается',
-                'placeholder': '21:00',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'venue',
-                'label': '📍 Место проведения',
-                'description': 'Где состоится мероприятие',
-                'placeholder': 'Адрес или название места...',
-                'required': True,
-                'type': 'text'
-            },
-            {
-                'name': 'description',
-                'label': '📋 Описание',
-                'description': 'Что это за мероприятие',
-                'placeholder': 'Опишите суть мероприятия...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'target_audience',
-                'label': '👥 Целевая аудитория',
-                'description': 'Для кого предназначено',
-                'placeholder': 'Для студентов, специалистов...',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'participation_info',
-                'label': '🎫 Условия участия',
-                'description': 'Как принять участие',
-                'placeholder': 'Регистрация обязательна / Свободный вход...',
-                'required': True,
-                'type': 'textarea'
-            },
-            {
-                'name': 'cost',
-                'label': '💰 Стоимость',
-                'description': 'Сколько стоит участие',
-                'placeholder': 'Бесплатно / 500 рублей...',
-                'required': False,
-                'type': 'text'
-            },
-            {
-                'name': 'program',
-                'label': '📝 Программа',
-                'description': 'План мероприятия',
-                'placeholder': 'Расписание и программа...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'contacts',
-                'label': '📞 Контакты',
-                'description': 'Как связаться для записи',
-                'placeholder': 'Телефон, email...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'additional_info',
-                'label': '🔗 Дополнительно',
-                'description': 'Дополнительная информация',
-                'placeholder': 'Ссылки, особые условия...',
-                'required': False,
-                'type': 'textarea'
-            },
-            {
-                'name': 'category',
-                'label': '🏷 Категория',
-                'description': 'Тип мероприятия',
-                'placeholder': 'конференция, семинар, концерт...',
-                'required': False,
-                'type': 'text'
-            }
-        ]
-    }
+        return ''.join(chunks)
+
+class TemplateRegistry:
+    """Неизменяемый реестр шаблонов, построенный при импорте"""
+    
+    def __init__(self, templates: List[Dict[str, Any]], fields: Dict[str, List[Dict[str, Any]]]):
+        self._templates = MappingProxyType({
+            template['id']: MappingProxyType(dict(template)) for template in templates
+        })
+        self._fields = MappingProxyType({
+            template_id: tuple(MappingProxyType(dict(field)) for field in fields.get(template_id, ()))
+            for template_id in self._templates
+        })
+        self._formatters = MappingProxyType({
+            template_id: TemplateFormatter(template['content_template'])
+            for template_id, template in self._templates.items()
+        })
+        self.templates: Tuple[Mapping[str, Any], ...] = tuple(self._templates.values())
+    
+    def __len__(self) -> int:
+        return len(self._templates)
+    
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._templates
     
-    return fields_map.get(template_id, [])
+    def get(self, template_id: str) -> Optional[Mapping[str, Any]]:
+        """Шаблон по ID"""
+        return self._templates.get(template_id)
+    
+    def fields(self, template_id: str) -> Tuple[Mapping[str, Any], ...]:
+        """Поля шаблона в порядке заполнения"""
+        return self._fields.get(template_id, ())
+    
+    def formatter(self, template_id: str) -> Optional[TemplateFormatter]:
+        """Разобранный content_template шаблона"""
+        return self._formatters.get(template_id)
+
+template_registry = TemplateRegistry(_POST_TEMPLATES, _TEMPLATE_FIELDS)
+
+def get_post_templates() -> Tuple[Mapping[str, Any], ...]:
+    """Получение списка доступных шаблонов постов"""
+    return template_registry.templates
 
-def get_template_by_id(template_id: str) -> Optional[Dict[str, Any]]:
+def get_template_fields(template_id: str) -> Tuple[Mapping[str, Any], ...]:
+    """Получение полей конкретного шаблона"""
+    return template_registry.fields(template_id)
+
+def get_template_by_id(template_id: str) -> Optional[Mapping[str, Any]]:
     """Получение шаблона по ID"""
-    templates = get_post_templates()
-    return next((t for t in templates if t['id'] == template_id), None)
+    return template_registry.get(template_id)
+
+def get_template_name(template_id: str) -> str:
+    """Название шаблона по ID (для неизвестных шаблонов - сам ID)"""
+    template = template_registry.get(template_id)
+    return template['name'] if template else template_id
+
+def render_template(template_id: str, data: Mapping[str, Any]) -> str:
+    """Формирование текста поста по шаблону (незаполненные поля остаются пустыми)"""
+    formatter = template_registry.formatter(template_id)
+    if formatter is None:
+        raise ValueError(f"Шаблон не найден: {template_id}")
+    
+    return formatter.format(data)
 
 def validate_template_data(template_id: str, data: Dict[str, str]) -> Dict[str, Any]:
     """Валидация данных шаблона"""
@@ -760,23 +853,12 @@ def validate_template_data(template_id: str, data: Dict[str, str]) -> Dict[str,
 
 def get_template_preview(template_id: str, data: Dict[str, str]) -> str:
     """Получение превью поста по шаблону"""
-    template = get_template_by_id(template_id)
-    if not template:
+    formatter = template_registry.formatter(template_id)
+    if not formatter:
         return "Шаблон не найден"
     
-    try:
-        # Заполнение пустых значений
-        filled_data = {}
-        for key, value in data.items():
-            filled_data[key] = value if value else f"[{key}]"
-        
-        # Форматирование шаблона
-        preview = template['content_template'].format(**filled_data)
-        return preview
-    except KeyError as e:
-        return f"Ошибка в шаблоне: отсутствует поле {e}"
-    except Exception as e:
-        return f"Ошибка при генерации превью: {e}"
+    # Незаполненные поля показываются как [имя_поля]
+    return formatter.format(data, missing="[{name}]")
 
 def get_template_statistics() -> List[Dict[str, Any]]:
     """Получение статистики использования шаблонов"""
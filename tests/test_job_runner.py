@@ -0,0 +1,130 @@
+"""
+Исполнитель фоновых задач (JobRunner): повторный запуск, лимит, отмена
+"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from services.job_runner import JobRunner, JobResult, JobLimitError
+
+class FakeBot:
+    """Бот, запоминающий отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.sent.append(text)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.sent.append(kwargs.get('filename'))
+
+def blocking_work():
+    """Работа, которая ждет, пока ее не отпустят"""
+    release = asyncio.Event()
+
+    async def work(job):
+        await release.wait()
+        raise RuntimeError("работа не должна завершаться в тесте")
+
+    return work, release
+
+def run(test):
+    async def main():
+        runner = JobRunner(max_per_owner=2, progress_interval=60)
+        try:
+            await test(runner, FakeBot())
+        finally:
+            await runner.stop()
+
+    asyncio.run(main())
+
+def test_same_key_is_not_started_twice():
+    async def test(runner, bot):
+        work, _ = blocking_work()
+        first, created = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+        second, created_again = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+
+        assert created and not created_again
+        assert second is first
+        assert len(runner) == 1
+
+    run(test)
+
+def test_limit_per_owner():
+    async def test(runner, bot):
+        work, _ = blocking_work()
+        runner.submit(bot, owner_id=1, chat_id=1, key="a", title="A", work=work)
+        runner.submit(bot, owner_id=1, chat_id=1, key="b", title="B", work=work)
+
+        with pytest.raises(JobLimitError):
+            runner.submit(bot, owner_id=1, chat_id=1, key="c", title="C", work=work)
+
+        # Лимит у каждого владельца свой
+        _, created = runner.submit(bot, owner_id=2, chat_id=2, key="d", title="D", work=work)
+        assert created
+
+    run(test)
+
+def test_job_cancelled_before_start_is_forgotten():
+    async def test(runner, bot):
+        work, _ = blocking_work()
+        job, _ = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+
+        assert runner.cancel(job.id, owner_id=1)
+        await asyncio.gather(job.task, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert len(runner) == 0
+        assert bot.sent == []
+
+        # Ключ освобожден: задачу можно запустить снова
+        _, created = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+        assert created
+
+    run(test)
+
+def test_only_owner_can_cancel():
+    async def test(runner, bot):
+        work, _ = blocking_work()
+        job, _ = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+
+        assert not runner.cancel(job.id, owner_id=2)
+        assert not runner.cancel(job.id + 1, owner_id=1)
+        assert not job.task.cancelled()
+
+    run(test)
+
+def test_finished_job_is_forgotten():
+    async def test(runner, bot):
+        async def work(job):
+            return JobResult(file=open(__file__, 'rb'), filename="report.csv")
+
+        job, _ = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+        await job.task
+        await asyncio.sleep(0)
+
+        assert len(runner) == 0
+        assert "report.csv" in bot.sent
+
+    run(test)
+
+def test_check_does_not_start_job():
+    async def test(runner, bot):
+        work, _ = blocking_work()
+
+        assert runner.check(owner_id=1, key="export") is None
+        assert len(runner) == 0
+
+        job, _ = runner.submit(bot, owner_id=1, chat_id=1, key="export", title="Экспорт", work=work)
+        assert runner.check(owner_id=1, key="export") is job
+
+        runner.submit(bot, owner_id=1, chat_id=1, key="charts", title="Графики", work=work)
+        with pytest.raises(JobLimitError):
+            runner.check(owner_id=1, key="report")
+
+    run(test)
@@ -0,0 +1,105 @@
+"""
+Количество запросов списков постов (PostService._list_query)
+
+Тесту нужна отдельная база PostgreSQL (схема создается и удаляется):
+    TEST_DATABASE_URL=postgresql://localhost/telegram_bot_test pytest tests
+Без TEST_DATABASE_URL тесты пропускаются.
+"""
+
+import os
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if not TEST_DATABASE_URL:
+    # database создает движки при импорте, без базы их не из чего создать
+    pytest.skip("TEST_DATABASE_URL не задан", allow_module_level=True)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import User, Post
+from services.post_service import PostService
+
+AUTHORS = 12
+POSTS_PER_AUTHOR = 5
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.create_all(engine)
+
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        for index in range(AUTHORS):
+            author = User(telegram_id=1000 + index, first_name=f"Автор {index}", username=f"author{index}")
+            author.posts = [
+                Post(title=f"Пост {index}-{number}", content="Текст", is_published=True)
+                for number in range(POSTS_PER_AUTHOR)
+            ]
+            db.add(author)
+        db.commit()
+
+    yield engine
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        yield session
+
+@pytest.fixture
+def queries(engine):
+    """Список выполненных SQL-запросов"""
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(engine, "before_cursor_execute", count)
+
+def read_authors(posts):
+    """Обращение к автору каждого поста, как при выводе списка"""
+    return [(post.title, post.author.first_name, post.author.username) for post in posts]
+
+@pytest.mark.parametrize("limit", [5, 50])
+@pytest.mark.parametrize("method", ["get_published_posts", "get_recent_posts"])
+def test_list_with_authors_is_one_query(db, queries, method, limit):
+    posts = getattr(PostService(db), method)(limit=limit)
+    rows = read_authors(posts)
+
+    assert len(rows) == limit
+    assert len(queries) == 1
+
+@pytest.mark.parametrize("limit", [5, 50])
+def test_posts_page_with_authors_is_one_query(db, queries, limit):
+    posts, has_more = PostService(db).get_posts_page(limit=limit, with_author=True)
+    rows = read_authors(posts)
+
+    assert len(rows) == limit
+    assert has_more
+    assert len(queries) == 1
+
+def test_query_count_does_not_depend_on_page_size(db, engine):
+    counts = []
+    for limit in (5, 50):
+        db.expunge_all()
+        executed = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            read_authors(PostService(db).get_published_posts(limit=limit))
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        counts.append(len(executed))
+
+    assert counts[0] == counts[1]
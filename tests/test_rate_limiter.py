@@ -0,0 +1,73 @@
+"""
+Ограничитель запросов в памяти (MemoryRateLimiter.take)
+
+База данных не нужна: время передается в take явно.
+"""
+
+import pytest
+from services.rate_limiter import MemoryRateLimiter
+
+def limiter(max_keys=100):
+    # 10 токенов, полное восполнение за 10 секунд: 1 токен в секунду
+    return MemoryRateLimiter(capacity=10, window=10, max_keys=max_keys)
+
+def test_allows_until_bucket_is_empty():
+    rate_limiter = limiter()
+
+    assert [rate_limiter.take("user", 1, now=0) for _ in range(10)] == [0] * 10
+    assert rate_limiter.take("user", 1, now=0) > 0
+
+def test_retry_after_is_time_to_refill_missing_tokens():
+    rate_limiter = limiter()
+    rate_limiter.take("user", 8, now=0)
+
+    assert rate_limiter.take("user", 5, now=0) == pytest.approx(3)
+
+def test_refused_action_does_not_spend_tokens():
+    rate_limiter = limiter()
+    rate_limiter.take("user", 8, now=0)
+
+    assert rate_limiter.take("user", 5, now=0) > 0
+    assert rate_limiter.take("user", 2, now=0) == 0
+
+def test_bucket_refills_over_time():
+    rate_limiter = limiter()
+    rate_limiter.take("user", 10, now=0)
+
+    assert rate_limiter.take("user", 3, now=2) == pytest.approx(1)
+    assert rate_limiter.take("user", 3, now=3) == 0
+
+def test_refill_does_not_exceed_capacity():
+    rate_limiter = limiter()
+    rate_limiter.take("user", 1, now=0)
+    rate_limiter.take("other", 1, now=0)
+
+    # Через час в корзине все равно не больше capacity
+    assert rate_limiter.take("user", 10, now=3600) == 0
+    assert rate_limiter.take("user", 1, now=3600) > 0
+
+def test_cost_is_capped_at_capacity():
+    rate_limiter = limiter()
+
+    # Действие дороже capacity требует полной корзины, а не невозможно
+    assert rate_limiter.take("user", 50, now=0) == 0
+    assert rate_limiter.take("user", 50, now=0) == pytest.approx(10)
+
+def test_evicts_least_recently_used_keys_over_max_keys():
+    rate_limiter = limiter(max_keys=2)
+    rate_limiter.take("first", 5, now=0)
+    rate_limiter.take("second", 5, now=0)
+    rate_limiter.take("third", 5, now=0)
+
+    assert len(rate_limiter) == 2
+    assert "first" not in rate_limiter._buckets
+
+def test_evicts_refilled_buckets():
+    rate_limiter = limiter()
+    rate_limiter.take("first", 5, now=0)
+    rate_limiter.take("second", 5, now=4)
+
+    # У first прошло 5 секунд: корзина полная и удаляется, second еще нет
+    rate_limiter.take("third", 1, now=5)
+
+    assert list(rate_limiter._buckets) == ["second", "third"]
@@ -0,0 +1,63 @@
+"""
+Хранилище состояний в памяти (MemoryStateStore)
+
+База данных не нужна: время подменяется через monotonic модуля.
+"""
+
+import asyncio
+import pytest
+import services.state_store
+from services.state_store import MemoryStateStore, UserState
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемое время для TTL"""
+    now = [1000.0]
+    monkeypatch.setattr(services.state_store, "monotonic", lambda: now[0])
+    return now
+
+def state(template_id="news"):
+    return UserState(state="creating_post", template_id=template_id)
+
+def test_state_expires_after_ttl(clock):
+    store = MemoryStateStore(ttl=60, max_size=10)
+    asyncio.run(store.set(1, state()))
+
+    clock[0] += 59
+    assert asyncio.run(store.get(1)) == state()
+
+    clock[0] += 1
+    assert asyncio.run(store.get(1)) is None
+    assert len(store) == 0
+
+def test_oldest_state_is_evicted_at_max_size(clock):
+    store = MemoryStateStore(ttl=60, max_size=2)
+    for telegram_id in (1, 2, 3):
+        asyncio.run(store.set(telegram_id, state()))
+
+    assert len(store) == 2
+    assert asyncio.run(store.get(1)) is None
+    assert asyncio.run(store.get(3)) == state()
+
+def test_set_moves_refreshed_state_to_end(clock):
+    store = MemoryStateStore(ttl=60, max_size=2)
+    asyncio.run(store.set(1, state()))
+    asyncio.run(store.set(2, state()))
+
+    # Обновленное состояние 1 живет дольше 2 и вытесняется последним
+    clock[0] += 30
+    asyncio.run(store.set(1, state("event")))
+    asyncio.run(store.set(3, state()))
+
+    assert list(store._entries) == [1, 3]
+    assert asyncio.run(store.get(1)) == state("event")
+
+def test_expired_states_are_dropped_on_set(clock):
+    store = MemoryStateStore(ttl=60, max_size=10)
+    asyncio.run(store.set(1, state()))
+    asyncio.run(store.set(2, state()))
+
+    clock[0] += 60
+    asyncio.run(store.set(3, state()))
+
+    assert list(store._entries) == [3]
@@ -0,0 +1,85 @@
+"""
+Распределение обновлений по процессам и кадры между процессами (webhook)
+"""
+
+import asyncio
+import pytest
+from webhook import (
+    FRAME_UPDATE, FRAME_INVALIDATE_USER, USER_ID,
+    update_user_id, shard_for, pack_frame, read_frame
+)
+
+USER = {'id': 42, 'is_bot': False, 'first_name': 'Иван'}
+CHAT = {'id': -100500, 'type': 'channel', 'title': 'Канал'}
+
+MESSAGE = {
+    'update_id': 1,
+    'message': {'message_id': 7, 'date': 0, 'from': USER, 'chat': {'id': 42, 'type': 'private'}, 'text': '/start'}
+}
+CALLBACK_QUERY = {
+    'update_id': 2,
+    'callback_query': {
+        'id': '1', 'from': USER, 'chat_instance': '1', 'data': 'main_menu',
+        'message': {'message_id': 7, 'date': 0, 'chat': {'id': 42, 'type': 'private'}}
+    }
+}
+CHANNEL_POST = {
+    'update_id': 3,
+    'channel_post': {'message_id': 8, 'date': 0, 'chat': CHAT, 'text': 'Пост'}
+}
+MY_CHAT_MEMBER = {
+    'update_id': 4,
+    'my_chat_member': {
+        'chat': {'id': 42, 'type': 'private'}, 'from': USER, 'date': 0,
+        'old_chat_member': {'status': 'member', 'user': {'id': 1, 'is_bot': True, 'first_name': 'Бот'}},
+        'new_chat_member': {'status': 'kicked', 'user': {'id': 1, 'is_bot': True, 'first_name': 'Бот'}, 'until_date': 0}
+    }
+}
+POLL = {
+    'update_id': 5,
+    'poll': {'id': '1', 'question': 'Вопрос', 'options': [], 'total_voter_count': 0}
+}
+
+@pytest.mark.parametrize("update", [MESSAGE, CALLBACK_QUERY, MY_CHAT_MEMBER])
+def test_update_is_keyed_by_sender(update):
+    assert update_user_id(update) == USER['id']
+
+def test_channel_post_without_sender_is_keyed_by_chat():
+    assert update_user_id(CHANNEL_POST) == CHAT['id']
+
+def test_update_without_user_goes_to_first_worker():
+    assert update_user_id(POLL) == 0
+    assert shard_for(POLL, 4) == 0
+
+def test_updates_of_one_user_go_to_one_worker():
+    shards = {shard_for(update, 4) for update in (MESSAGE, CALLBACK_QUERY, MY_CHAT_MEMBER)}
+
+    assert shards == {USER['id'] % 4}
+
+def test_negative_chat_id_gives_valid_worker():
+    assert 0 <= shard_for(CHANNEL_POST, 4) < 4
+
+def read_frames(data: bytes, count: int):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return [await read_frame(reader) for _ in range(count)]
+
+    return asyncio.run(read())
+
+def test_frames_round_trip():
+    body = b'{"update_id": 1}'
+    data = pack_frame(FRAME_UPDATE, body) + pack_frame(FRAME_INVALIDATE_USER, USER_ID.pack(42))
+
+    frames = read_frames(data, 2)
+
+    assert frames == [(FRAME_UPDATE, body), (FRAME_INVALIDATE_USER, USER_ID.pack(42))]
+    assert USER_ID.unpack(frames[1][1]) == (42,)
+
+def test_empty_frame_round_trip():
+    assert read_frames(pack_frame(FRAME_UPDATE, b''), 1) == [(FRAME_UPDATE, b'')]
+
+def test_truncated_frame_raises():
+    with pytest.raises(asyncio.IncompleteReadError):
+        read_frames(pack_frame(FRAME_UPDATE, b'{"update_id": 1}')[:-1], 1)
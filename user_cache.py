@@ -0,0 +1,154 @@
+"""
+Кэш пользователей по Telegram ID (TTL + LRU)
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from time import monotonic
+from typing import Callable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import Config
+from models import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Неизменяемый снимок пользователя для проверок доступа и обработчиков"""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_admin: bool
+    is_active: bool
+    created_at: Optional[datetime]
+    last_activity: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        """Создание снимка из модели пользователя"""
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_admin=bool(user.is_admin),
+            is_active=bool(user.is_active),
+            created_at=user.created_at,
+            last_activity=user.last_activity
+        )
+
+class UserCache:
+    """
+    Кэш снимков пользователей
+
+    Записи живут не дольше ttl секунд, при превышении max_size
+    вытесняются давно не использованные. Изменения ролей и статуса
+    сбрасывают запись явно (см. invalidate_user). Кэш свой у каждого
+    процесса: чтобы сброс дошел до остальных процессов, на него
+    подписываются через add_listener.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._listeners: List[Callable[[int], None]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, telegram_id: int) -> Optional[UserSnapshot]:
+        """Получение снимка из кэша (None, если записи нет или она устарела)"""
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        snapshot, expires_at = entry
+        if expires_at <= monotonic():
+            del self._entries[telegram_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return snapshot
+
+    def put(self, snapshot: UserSnapshot) -> None:
+        """Сохранение снимка в кэш"""
+        self._entries[snapshot.telegram_id] = (snapshot, monotonic() + self.ttl)
+        self._entries.move_to_end(snapshot.telegram_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, snapshot: UserSnapshot, **changes) -> UserSnapshot:
+        """Обновление полей снимка без изменения срока жизни записи"""
+        updated = replace(snapshot, **changes)
+
+        entry = self._entries.get(snapshot.telegram_id)
+        if entry is not None:
+            self._entries[snapshot.telegram_id] = (updated, entry[1])
+
+        return updated
+
+    def invalidate(self, telegram_id: int) -> None:
+        """Удаление записи из кэша"""
+        self._entries.pop(telegram_id, None)
+
+    def add_listener(self, callback: Callable[[int], None]) -> None:
+        """Подписка на сброс записей после фиксации изменений пользователя"""
+        self._listeners.append(callback)
+
+    def publish(self, telegram_id: int) -> None:
+        """Передача сброса подписчикам (другим процессам бота)"""
+        for callback in self._listeners:
+            try:
+                callback(telegram_id)
+            except Exception as e:
+                logger.error(f"Ошибка при рассылке сброса кэша пользователя: {e}")
+
+    def clear(self) -> None:
+        """Очистка кэша"""
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Статистика работы кэша"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+# Общий кэш пользователей приложения
+user_cache = UserCache(ttl=Config.USER_CACHE_TTL, max_size=Config.USER_CACHE_SIZE)
+
+_INVALIDATE_KEY = "user_cache_invalidate"
+
+def invalidate_user(db: Session, telegram_id: int) -> None:
+    """
+    Сброс пользователя из кэша при изменении его данных
+
+    Запись удаляется сразу и повторно после фиксации транзакции, чтобы
+    параллельный запрос не вернул в кэш данные, прочитанные до коммита.
+    """
+    user_cache.invalidate(telegram_id)
+    db.info.setdefault(_INVALIDATE_KEY, set()).add(telegram_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for telegram_id in session.info.pop(_INVALIDATE_KEY, ()):
+        user_cache.invalidate(telegram_id)
+        user_cache.publish(telegram_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop(_INVALIDATE_KEY, None)
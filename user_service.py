@@ -3,10 +3,14 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
-from models import User, UserActivity
+from sqlalchemy import func, and_, or_, desc, select, update, cast, Numeric
+from models import User, Post, UserActivity
+from database import AsyncServiceAdapter, USER_SEARCH_COLUMNS
+from services.user_cache import UserSnapshot, user_cache, invalidate_user
+from services.daily_stats_service import DailyStatsService
 from datetime import datetime, timedelta
-from typing import List, Optional
+from decimal import Decimal
+from typing import List, Optional, Tuple
 
 class UserService:
     def __init__(self, db: Session):
@@ -28,6 +32,9 @@ class UserService:
                 user.last_activity = datetime.utcnow()
                 user.updated_at = datetime.utcnow()
                 
+                # /start после блокировки бота - пользователь снова получает рассылки
+                user.bot_blocked_at = None
+                
                 # Обновляем is_admin только если явно указано
                 if is_admin and not user.is_admin:
                     user.is_admin = is_admin
@@ -43,8 +50,10 @@ class UserService:
                     last_activity=datetime.utcnow()
                 )
                 self.db.add(user)
+                DailyStatsService(self.db).increment(new_users=1)
             
             self.db.flush()  # Получить ID без коммита
+            invalidate_user(self.db, telegram_id)
             return user
             
         except Exception as e:
@@ -59,6 +68,21 @@ class UserService:
         """Получение пользователя по Telegram ID"""
         return self.db.query(User).filter(User.telegram_id == telegram_id).first()
     
+    def get_user_snapshot(self, telegram_id: int) -> Optional[UserSnapshot]:
+        """Получение снимка пользователя по Telegram ID (через кэш)"""
+        snapshot = user_cache.get(telegram_id)
+        if snapshot:
+            return snapshot
+        
+        user = self.get_user_by_telegram_id(telegram_id)
+        if not user:
+            return None
+        
+        snapshot = UserSnapshot.from_user(user)
+        user_cache.put(snapshot)
+        
+        return snapshot
+    
     def get_all_users(self, limit: int = 100, include_inactive: bool = True) -> List[User]:
         """Получение всех пользователей"""
         query = self.db.query(User)
@@ -97,6 +121,7 @@ class UserService:
             
             user.is_admin = True
             user.updated_at = datetime.utcnow()
+            invalidate_user(self.db, telegram_id)
             
             return True
             
@@ -113,6 +138,7 @@ class UserService:
             
             user.is_admin = False
             user.updated_at = datetime.utcnow()
+            invalidate_user(self.db, telegram_id)
             
             return True
             
@@ -129,6 +155,7 @@ class UserService:
             
             user.is_active = not user.is_active
             user.updated_at = datetime.utcnow()
+            invalidate_user(self.db, telegram_id)
             
             return True
             
@@ -145,6 +172,7 @@ class UserService:
             
             user.is_active = False
             user.updated_at = datetime.utcnow()
+            invalidate_user(self.db, telegram_id)
             
             return True
             
@@ -161,6 +189,7 @@ class UserService:
             
             user.is_active = True
             user.updated_at = datetime.utcnow()
+            invalidate_user(self.db, telegram_id)
             
             return True
             
@@ -168,6 +197,16 @@ class UserService:
             self.db.rollback()
             return False
     
+    def set_bot_blocked(self, telegram_id: int, blocked: bool) -> bool:
+        """Отметка о блокировке (или разблокировке) бота пользователем"""
+        result = self.db.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(bot_blocked_at=func.now() if blocked else None)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
     def update_last_activity(self, telegram_id: int) -> bool:
         """Обновление времени последней активности"""
         try:
@@ -189,17 +228,22 @@ class UserService:
         if not user:
             return {}
         
-        # Основная статистика
-        total_posts = len([p for p in user.posts if not p.is_deleted])
-        published_posts = len([p for p in user.posts if p.is_published and not p.is_deleted])
+        # Основная статистика (из счетчиков пользователя)
+        total_posts = user.posts_count
+        published_posts = user.published_posts_count
         draft_posts = total_posts - published_posts
         
         # Активность
-        total_activities = len(user.activities)
+        total_activities = user.activities_count
         
         # Активность за неделю
         week_ago = datetime.utcnow() - timedelta(days=7)
-        weekly_activities = len([a for a in user.activities if a.timestamp >= week_ago])
+        weekly_activities = self.db.query(UserActivity).filter(
+            and_(
+                UserActivity.user_id == user_id,
+                UserActivity.timestamp >= week_ago
+            )
+        ).count()
         
         # Дни в системе
         days_since_registration = (datetime.utcnow() - user.created_at).days
@@ -224,24 +268,49 @@ class UserService:
     
     def get_users_by_activity_level(self, min_posts: int = 1) -> List[User]:
         """Получение пользователей по уровню активности"""
-        users = self.db.query(User).filter(User.is_active == True).all()
+        return self.db.query(User).filter(
+            and_(User.is_active == True, User.posts_count >= min_posts)
+        ).order_by(desc(User.posts_count)).all()
+    
+    def search_users(self, query: str, limit: int = 20,
+                     cursor: Optional[Tuple[Decimal, int]] = None) -> Tuple[List[User], Optional[Tuple[Decimal, int]]]:
+        """
+        Поиск пользователей по имени или username
         
-        active_users = []
-        for user in users:
-            posts_count = len([p for p in user.posts if not p.is_deleted])
-            if posts_count >= min_posts:
-                active_users.append(user)
+        Находит вхождения подстроки и похожие написания (pg_trgm) по триграммным
+        индексам; результаты упорядочены по сходству. Возвращает страницу
+        пользователей и курсор следующей страницы (None, если она последняя).
+        """
+        columns = [getattr(User, name) for name in USER_SEARCH_COLUMNS]
         
-        return sorted(active_users, key=lambda u: len(u.posts), reverse=True)
-    
-    def search_users(self, query: str) -> List[User]:
-        """Поиск пользователей по имени или username"""
-        search_term = f"%{query}%"
-        return self.db.query(User).filter(
-            (User.first_name.ilike(search_term)) |
-            (User.last_name.ilike(search_term)) |
-            (User.username.ilike(search_term))
-        ).filter(User.is_active == True).all()
+        # Округление делает ранг точным значением для сравнения в курсоре
+        rank = cast(
+            func.greatest(*[func.similarity(column, query) for column in columns]),
+            Numeric(7, 6)
+        ).label('rank')
+        
+        search_query = self.db.query(User, rank).filter(
+            User.is_active == True,
+            or_(
+                *[column.icontains(query, autoescape=True) for column in columns],
+                *[column.op('%')(query) for column in columns]
+            )
+        )
+        
+        if cursor is not None:
+            cursor_rank, cursor_id = cursor
+            search_query = search_query.filter(
+                or_(rank < cursor_rank, and_(rank == cursor_rank, User.id > cursor_id))
+            )
+        
+        rows = search_query.order_by(desc(rank), User.id).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].rank, rows[-1].User.id)
+        
+        return [row.User for row in rows], next_cursor
     
     def get_user_activity_history(self, user_id: int, limit: int = 50) -> List[UserActivity]:
         """Получение истории активности пользователя"""
@@ -278,26 +347,69 @@ class UserService:
         ]
     
     def get_user_registration_stats(self, days: int = 30) -> List[dict]:
-        """Получение статистики регистраций по дням"""
-        from sqlalchemy import Date, cast
-        
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        results = self.db.query(
-            cast(User.created_at, Date).label('date'),
-            func.count(User.id).label('registrations')
-        ).filter(
-            User.created_at >= cutoff_date
-        ).group_by(cast(User.created_at, Date)).order_by('date').all()
-        
+        """Получение статистики регистраций по дням (из таблицы daily_stats)"""
         return [
             {
-                'date': result.date,
-                'registrations': result.registrations
+                'date': stats.date,
+                'registrations': stats.new_users
             }
-            for result in results
+            for stats in DailyStatsService(self.db).get_daily_stats(days)
+            if stats.new_users > 0
         ]
     
+    def increment_counters(self, user_id: int, **deltas) -> None:
+        """Атомарное изменение счетчиков пользователя (posts_count=1, ...)"""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        
+        values = {getattr(User, name): getattr(User, name) + value for name, value in deltas.items()}
+        # Счетчики не считаются изменением профиля
+        values[User.updated_at] = User.updated_at
+        
+        self.db.query(User).filter(User.id == user_id).update(values, synchronize_session=False)
+    
+    def reconcile_counters(self) -> int:
+        """
+        Сверка счетчиков пользователей с исходными таблицами
+        
+        Исправляет расхождения (например, после ручных правок в БД);
+        возвращает количество исправленных пользователей.
+        """
+        posts_count = select(func.count(Post.id)).where(
+            and_(Post.author_id == User.id, Post.is_deleted == False)
+        ).scalar_subquery()
+        published_posts_count = select(func.count(Post.id)).where(
+            and_(Post.author_id == User.id, Post.is_deleted == False, Post.is_published == True)
+        ).scalar_subquery()
+        activities_count = select(func.count(UserActivity.id)).where(
+            UserActivity.user_id == User.id
+        ).scalar_subquery()
+        
+        try:
+            result = self.db.execute(
+                update(User)
+                .where(or_(
+                    User.posts_count != posts_count,
+                    User.published_posts_count != published_posts_count,
+                    User.activities_count != activities_count
+                ))
+                .values(
+                    posts_count=posts_count,
+                    published_posts_count=published_posts_count,
+                    activities_count=activities_count,
+                    updated_at=User.updated_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            
+            return result.rowcount
+            
+        except Exception as e:
+            self.db.rollback()
+            raise e
+    
     def is_user_admin(self, telegram_id: int) -> bool:
         """Проверка является ли пользователь администратором"""
         user = self.get_user_by_telegram_id(telegram_id)
@@ -307,3 +419,7 @@ class UserService:
         """Проверка активности пользователя"""
         user = self.get_user_by_telegram_id(telegram_id)
         return user.is_active if user else False
+
+class AsyncUserService(AsyncServiceAdapter):
+    """Асинхронный вариант UserService для обработчиков бота"""
+    service_class = UserService
@@ -0,0 +1,344 @@
+"""
+Прием обновлений через webhook и обработка в нескольких процессах
+
+Главный процесс только принимает HTTP-запросы Telegram и пересылает тело
+обновления одному из WEBHOOK_WORKERS процессов-обработчиков. Процесс
+выбирается по ID пользователя, поэтому обновления одного пользователя
+обрабатываются по порядку в одном процессе, и мастер создания поста и
+фоновые задачи пользователя остаются в этом процессе.
+
+Кэш пользователей свой у каждого процесса, а данные пользователя меняют и
+другие процессы (например, администратор назначает роль). Поэтому сброс
+записи после коммита отправляется главному процессу, и тот пересылает его
+остальным обработчикам. Сброс доходит до других процессов с задержкой
+передачи кадра; в худшем случае запись устареет не дольше USER_CACHE_TTL.
+
+Сервер принимает обычный HTTP: TLS завершается на обратном прокси,
+который передает запросы на WEBHOOK_LISTEN:WEBHOOK_PORT.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import signal
+import socket
+import struct
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+from telegram import Bot, Update
+from config import Config
+from services.user_cache import user_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Кадр между процессами: тип (1 байт), длина тела (4 байта), тело
+FRAME_HEADER = struct.Struct("!BI")
+
+FRAME_UPDATE = 1  # Обновление Telegram (JSON как есть), главный -> обработчик
+FRAME_INVALIDATE_USER = 2  # Сброс пользователя из кэша, в обе стороны
+
+# Тело кадра сброса кэша: Telegram ID
+USER_ID = struct.Struct("!q")
+
+# Обновления Telegram не бывают больше нескольких килобайт
+MAX_UPDATE_SIZE = 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+def update_user_id(update: dict) -> int:
+    """
+    ID пользователя, от которого пришло обновление (ключ распределения)
+
+    Для обновлений без пользователя (посты каналов, опросы) используется
+    ID чата, иначе 0.
+    """
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+
+        sender = value.get('from') or value.get('user')
+        if isinstance(sender, dict) and 'id' in sender:
+            return sender['id']
+
+        chat = value.get('chat') or value.get('message', {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+
+    return 0
+
+def shard_for(update: dict, shards: int) -> int:
+    """Номер процесса-обработчика для обновления"""
+    return update_user_id(update) % shards
+
+def pack_frame(kind: int, body: bytes) -> bytes:
+    """Кадр для передачи через сокет процесса"""
+    return FRAME_HEADER.pack(kind, len(body)) + body
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """Чтение кадра: (тип, тело); IncompleteReadError, если сокет закрыт"""
+    kind, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+def run_worker(index: int, sock: socket.socket) -> None:
+    """Точка входа процесса-обработчика"""
+    # Ctrl+C получает вся группа процессов; обработчик останавливается,
+    # когда главный процесс закрывает сокет, и успевает сбросить буферы
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    asyncio.run(_serve_worker(index, sock))
+
+async def _serve_worker(index: int, sock: socket.socket) -> None:
+    """Чтение кадров из сокета и передача обновлений приложению"""
+    from main import build_application
+
+    application = build_application()
+    reader, writer = await asyncio.open_connection(sock=sock)
+
+    def publish_invalidation(telegram_id: int) -> None:
+        # Вызывается после коммита, сам сброс в этом процессе уже выполнен
+        if not writer.is_closing():
+            writer.write(pack_frame(FRAME_INVALIDATE_USER, USER_ID.pack(telegram_id)))
+
+    user_cache.add_listener(publish_invalidation)
+
+    async with application:
+        await application.post_init(application)
+        await application.start()
+        logger.info(f"Обработчик {index} запущен")
+
+        try:
+            while True:
+                try:
+                    kind, body = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    # Главный процесс закрыл сокет - остановка
+                    break
+
+                if kind == FRAME_INVALIDATE_USER:
+                    # Пользователя изменил другой процесс
+                    user_cache.invalidate(USER_ID.unpack(body)[0])
+                    continue
+
+                try:
+                    update = Update.de_json(json.loads(body), application.bot)
+                except Exception as e:
+                    logger.error(f"Ошибка при разборе обновления в обработчике {index}: {e}")
+                    continue
+
+                await application.update_queue.put(update)
+
+        finally:
+            # Обновления, уже переданные в очередь, обрабатываются до остановки
+            await application.stop()
+            await application.post_stop(application)
+            writer.close()
+
+    await application.post_shutdown(application)
+    logger.info(f"Обработчик {index} остановлен")
+
+class WebhookServer:
+    """
+    HTTP-сервер webhook с распределением обновлений по процессам
+
+    Ответ 200 отправляется, когда обновление записано в сокет процесса;
+    при ошибке Telegram повторит доставку сам. Сбросы кэша пользователей,
+    полученные от обработчика, пересылаются всем остальным обработчикам.
+    """
+
+    def __init__(self, path: str, secret: str, workers: int):
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.stopped = asyncio.Event()
+        self._processes: List[multiprocessing.Process] = []
+        self._writers: List[asyncio.StreamWriter] = []
+        self._relays: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.received = 0
+
+    async def start(self, host: str, port: int) -> None:
+        """Запуск процессов-обработчиков и HTTP-сервера"""
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+
+        for index in range(self.workers):
+            parent_sock, child_sock = socket.socketpair()
+            process = context.Process(
+                target=run_worker, args=(index, child_sock), name=f"bot-worker-{index}"
+            )
+            process.start()
+            child_sock.close()
+
+            reader, writer = await asyncio.open_connection(sock=parent_sock)
+            self._processes.append(process)
+            self._writers.append(writer)
+            self._relays.append(asyncio.create_task(
+                self._relay(index, reader), name=f"bot-worker-{index}-relay"
+            ))
+
+            # Падение обработчика останавливает сервер целиком: его
+            # пользователей некому обслуживать, перезапуском занимается супервизор
+            loop.add_reader(process.sentinel, self._worker_exited, index)
+
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"Webhook слушает {host}:{port}{self.path}, обработчиков: {self.workers}")
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Остановка: закрытие сокетов и ожидание завершения обработчиков"""
+        loop = asyncio.get_running_loop()
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        for process in self._processes:
+            loop.remove_reader(process.sentinel)
+        for writer in self._writers:
+            writer.close()
+
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.error(f"Обработчик {process.name} не остановился за {timeout} с")
+                process.terminate()
+
+        for task in self._relays:
+            task.cancel()
+        await asyncio.gather(*self._relays, return_exceptions=True)
+
+    def _worker_exited(self, index: int) -> None:
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._processes[index].sentinel)
+
+        if not self.stopped.is_set():
+            logger.error(f"Обработчик {index} завершился (код {self._processes[index].exitcode})")
+            self.stopped.set()
+
+    async def _relay(self, index: int, reader: asyncio.StreamReader) -> None:
+        """Пересылка сбросов кэша от обработчика index остальным обработчикам"""
+        while True:
+            try:
+                kind, body = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # Обработчик закрыл сокет при остановке
+                return
+
+            if kind != FRAME_INVALIDATE_USER:
+                logger.error(f"Неизвестный кадр {kind} от обработчика {index}")
+                continue
+
+            frame = pack_frame(kind, body)
+            for other, writer in enumerate(self._writers):
+                if other != index and not writer.is_closing():
+                    writer.write(frame)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """Соединение HTTP/1.1 (Telegram держит соединения открытыми)"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                length = int(headers.get("content-length", "0"))
+
+                if length > MAX_UPDATE_SIZE:
+                    status = 413
+                else:
+                    body = await reader.readexactly(length)
+                    status = await self._handle_request(method, path, headers, body)
+
+                keep_alive = status != 413 and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Разорванное или некорректное соединение
+            pass
+
+        finally:
+            writer.close()
+
+    async def _handle_request(self, method: str, path: str, headers: dict, body: bytes) -> int:
+        """Проверка запроса и передача обновления обработчику, возвращает код ответа"""
+        if path.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret and headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            return 403
+        if self.stopped.is_set():
+            return 503
+
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(update, dict):
+            return 400
+
+        worker = self._writers[shard_for(update, self.workers)]
+        try:
+            worker.write(pack_frame(FRAME_UPDATE, body))
+            await worker.drain()
+        except ConnectionError as e:
+            logger.error(f"Ошибка при передаче обновления обработчику: {e}")
+            return 503
+
+        self.received += 1
+        return 200
+
+async def serve_webhook(bot: Optional[Bot] = None) -> None:
+    """Регистрация webhook и работа сервера до сигнала остановки"""
+    url = urlsplit(Config.WEBHOOK_URL)
+    server = WebhookServer(
+        path=url.path or "/",
+        secret=Config.WEBHOOK_SECRET,
+        workers=Config.WEBHOOK_WORKERS
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, server.stopped.set)
+
+    await server.start(Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT)
+    try:
+        async with bot or Bot(Config.BOT_TOKEN) as webhook_bot:
+            await webhook_bot.set_webhook(
+                url=Config.WEBHOOK_URL,
+                secret_token=Config.WEBHOOK_SECRET or None,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+        await server.stopped.wait()
+
+    finally:
+        logger.info("Остановка webhook...")
+        await server.stop()
+
+def run_webhook() -> None:
+    """Запуск бота в режиме webhook (BOT_MODE=webhook)"""
+    if not Config.WEBHOOK_URL:
+        raise ValueError("Для режима webhook нужно указать WEBHOOK_URL")
+
+    asyncio.run(serve_webhook())
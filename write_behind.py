@@ -0,0 +1,327 @@
+"""
+Отложенная (write-behind) запись аналитики пакетами вне пути обработки запроса
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque, Counter
+from datetime import date, datetime, timezone
+from itertools import islice
+from typing import Dict, Optional
+from sqlalchemy import insert, update, values, column, or_, Integer, DateTime
+from config import Config
+from database import AsyncSessionLocal
+from models import User, UserActivity
+from services.daily_stats_service import increment_statement, add_committed_listener
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer(ABC):
+    """
+    Базовый буфер с фоновым сбросом в базу данных
+
+    Сброс происходит по таймеру (flush_interval) или досрочно,
+    когда накоплено batch_size записей. При остановке фоновый цикл
+    не прерывается посреди записи пакета: он завершает текущий сброс,
+    после чего буфер сбрасывается полностью.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Количество записей, ожидающих сброса"""
+
+    @abstractmethod
+    async def _write_batch(self) -> int:
+        """Запись одного пакета, возвращает количество записанных строк"""
+
+    def _notify(self) -> None:
+        """Досрочный сброс при накоплении полного пакета"""
+        if len(self) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Сброс всех накопленных записей"""
+        async with self._flush_lock:
+            while len(self):
+                if not await self._write_batch():
+                    break
+
+    async def _run(self) -> None:
+        """Фоновый цикл сброса"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._stopping:
+                break
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка в фоновом сбросе {type(self).__name__}: {e}")
+
+    async def start(self) -> None:
+        """Запуск фонового сброса"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка фонового сброса с записью оставшихся данных"""
+        if self._task is not None:
+            # Отмена могла бы прервать запись пакета, уже извлеченного из буфера
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+
+        await self.flush()
+
+class ActivitySink(WriteBehindBuffer):
+    """
+    Буфер активности пользователей
+
+    record() не обращается к базе данных: строка кладется в ограниченную
+    очередь и записывается позже одним многострочным INSERT.
+    При переполнении очереди новые записи отбрасываются и учитываются в dropped.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue_size: int):
+        super().__init__(batch_size, flush_interval)
+        self.max_queue_size = max_queue_size
+        self._queue = deque()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def record(self, user_id: int, activity_type: str, activity_data: dict = None) -> bool:
+        """Постановка активности в очередь на запись"""
+        if len(self._queue) >= self.max_queue_size:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Очередь активности переполнена, отброшено записей: {self.dropped}")
+            return False
+
+        self._queue.append({
+            'user_id': user_id,
+            'activity_type': activity_type,
+            'activity_data': activity_data,
+            'timestamp': datetime.utcnow()
+        })
+        self._notify()
+
+        return True
+
+    async def _write_batch(self) -> int:
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(UserActivity), batch)
+
+                # Дневная статистика: одно обновление на день, а не на строку
+                per_day = Counter(row['timestamp'].date() for row in batch)
+                for day, count in sorted(per_day.items()):
+                    await db.execute(increment_statement(day, user_activities=count))
+
+                # Счетчики пользователей: один UPDATE ... FROM (VALUES ...) на пакет
+                per_user = values(
+                    column('id', Integer),
+                    column('activities_count', Integer),
+                    name='batch_counts'
+                ).data(sorted(Counter(row['user_id'] for row in batch).items()))
+                await db.execute(
+                    update(User)
+                    .where(User.id == per_user.c.id)
+                    .values(
+                        activities_count=User.activities_count + per_user.c.activities_count,
+                        updated_at=User.updated_at
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+                await db.commit()
+
+            self.written += len(batch)
+            return len(batch)
+
+        except Exception as e:
+            # Пакет не возвращается в очередь, чтобы одна ошибочная строка не блокировала запись
+            self.failed += len(batch)
+            logger.error(f"Ошибка при записи пакета активности ({len(batch)} строк): {e}")
+            return 0
+
+    def get_stats(self) -> dict:
+        """Статистика работы буфера"""
+        return {
+            'queued': len(self._queue),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
+class LastActivityTracker(WriteBehindBuffer):
+    """
+    Буфер времени последней активности пользователей
+
+    Вместо UPDATE строки users на каждую команду время запоминается в памяти
+    (по одному значению на пользователя) и периодически записывается одним
+    UPDATE ... FROM (VALUES ...). Отметки чаще, чем раз в resolution секунд,
+    не попадают даже в буфер.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, resolution: float):
+        super().__init__(batch_size, flush_interval)
+        self.resolution = resolution
+        self._pending = {}
+        self.written = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, user, now: datetime = None) -> bool:
+        """Отметка активности пользователя, возвращает True, если отметка попала в буфер"""
+        now = now or datetime.utcnow()
+
+        last_activity = self._pending.get(user.id) or user.last_activity
+        if last_activity is not None:
+            if last_activity.tzinfo is not None:
+                last_activity = last_activity.astimezone(timezone.utc).replace(tzinfo=None)
+            if (now - last_activity).total_seconds() < self.resolution:
+                return False
+
+        self._pending[user.id] = now
+        self._notify()
+
+        return True
+
+    async def _write_batch(self) -> int:
+        batch = list(islice(self._pending.items(), self.batch_size))
+        for user_id, _ in batch:
+            del self._pending[user_id]
+
+        rows = values(
+            column('id', Integer),
+            column('last_activity', DateTime(timezone=True)),
+            name='pending'
+        ).data(batch)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(User)
+                    .where(User.id == rows.c.id)
+                    .where(or_(
+                        User.last_activity.is_(None),
+                        User.last_activity < rows.c.last_activity
+                    ))
+                    .values(last_activity=rows.c.last_activity)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+            self.written += len(batch)
+            return len(batch)
+
+        except BaseException as e:
+            # Отметки возвращаются в буфер, если за это время не появились более свежие
+            # (в том числе при отмене задачи, иначе они были бы потеряны)
+            for user_id, timestamp in batch:
+                self._pending.setdefault(user_id, timestamp)
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Ошибка при записи времени активности ({len(batch)} пользователей): {e}")
+            return 0
+
+class DailyStatsBuffer(WriteBehindBuffer):
+    """
+    Буфер изменений дневной статистики
+
+    Изменения, зафиксированные транзакциями запросов, суммируются в памяти
+    по дням и записываются одним INSERT ... ON CONFLICT DO UPDATE на день в
+    отдельной короткой транзакции. При ошибке записи изменения остаются в
+    буфере и записываются при следующем сбросе.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int = 366):
+        super().__init__(batch_size, flush_interval)
+        self._pending: Dict[date, Counter] = {}
+        self.written = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, day: date, deltas: Dict[str, int]) -> None:
+        """Добавление зафиксированных изменений счетчиков дня"""
+        self._pending.setdefault(day, Counter()).update(deltas)
+        self._notify()
+
+    async def _write_batch(self) -> int:
+        batch = list(islice(self._pending.items(), self.batch_size))
+        for day, _ in batch:
+            del self._pending[day]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                for day, deltas in sorted(batch):
+                    deltas = {name: value for name, value in deltas.items() if value}
+                    if deltas:
+                        await db.execute(increment_statement(day, **deltas))
+                await db.commit()
+
+            self.written += len(batch)
+            return len(batch)
+
+        except BaseException as e:
+            # Изменения возвращаются в буфер и суммируются с новыми
+            for day, deltas in batch:
+                self._pending.setdefault(day, Counter()).update(deltas)
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Ошибка при записи дневной статистики ({len(batch)} дней): {e}")
+            return 0
+
+# Общий буфер активности приложения
+activity_sink = ActivitySink(
+    batch_size=Config.ACTIVITY_BATCH_SIZE,
+    flush_interval=Config.ACTIVITY_FLUSH_INTERVAL,
+    max_queue_size=Config.ACTIVITY_QUEUE_SIZE
+)
+
+# Общий буфер времени последней активности
+last_activity_tracker = LastActivityTracker(
+    batch_size=Config.LAST_ACTIVITY_BATCH_SIZE,
+    flush_interval=Config.LAST_ACTIVITY_FLUSH_INTERVAL,
+    resolution=Config.LAST_ACTIVITY_RESOLUTION
+)
+
+# Общий буфер дневной статистики
+daily_stats_buffer = DailyStatsBuffer(flush_interval=Config.DAILY_STATS_FLUSH_INTERVAL)
+add_committed_listener(daily_stats_buffer.add)
+
+async def start_write_behind(*args) -> None:
+    """Запуск фоновых буферов записи (post_init приложения)"""
+    await activity_sink.start()
+    await last_activity_tracker.start()
+    await daily_stats_buffer.start()
+
+async def stop_write_behind(*args) -> None:
+    """Остановка буферов с записью оставшихся данных (post_shutdown приложения)"""
+    await activity_sink.stop()
+    await last_activity_tracker.stop()
+    await daily_stats_buffer.stop()